@@ -0,0 +1,111 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import os.path
+import hashlib
+import tempfile
+import logging
+
+class AtomicFileWriter(object):
+    '''
+    Writes files atomically: the content is written to a temporary file
+    in the same directory which then replaces the target, so that readers
+    never see a truncated file.
+
+    The digest of the last content written to each path is kept and the
+    write is skipped when the content did not change.
+    '''
+
+    logger = logging.getLogger('atomicfile')
+
+    def __init__(self, fsync=False):
+        self.fsync = fsync
+        self.digests = {}
+        self.written = 0
+        self.skipped = 0
+
+    def _file_digest(self, path):
+        try:
+            f = open(path, 'rb')
+            try:
+                return hashlib.md5(f.read()).hexdigest()
+            finally:
+                f.close()
+        except IOError:
+            return None
+
+    def write(self, path, content, signature=None, compare=True):
+        '''
+        Writes content to path unless it is unchanged. If given, the
+        signature is compared instead of the content, for content
+        containing parts that should not trigger a write (e.g. a timestamp).
+        Returns True if the file was written.
+        '''
+        if compare:
+            if signature is None:
+                digest = hashlib.md5(content).hexdigest()
+                last_digest = self.digests.get(path)
+                if last_digest is None:
+                    # After a restart, compare with the file on disk
+                    last_digest = self._file_digest(path)
+            else:
+                digest = hashlib.md5(signature).hexdigest()
+                last_digest = self.digests.get(path)
+
+            if digest == last_digest and os.path.exists(path):
+                self.digests[path] = digest
+                self.skipped += 1
+                self.logger.debug("%s unchanged, skipped write (%d skipped)", path, self.skipped)
+                return False
+
+        dir = os.path.realpath(os.path.dirname(path))
+        if not os.path.exists(dir):
+            os.makedirs(dir)
+
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0666 & ~umask
+
+        (fd, temp_path) = tempfile.mkstemp(dir=dir, prefix='.'+os.path.basename(path)+'.', suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(content)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                f.close()
+            os.chmod(temp_path, mode)
+            if os.name == 'nt' and os.path.exists(path):
+                # rename does not replace existing files on Windows
+                os.remove(path)
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if compare:
+            self.digests[path] = digest
+        self.written += 1
+        return True
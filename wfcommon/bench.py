@@ -0,0 +1,528 @@
+#!/usr/bin/python
+
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Before loading other modules add wfrog directory to sys.path to be able to use wfcommon
+import os.path
+import sys
+if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/..'))
+
+import os
+import time
+import datetime
+import threading
+import tempfile
+import shutil
+import optparse
+import logging
+import copy
+import json
+import platform
+from Queue import Queue
+
+from wfcommon.generator import WeatherGenerator
+
+WFROG_HOME = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def percentiles(values):
+    '''
+    Returns the 50, 90 and 99 percentiles and the maximum of the values, in
+    milliseconds.
+    '''
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    result = {}
+    for p in [ 50, 90, 99 ]:
+        result['p%d' % p] = round(values[min(len(values) - 1, int(len(values) * p / 100.0))] * 1000, 3)
+    result['max'] = round(values[-1] * 1000, 3)
+    result['count'] = len(values)
+    return result
+
+def peak_rss():
+    '''
+    Returns the peak resident memory of the process in kilobytes, or None
+    if unknown on this platform.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss / 1024 # Bytes on MacOS
+    return rss
+
+class Timeline(object):
+    '''
+    Times at which the events pass the stage boundaries. The pipeline is
+    FIFO, the n-th time of each boundary belongs to the n-th event.
+    '''
+
+    boundaries = [ 'sent', 'driver_out', 'logger_in', 'collect_start', 'collect_end' ]
+
+    def __init__(self):
+        self.times = dict([ (name, []) for name in self.boundaries ])
+        self.writes = []
+        self.condition = threading.Condition()
+
+    def mark(self, boundary):
+        # list.append is atomic
+        self.times[boundary].append(time.time())
+        if boundary == 'collect_end':
+            self.condition.acquire()
+            self.condition.notifyAll()
+            self.condition.release()
+
+    def completed(self):
+        return len(self.times['collect_end'])
+
+    def wait(self, count, timeout):
+        end = time.time() + timeout
+        self.condition.acquire()
+        try:
+            while self.completed() < count and time.time() < end:
+                self.condition.wait(0.5)
+        finally:
+            self.condition.release()
+        return self.completed() >= count
+
+    def latencies(self):
+        result = {}
+        stages = [ ('driver_queue', 'sent', 'driver_out'),
+                   ('transport', 'driver_out', 'logger_in'),
+                   ('logger_queue', 'logger_in', 'collect_start'),
+                   ('collector', 'collect_start', 'collect_end'),
+                   ('end_to_end', 'sent', 'collect_end') ]
+        for (name, start, end) in stages:
+            starts = self.times[start]
+            ends = self.times[end]
+            result[name] = percentiles([ ends[i] - starts[i] for i in range(min(len(starts), len(ends))) ])
+        result['storage_write'] = percentiles(self.writes)
+        return result
+
+class ReplayStation(object):
+    '''
+    Sends the events of generated samples, as a station would. At most
+    'window' events are in the pipeline at once, so that the queues of
+    the driver and the logger never overflow.
+    '''
+
+    def __init__(self, samples, timeline, window, timestamps=True):
+        self.samples = samples
+        self.timeline = timeline
+        self.window = window
+        self.timestamps = timestamps
+        self.sent = 0
+        self.stalled = False
+        self.rain_total = 0.0
+
+    def events(self, generate_event):
+        for sample in self.samples:
+            self.rain_total = self.rain_total + sample['rain']
+            events = []
+            for (type, sensor) in [ ('temp', 1), ('hum', 1), ('temp', 0), ('hum', 0) ]:
+                e = generate_event(type)
+                e.sensor = sensor
+                e.value = sample[type + ('int' if sensor == 0 else '')]
+                events.append(e)
+            e = generate_event('press')
+            e.value = sample['pressure']
+            e.code = 'QFF'
+            events.append(e)
+            e = generate_event('wind')
+            e.create_child('mean')
+            e.mean.speed = sample['wind']
+            e.mean.dir = sample['wind_dir']
+            e.create_child('gust')
+            e.gust.speed = sample['wind_gust']
+            e.gust.dir = sample['wind_gust_dir']
+            events.append(e)
+            e = generate_event('rain')
+            e.total = self.rain_total
+            e.rate = sample['rain_rate']
+            events.append(e)
+            e = generate_event('uv')
+            e.value = sample['uv_index']
+            events.append(e)
+            e = generate_event('rad')
+            e.value = sample['solar_rad']
+            events.append(e)
+            for e in events:
+                if self.timestamps:
+                    e.timestamp = sample['localtime']
+                yield e
+
+    def run(self, generate_event, send_event, timeout=30):
+        for event in self.events(generate_event):
+            start = time.time()
+            while self.sent - self.timeline.completed() >= self.window:
+                # Events lost on the way would block the replay forever
+                if time.time() - start > timeout:
+                    self.stalled = True
+                    return
+                time.sleep(0.0005)
+            self.sent = self.sent + 1
+            self.timeline.mark('sent')
+            send_event(event)
+
+class TimingOutput(object):
+    def __init__(self, output, timeline):
+        self.output = output
+        self.timeline = timeline
+
+    def send_event(self, event):
+        self.timeline.mark('driver_out')
+        self.output.send_event(event)
+
+class TimingCollector(object):
+    def __init__(self, collector, timeline):
+        self.collector = collector
+        self.timeline = timeline
+
+    def send_event(self, event, context={}):
+        self.timeline.mark('collect_start')
+        try:
+            self.collector.send_event(event, context=context)
+        finally:
+            self.timeline.mark('collect_end')
+
+class TimingStorage(object):
+    def __init__(self, storage, timeline):
+        self.storage = storage
+        self.timeline = timeline
+
+    def write_sample(self, sample, context={}):
+        start = time.time()
+        self.storage.write_sample(sample, context=context)
+        self.timeline.writes.append(time.time() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+class QueueMonitor(object):
+    '''
+    Samples the depth of queues.
+    '''
+
+    def __init__(self, queues, interval=0.005):
+        self.queues = queues
+        self.interval = interval
+        self.depths = dict([ (name, []) for name in queues.keys() ])
+        self.alive = True
+
+    def run(self):
+        while self.alive:
+            for name, queue in self.queues.iteritems():
+                self.depths[name].append(queue.qsize())
+            time.sleep(self.interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run)
+        thread.setDaemon(True)
+        thread.start()
+
+    def stop(self):
+        self.alive = False
+        result = {}
+        for name, depths in self.depths.iteritems():
+            if len(depths) > 0:
+                result[name] = { 'max': max(depths), 'mean': round(sum(depths) / float(len(depths)), 2) }
+        return result
+
+class Bench(object):
+    '''
+    Measures the throughput and the latencies of wfrog: generated events
+    are replayed through the driver and the logger (!buffer, !aggregator)
+    into a storage, then the default pages are rendered from it. The
+    results are written as JSON, to compare them between versions.
+    '''
+
+    logger = logging.getLogger('bench')
+
+    def __init__(self):
+        opt_parser = optparse.OptionParser()
+        opt_parser.add_option("--storage", dest="storage", default="sqlite3", choices=[ "sqlite3", "csv", "partitioned-csv" ], help="Storage: sqlite3, csv or partitioned-csv. Default: sqlite3")
+        opt_parser.add_option("--profile", dest="profile", default="default", help="Profile of the sqlite3 storage. Default: default")
+        opt_parser.add_option("--input", dest="input", default="function", choices=[ "function", "http" ], help="Logger input: function or http. Default: function")
+        opt_parser.add_option("--port", dest="port", type="int", default=18888, help="Port of the http input. Default: 18888")
+        opt_parser.add_option("--history", dest="history", type="int", default=30, help="Days of samples in the storage before the replay. Default: 30")
+        opt_parser.add_option("--hours", dest="hours", type="float", default=24, help="Hours of events replayed. Default: 24")
+        opt_parser.add_option("--period", dest="period", type="int", default=60, help="Seconds between two replayed samples (9 events each). Default: 60")
+        opt_parser.add_option("--flush", dest="flush", type="int", default=600, help="Seconds between two samples written by the aggregator. Default: 600")
+        opt_parser.add_option("--queue", dest="queue", type="int", default=100, help="Size of the driver and logger queues. Default: 100")
+        opt_parser.add_option("--passes", dest="passes", type="int", default=3, help="Render passes over the default pages, 0 to skip rendering. Default: 3")
+        opt_parser.add_option("--seed", dest="seed", type="int", default=0, help="Seed of the generated data. Default: 0")
+        opt_parser.add_option("--output", dest="output", help="Write the results to this file instead of the standard output", metavar="FILE")
+        opt_parser.add_option("--keep", dest="keep", action="store_true", help="Keep the storage directory")
+        opt_parser.add_option("--debug", dest="debug", action="store_true", help="Log to the standard error")
+        (self.options, args) = opt_parser.parse_args()
+
+        if self.options.debug:
+            logging.basicConfig(level=logging.INFO)
+        else:
+            # The components log a lot at info level
+            logging.basicConfig(level=logging.CRITICAL)
+
+    def create_storage(self, directory):
+        import wfcommon.storage
+        options = self.options
+        if options.storage == 'sqlite3':
+            import sqlite3
+            path = os.path.join(directory, 'wfrog.sql')
+            connection = sqlite3.connect(path)
+            connection.executescript(self.sqlite3_schema())
+            connection.close()
+            storage = wfcommon.storage.YamlSqlite3Storage()
+            storage.database = path
+            storage.profile = options.profile
+        elif options.storage == 'csv':
+            storage = wfcommon.storage.YamlCsvStorage()
+            storage.path = os.path.join(directory, 'wfrog.csv')
+        else:
+            storage = wfcommon.storage.YamlPartitionedCsvStorage()
+            storage.path = os.path.join(directory, 'archive')
+        try:
+            storage.init(context={})
+        except AttributeError:
+            pass # In case the element has not init method
+        return storage
+
+    def sqlite3_schema(self):
+        # The schema shipped with wfrog, with the optional columns filled by
+        # the generator enabled
+        optional = [ 'TEMPINT', 'HUMINT', 'UV_INDEX', 'SOLAR_RAD' ]
+        statements = []
+        columns = None
+        for line in open(os.path.join(WFROG_HOME, 'database', 'db-sqlite3.sql')):
+            line = line.strip()
+            if line.startswith('CREATE TABLE'):
+                statements.append(line)
+                columns = []
+            elif columns is not None:
+                if line.startswith(');'):
+                    statements[-1] = statements[-1] + ', '.join(columns) + ');'
+                    columns = None
+                elif line.startswith('-- ') and line[3:].split(' ')[0] in optional:
+                    columns.append(line[3:].rstrip(','))
+                elif line != '' and not line.startswith('--'):
+                    columns.append(line.rstrip(','))
+            elif line != '' and not line.startswith('--'):
+                statements.append(line)
+        return '\n'.join(statements)
+
+    def fill_history(self, storage, generator, from_time, to_time):
+        start = time.time()
+        batch = []
+        count = 0
+        for sample in generator.samples(from_time, to_time):
+            batch.append(sample)
+            if len(batch) == 5000:
+                storage.write_samples(batch)
+                count = count + len(batch)
+                batch = []
+        if len(batch) > 0:
+            storage.write_samples(batch)
+            count = count + len(batch)
+        elapsed = time.time() - start
+        return { 'samples': count, 'seconds': round(elapsed, 3), 'samples_per_sec': round(count / max(elapsed, 0.001), 1) }
+
+    def bench_logger(self, storage, generator, from_time, to_time):
+        import wfdriver.wfdriver
+        import wflogger.wflogger
+        import wflogger.input.function
+        import wflogger.collector.buffer
+        import wflogger.collector.aggregator
+        options = self.options
+
+        timeline = Timeline()
+        samples = list(generator.samples(from_time, to_time))
+        station = ReplayStation(samples, timeline, options.queue - 1, timestamps=(options.input == 'function'))
+
+        aggregator = wflogger.collector.aggregator.AggregatorCollector()
+        aggregator.storage = TimingStorage(storage, timeline)
+        buffer = wflogger.collector.buffer.BufferCollector()
+        buffer.collector = aggregator
+        if options.input == 'http':
+            # Events are timestamped on arrival, flush every second
+            buffer.retention = 0
+            buffer.period = 1
+        else:
+            buffer.period = options.flush
+
+        logger = wflogger.wflogger.Logger(optparse.OptionParser(conflict_handler='resolve'))
+        logger.collector = TimingCollector(buffer, timeline)
+        logger.context = {}
+        logger.event_queue = Queue(options.queue)
+
+        def enqueue(event):
+            timeline.mark('logger_in')
+            logger.enqueue_event(event)
+
+        if options.input == 'http':
+            import wflogger.input.http
+            import wfdriver.output.http
+            input = wflogger.input.http.HttpInput()
+            input.port = options.port
+            output = wfdriver.output.http.HttpOutput()
+            output.url = 'http://localhost:%d/' % options.port
+        else:
+            input = wflogger.input.function.FunctionInput()
+            output = input
+
+        driver = wfdriver.wfdriver.Driver(optparse.OptionParser(conflict_handler='resolve'))
+        driver.station = station
+        driver.output = TimingOutput(output, timeline)
+        driver.event_queue = Queue(options.queue)
+
+        for target in [ logger.output_loop, driver.output_loop ]:
+            thread = threading.Thread(target=target)
+            thread.setDaemon(True)
+            thread.start()
+        thread = threading.Thread(target=input.run, args=(enqueue,))
+        thread.setDaemon(True)
+        thread.start()
+        if options.input == 'http':
+            time.sleep(0.5) # Let the server start
+
+        monitor = QueueMonitor({ 'driver': driver.event_queue, 'logger': logger.event_queue })
+        monitor.start()
+        start = time.time()
+        station.run(wfdriver.wfdriver.gen, driver.enqueue_event)
+        complete = not station.stalled and timeline.wait(station.sent, 30)
+        elapsed = time.time() - start
+        queues = monitor.stop()
+
+        return { 'events': station.sent,
+                 'processed': timeline.completed(),
+                 'complete': complete,
+                 'samples_replayed': len(samples),
+                 'samples_written': len(timeline.writes),
+                 'seconds': round(elapsed, 3),
+                 'events_per_sec': round(timeline.completed() / max(elapsed, 0.001), 1),
+                 'queues': queues,
+                 'latency_ms': timeline.latencies() }
+
+    def bench_render(self, storage):
+        options = self.options
+        try:
+            import wfrender.config
+            import wfrender.wfrender
+            import wfcommon.generic.service
+            from wfcommon.memo import RenderMemo
+        except ImportError, e:
+            return { 'skipped': str(e) }
+
+        # The default configuration uses the storage registered under this name
+        wfcommon.generic.service.services['storage'] = storage
+
+        config_file = os.path.join(WFROG_HOME, 'wfrender', 'config', 'wfrender.yaml')
+        opt_parser = optparse.OptionParser(conflict_handler='resolve')
+        engine = wfrender.wfrender.RenderEngine(opt_parser)
+        (engine_options, args) = opt_parser.parse_args([])
+        engine_options.reload_mod = False
+        engine_options.reload_config = False
+        engine_options.command = False
+        (config, context) = engine.configurer.configure(engine_options, engine, config_file, embedded=True)
+        pages = config['renderer'].children['http'].renderers
+        initial_context = dict(engine.initial_context)
+        initial_context.update(context)
+
+        page_times = dict([ (name, []) for name in pages.keys() ])
+        pass_times = []
+        errors = {}
+        hits = 0
+        misses = 0
+        for i in range(options.passes):
+            current_context = copy.deepcopy(initial_context)
+            memo = RenderMemo()
+            current_context['_memo'] = memo
+            pass_start = time.time()
+            for name, page in pages.iteritems():
+                start = time.time()
+                try:
+                    page.render(data={}, context=current_context)
+                except Exception, e:
+                    errors[name] = str(e)
+                    continue
+                page_times[name].append(time.time() - start)
+            pass_times.append(time.time() - pass_start)
+            hits = hits + memo.hits
+            misses = misses + memo.misses
+
+        result = { 'passes': options.passes,
+                   'pass_ms': percentiles(pass_times),
+                   'pages_ms': dict([ (name, percentiles(times)) for name, times in page_times.iteritems() ]),
+                   'memo': { 'hits': hits, 'misses': misses } }
+        if len(errors) > 0:
+            result['errors'] = errors
+        return result
+
+    def run(self):
+        options = self.options
+        directory = tempfile.mkdtemp(prefix='wfrog-bench-')
+        try:
+            storage = self.create_storage(directory)
+            generator = WeatherGenerator(options.seed, options.period, sensors=1)
+
+            # The replay ends a few minutes ago so that the buffer forwards
+            # the events immediately
+            now = datetime.datetime.now().replace(second=0, microsecond=0)
+            replay_end = now - datetime.timedelta(0, 300)
+            replay_start = replay_end - datetime.timedelta(0, int(options.hours * 3600))
+            history_start = replay_start - datetime.timedelta(options.history)
+
+            result = { 'version': self.version(),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'date': now.strftime('%Y-%m-%d %H:%M:%S'),
+                       'options': options.__dict__ }
+            self.logger.info("Filling history from %s to %s", history_start, replay_start)
+            result['history'] = self.fill_history(storage, generator, history_start, replay_start)
+            self.logger.info("Replaying events from %s to %s", replay_start, replay_end)
+            result['logger'] = self.bench_logger(storage, generator, replay_start, replay_end)
+            if options.passes > 0:
+                self.logger.info("Rendering the default pages")
+                result['render'] = self.bench_render(storage)
+            result['peak_rss_kb'] = peak_rss()
+        finally:
+            if options.keep:
+                sys.stderr.write("Storage kept in %s\n" % directory)
+            else:
+                shutil.rmtree(directory, True)
+
+        text = json.dumps(result, indent=2, sort_keys=True)
+        if options.output:
+            file = open(options.output, 'w')
+            try:
+                file.write(text + '\n')
+            finally:
+                file.close()
+        else:
+            print text
+
+    def version(self):
+        try:
+            from wfcommon.config import wfrog_version
+            return wfrog_version
+        except ImportError:
+            return None
+
+if __name__ == "__main__":
+    Bench().run()
@@ -23,7 +23,9 @@ import inspect
 import sys
 import os.path
 import copy
-from Cheetah.Template import Template
+import wfcommon.registry
+from wfcommon import profiling
+from wfcommon.configcache import cache
 
 wfrog_version = "0.8.2-svn"
 
@@ -47,11 +49,16 @@ class Configurer(object):
         opt_parser.add_option("-H", action="store_true", dest="help_list", help="Gives help on the configuration file and the list of possible config !elements in the yaml config file")
         opt_parser.add_option("-E", dest="help_element", metavar="ELEMENT", help="Gives help about a config !element")
         opt_parser.add_option("-e", "--extensions", dest="extension_names", metavar="MODULE1,MODULE2,...", help="Comma-separated list of modules containing custom configuration elements")
+        opt_parser.add_option("--config-cache", dest="config_cache", metavar="DIR", help="Directory keeping the expanded configuration files between runs")
+        opt_parser.add_option("--stacks", action="store_true", dest="stacks", help="Logs the stacks of all threads on signal USR1 and samples them during 10 seconds on signal USR2 (flame graph format)")
         self.log_configurer.add_options(opt_parser)
 
     def configure(self, options, component, config_file, settings_file=None, embedded=False):
         self.config_file = config_file
         self.settings_file = settings_file
+        first_load = len(cache.timings)
+        if getattr(options, 'config_cache', None):
+            cache.directory = options.config_cache
         if options.extension_names:
             for ext in options.extension_names.split(","):
                 self.logger.debug("Loading extension module '"+ext+"'")
@@ -107,7 +114,7 @@ class Configurer(object):
 
         variables = {}
         variables['settings']=settings
-        config = yaml.load( str(Template(file=file(self.config_file, "r"), searchList=[variables])))
+        config = cache.load(self.config_file, variables)
 
         if settings is not None:
             context = copy.deepcopy(settings)
@@ -119,6 +126,8 @@ class Configurer(object):
 
         if not embedded:
             self.log_configurer.configure(options, config, context)
+            if getattr(options, 'stacks', False):
+                profiling.install()
 
         self.logger.info("Starting wfrog " + wfrog_version)
         if settings_warning:
@@ -135,6 +144,8 @@ class Configurer(object):
                 except AttributeError:
                     pass # In case the element has not init method
 
+        self.logger.info("Loaded configuration of %s: %s", os.path.basename(self.config_file), cache.report(first_load))
+
         return ( config, context )
 
     def print_help(self, module):
@@ -149,24 +160,38 @@ class Configurer(object):
     def get_help_desc(self, module, summary=False):
         self.logger.debug("Getting info on module '"+module.__name__+"'")
         elements = inspect.getmembers(module, lambda l : inspect.isclass(l) and yaml.YAMLObject in inspect.getmro(l))
+        module_name = module.__name__.split('.')[-1]
         desc={}
         for element in elements:
             self.logger.debug("Getting doc of "+element[0])
-            # Gets the documentation of the first superclass
-            superclass = inspect.getmro(element[1])[1]
-            fulldoc=superclass.__doc__
-
-            # Add the doc of the super-super-class if _element_doc is
-            if hasattr(inspect.getmro(superclass)[1], "_element_doc") and inspect.getmro(superclass)[1].__doc__  is not None:
-                fulldoc = fulldoc + inspect.getmro(superclass)[1].__doc__
+            fulldoc = self.get_element_doc(element[1])
 
             firstline=fulldoc.split(".")[0]
             self.logger.debug(firstline)
 
-            module_name = module.__name__.split('.')[-1]
-
             if summary:
                 desc[element[1].yaml_tag] = [ firstline, module_name ]
             else:
                 desc[element[1].yaml_tag] = [ fulldoc, module_name ]
+
+        # Elements loaded on demand, the summary does not need to import them
+        if isinstance(getattr(module, 'elements', None), wfcommon.registry.Registry):
+            for tag, element in module.elements.elements.iteritems():
+                if summary:
+                    desc[tag] = [ element.summary, module_name ]
+                else:
+                    try:
+                        desc[tag] = [ self.get_element_doc(element.load()), module_name ]
+                    except ImportError, e:
+                        desc[tag] = [ "%s.\n    Cannot be used: %s" % (element.summary, str(e)), module_name ]
         return desc
+
+    def get_element_doc(self, element_class):
+        # Gets the documentation of the first superclass
+        superclass = inspect.getmro(element_class)[1]
+        fulldoc=superclass.__doc__ or ''
+
+        # Add the doc of the super-super-class if _element_doc is
+        if hasattr(inspect.getmro(superclass)[1], "_element_doc") and inspect.getmro(superclass)[1].__doc__  is not None:
+            fulldoc = fulldoc + inspect.getmro(superclass)[1].__doc__
+        return fulldoc
@@ -0,0 +1,189 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import os.path
+import time
+import hashlib
+import logging
+import threading
+import yaml
+from Cheetah.Template import Template
+
+from wfcommon.atomicfile import AtomicFileWriter
+
+class ConfigCache(object):
+    '''
+    Loads the yaml configuration files, which are Cheetah templates.
+
+    A file is expanded and parsed once per content and variables: the
+    compiled template is kept per file content and the parsed yaml
+    document per expanded text, e.g. the same include with the same
+    variables is parsed only once. Each load constructs new objects from
+    the parsed document.
+
+    If a directory is set, the expanded files are also kept there so that
+    the next starts do not run the templates.
+    '''
+
+    logger = logging.getLogger('config.cache')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.documents = {}
+        self.directory = None
+        self.timings = []
+        self.paths = set()
+
+    def load(self, path, variables={}):
+        '''
+        Returns the objects defined by the configuration file at path,
+        expanded with the variables.
+        '''
+        start = time.time()
+        self.paths.add(os.path.abspath(path))
+        content = open(path, 'r').read()
+        key = hashlib.sha1(os.path.abspath(path) + '\0' + content + '\0' + fingerprint(variables)).hexdigest()
+
+        self.lock.acquire()
+        try:
+            (document, source) = (self.documents.get(key), 'memory')
+            expanded = time.time()
+            if document is None:
+                (text, source) = (self._read(key), 'disk')
+                if text is None:
+                    text = self._expand(content, variables)
+                    source = 'template'
+                    self._write(key, text)
+                expanded = time.time()
+                document = yaml.compose(text)
+                self.documents[key] = document
+            parsed = time.time()
+        finally:
+            self.lock.release()
+
+        result = yaml.Loader('').construct_document(document)
+        end = time.time()
+
+        timing = (path, source, expanded - start, parsed - expanded, end - parsed)
+        self.timings.append(timing)
+        self.logger.debug("Loaded %s from %s in %.1f ms (template %.1f ms, yaml %.1f ms, objects %.1f ms)",
+            path, source, (end - start) * 1000, timing[2] * 1000, timing[3] * 1000, timing[4] * 1000)
+        return result
+
+    def _expand(self, content, variables):
+        digest = hashlib.sha1(content).hexdigest()
+        template = self.templates.get(digest)
+        if template is None:
+            template = Template.compile(source=content)
+            self.templates[digest] = template
+        return str(template(searchList=[variables]))
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + '.yaml')
+
+    def _read(self, key):
+        if self.directory is None or not os.path.exists(self._file(key)):
+            return None
+        file = open(self._file(key), 'r')
+        try:
+            return file.read()
+        finally:
+            file.close()
+
+    def _write(self, key, text):
+        if self.directory is None:
+            return
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            AtomicFileWriter().write(self._file(key), text, compare=False)
+        except (IOError, OSError), e:
+            self.logger.warning("Cannot write config cache in %s: %s", self.directory, str(e))
+
+    def files(self):
+        '''
+        Returns the paths of the configuration files loaded, e.g. to watch
+        them for changes.
+        '''
+        return sorted(self.paths)
+
+    def report(self, since=0):
+        '''
+        Returns a summary of the loads since the given index in timings.
+        '''
+        timings = self.timings[since:]
+        total = sum([ t[2] + t[3] + t[4] for t in timings ])
+        cached = len([ t for t in timings if t[1] != 'template' ])
+        return "%d files in %.1f ms (%d from cache, templates %.1f ms, yaml %.1f ms, objects %.1f ms)" % (
+            len(timings), total * 1000, cached,
+            sum([ t[2] for t in timings ]) * 1000, sum([ t[3] for t in timings ]) * 1000, sum([ t[4] for t in timings ]) * 1000)
+
+def fingerprint(value):
+    '''
+    Text identifying the variables given to a template. Internal entries
+    (starting with '_') are ignored and objects are identified by their
+    class, as they cannot be compared between runs.
+    '''
+    if isinstance(value, dict):
+        items = [ (repr(k), fingerprint(v)) for (k, v) in value.iteritems() if not (isinstance(k, basestring) and k.startswith('_')) ]
+        items.sort()
+        return '{' + ','.join([ k + ':' + v for (k, v) in items ]) + '}'
+    elif isinstance(value, (list, tuple)):
+        return '[' + ','.join([ fingerprint(v) for v in value ]) + ']'
+    elif value is None or isinstance(value, (basestring, int, long, float, bool)):
+        return repr(value)
+    else:
+        return '<' + value.__class__.__name__ + '>'
+
+def definition(value, context=None, seen=None):
+    '''
+    Text identifying the configuration of an element tree just loaded,
+    including the content of the files it includes. Two trees with the
+    same definition are configured the same way, e.g. a reloaded service
+    can be kept with its caches if its definition did not change.
+    Internal attributes (starting with '_') are ignored.
+    '''
+    from wfcommon.generic.include import IncludeElement
+
+    if seen is None:
+        seen = set()
+    if isinstance(value, (dict, list, tuple)) or value is None or isinstance(value, (basestring, int, long, float, bool)):
+        if isinstance(value, dict):
+            items = [ (repr(k), definition(v, context, seen)) for (k, v) in value.iteritems() if not (isinstance(k, basestring) and k.startswith('_')) ]
+            items.sort()
+            return '{' + ','.join([ k + ':' + v for (k, v) in items ]) + '}'
+        elif isinstance(value, (list, tuple)):
+            return '[' + ','.join([ definition(v, context, seen) for v in value ]) + ']'
+        else:
+            return repr(value)
+    if id(value) in seen:
+        return '<' + value.__class__.__name__ + '>'
+    seen.add(id(value))
+    if isinstance(value, IncludeElement) and context is not None:
+        # Loads the included file to compare its content
+        value._init(context)
+        included = dict(context)
+        included['_yaml_config_file'] = value.abs_path
+        return '!include(' + definition(value.target, included, seen) + ')'
+    if hasattr(value, '__dict__'):
+        return value.__class__.__name__ + definition(dict(value.__dict__), context, seen)
+    return '<' + value.__class__.__name__ + '>'
+
+cache = ConfigCache()
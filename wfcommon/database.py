@@ -18,6 +18,7 @@
 
 import datetime
 import decimal
+import threading
 
 try:
     import kinterbasdb
@@ -60,8 +61,21 @@ def adjust(obj):
         return obj
 
 
-class DB():
-    dbObject = None
+class DB(object):
+    '''
+    Connections are kept per thread, so that a thread (e.g. a background
+    compaction) does not use the connection of another one.
+    '''
+
+    local = None
+
+    def _get_connection(self):
+        return getattr(self.local, 'connection', None)
+
+    def _set_connection(self, connection):
+        self.local.connection = connection
+
+    dbObject = property(_get_connection, _set_connection)
 
     def __init__(self):
         raise Exception("Method cannot be called")
@@ -69,11 +83,18 @@ class DB():
     def connect(self):
         raise Exception("Method cannot be called")
 
-    def select(self, sql):
+    # Set commit=False to run several statements in one transaction
+    # ended by commit() or rollback(). Parameters are passed to the driver
+    # with its own placeholder style.
+
+    def select(self, sql, commit=True, params=None):
         if self.dbObject == None:
             raise Exception("Not connected to a Database")
         cursor = self.dbObject.cursor()
-        cursor.execute(sql)
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
 
         try:
             while True:
@@ -84,16 +105,31 @@ class DB():
                     break
         finally:
             cursor.close()
-            self.dbObject.commit()
+            if commit:
+                self.dbObject.commit()
 
-    def execute(self, sql):
+    def execute(self, sql, commit=True, params=None):
         if self.dbObject == None:
             raise Exception("Not connected to a Database")
         cursor = self.dbObject.cursor()
-        cursor.execute(sql)
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
         cursor.close()
+        if commit:
+            self.dbObject.commit()
+
+    def commit(self):
+        if self.dbObject == None:
+            raise Exception("Not connected to a Database")
         self.dbObject.commit()
 
+    def rollback(self):
+        if self.dbObject == None:
+            raise Exception("Not connected to a Database")
+        self.dbObject.rollback()
+
     def disconnect(self):
         try:
             self.dbObject.close()
@@ -111,6 +147,7 @@ class FirebirdDB(DB):
         self.user = user
         self.password = str(password)
         self.charset = charset
+        self.local = threading.local()
 
     def connect(self):
         if self.dbObject != None:
@@ -129,6 +166,7 @@ class MySQLDB(DB):
         self.db = db
         self.user = user
         self.password = str(password)
+        self.local = threading.local()
 
     def connect(self):
         if self.dbObject != None:
@@ -149,14 +187,66 @@ except ImportError:
 
 
 class Sqlite3(DB):
-    def __init__(self, filename):
+    '''
+    Connections are kept per thread, sqlite connections cannot be shared
+    between threads.
+
+    pragmas: list of (name, value) executed on each new connection.
+    read_only: the connection refuses to write (query_only pragma).
+    persistent: the connection is kept open after disconnect() and reused,
+    together with its cache of prepared statements.
+    detect_types: let the driver convert the timestamp columns.
+    '''
+    def __init__(self, filename, pragmas=[], read_only=False, persistent=False, detect_types=True):
         self.filename = filename
+        self.pragmas = pragmas
+        self.read_only = read_only
+        self.persistent = persistent
+        self.detect_types = detect_types
+        self.local = threading.local()
+
+    def _get_connection(self):
+        if getattr(self.local, 'connected', False):
+            return self.local.connection
+        return None
+
+    def _set_connection(self, connection):
+        self.local.connection = connection
+        self.local.connected = connection is not None
+
+    dbObject = property(_get_connection, _set_connection)
+
+    def _open(self):
+        if self.detect_types:
+            #http://stackoverflow.com/questions/1829872/read-datetime-back-from-sqlite-as-a-datetime-in-python
+            connection = sqlite3.connect(self.filename,  detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+        else:
+            connection = sqlite3.connect(self.filename)
+        for (name, value) in self.pragmas:
+            connection.execute("PRAGMA %s = %s" % (name, value))
+        if self.read_only:
+            connection.execute("PRAGMA query_only = ON")
+        return connection
 
     def connect(self):
         if self.dbObject != None:
-            raise Exception("MySQL: already connected to %s" % self.filename)
-        #http://stackoverflow.com/questions/1829872/read-datetime-back-from-sqlite-as-a-datetime-in-python
-        self.dbObject = sqlite3.connect(self.filename,  detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+            raise Exception("Sqlite3: already connected to %s" % self.filename)
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or not self.persistent:
+            connection = self._open()
+        self.dbObject = connection
+
+    def disconnect(self):
+        if self.persistent and self.dbObject is not None:
+            # Keep the connection open for the next use in this thread
+            try:
+                self.dbObject.rollback()
+            except:
+                pass
+            self.local.connected = False
+        else:
+            DB.disconnect(self)
+            self.local.connection = None
 
 
 ## Database driver factory
@@ -29,3 +29,17 @@ def merge(dst, src):
                 else:
                     current_dst[key] = current_src[key]
     return dst
+
+def overlay(base, src):
+    '''
+    Returns the merge of src into base without modifying base. Only the
+    dictionaries along the merged paths are copied, so base can be a
+    shared read-only structure.
+    '''
+    result = dict(base)
+    for key in src:
+        if key in result and isinstance(result[key], dict) and isinstance(src[key], dict):
+            result[key] = overlay(result[key], src[key])
+        else:
+            result[key] = src[key]
+    return result
@@ -0,0 +1,310 @@
+#!/usr/bin/python
+
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Before loading other modules add wfrog directory to sys.path to be able to use wfcommon
+import os.path
+import sys
+if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/..'))
+
+import math
+import random
+import time
+import datetime
+import logging
+import optparse
+
+from wfcommon.meteo import DewPoint
+
+class WeatherGenerator(object):
+    '''
+    Generates realistic weather samples: seasonal and diurnal temperature
+    cycles, pressure systems lasting several days, cloudiness driving the
+    rain events and the solar radiation, calm, breezy and windy days.
+
+    The samples only depend on the seed and on their time: each day is
+    generated from its own random generator and from the draws of the
+    previous days, so any period can be generated alone and gives the same
+    samples as when generated within a longer period.
+
+    The samples are dictionaries as written by the logger.
+    '''
+
+    seed = 0
+    period = 300
+    latitude = 46.0
+    mean_temp = 10.0
+    season_amplitude = 9.0
+    sensors = 0
+
+    # Wind regimes: (probability, mean speed in m/s)
+    regimes = [ (0.3, 1.0), (0.5, 3.5), (0.2, 8.0) ]
+
+    def __init__(self, seed=0, period=300, sensors=0):
+        self.seed = seed
+        self.period = period
+        self.sensors = sensors
+        self.draws = {}
+        self.days = {}
+
+    def keys(self):
+        keys = [ 'localtime', 'temp', 'hum', 'wind', 'wind_dir', 'wind_gust', 'wind_gust_dir',
+                 'dew_point', 'rain', 'rain_rate', 'pressure', 'uv_index', 'solar_rad' ]
+        for (temp, hum) in self._sensor_keys():
+            keys = keys + [ temp, hum ]
+        return keys
+
+    def _sensor_keys(self):
+        keys = []
+        for i in range(min(self.sensors, 9)):
+            if i == 0:
+                keys.append(('tempint', 'humint'))
+            else:
+                keys.append(('temp%d' % (i+1), 'hum%d' % (i+1)))
+        return keys
+
+    def _draw(self, ordinal):
+        # Independent draws of one day
+        if not self.draws.has_key(ordinal):
+            if len(self.draws) > 64:
+                self.draws.clear()
+            gen = random.Random(self.seed * 1000003 + ordinal)
+            self.draws[ordinal] = (gen.gauss(0, 1), gen.gauss(0, 1), gen.random(), gen.random())
+        return self.draws[ordinal]
+
+    def _anomaly(self, ordinal, index):
+        # Moving average of the draws gives weather lasting several days
+        return (self._draw(ordinal)[index] * 3 + self._draw(ordinal-1)[index] * 2 + self._draw(ordinal-2)[index]) / 3.74
+
+    def _day(self, ordinal):
+        if self.days.has_key(ordinal):
+            return self.days[ordinal]
+        if len(self.days) > 4:
+            self.days.clear()
+        gen = random.Random(self.seed * 1000003 + ordinal + 500000)
+        day = {}
+        day['temp'] = (self._anomaly(ordinal, 0) * 3.0, self._anomaly(ordinal+1, 0) * 3.0)
+        day['pressure'] = (self._anomaly(ordinal, 1) * 9.0, self._anomaly(ordinal+1, 1) * 9.0)
+        cloud = min(1.0, max(0.0, 0.45 - day['pressure'][0] / 25.0 + (self._draw(ordinal)[2] - 0.5) * 0.5))
+        day['cloud'] = cloud
+
+        # Rain events: (start hour, end hour, rate in mm/h)
+        day['rain'] = []
+        if gen.random() < 0.1 + cloud * 0.6:
+            for i in range(gen.randint(1, 3)):
+                start = gen.uniform(0, 24)
+                day['rain'].append((start, start + gen.uniform(0.3, 4), gen.expovariate(1 / (0.5 + 3 * cloud))))
+
+        windy = self._draw(ordinal)[3] - max(0, -day['pressure'][0]) / 40.0
+        for (probability, speed) in self.regimes:
+            windy = windy - probability
+            if windy < 0:
+                break
+        day['wind'] = speed
+        day['wind_dir'] = gen.gauss(250, 70)
+        day['hum'] = 55 + cloud * 30
+        day['offsets'] = [ gen.uniform(-1.5, 1.5) for i in range(len(self._sensor_keys())) ]
+        day['gen'] = gen.getstate()
+        self.days[ordinal] = day
+        return day
+
+    def _sun(self, doy, hour):
+        decl = math.radians(23.44) * math.sin(2 * math.pi * (284 + doy) / 365.0)
+        lat = math.radians(self.latitude)
+        angle = math.radians(15 * (hour - 12))
+        return math.sin(lat) * math.sin(decl) + math.cos(lat) * math.cos(decl) * math.cos(angle)
+
+    def samples(self, from_time, to_time):
+        '''
+        Generates the samples from from_time (included) to to_time (excluded).
+        '''
+        period = self.period
+        sensor_keys = self._sensor_keys()
+        south = self.latitude < 0
+        day_start = datetime.datetime(from_time.year, from_time.month, from_time.day)
+        while day_start < to_time:
+            ordinal = day_start.toordinal()
+            day = self._day(ordinal)
+            gen = random.Random()
+            gen.setstate(day['gen'])
+            doy = day_start.timetuple().tm_yday
+            season = -math.cos(2 * math.pi * (doy - 20) / 365.25)
+            if south:
+                season = -season
+            mean = self.mean_temp + self.season_amplitude * season
+            diurnal = (3 + 2.5 * (1 + season) / 2) * (1 - 0.6 * day['cloud'])
+            (temp_from, temp_to) = day['temp']
+            (pressure_from, pressure_to) = day['pressure']
+            cloud = day['cloud']
+            wind_base = day['wind']
+            wind_dir = day['wind_dir']
+            events = day['rain']
+
+            temp_noise = 0
+            wind_noise = 0
+            dir_noise = 0
+            bucket = 0
+            t = day_start
+            seconds = 0
+            while seconds < 86400:
+                hour = seconds / 3600.0
+                f = seconds / 86400.0
+                temp_noise = 0.9 * temp_noise + gen.gauss(0, 0.12)
+                wind_noise = 0.8 * wind_noise + gen.gauss(0, 0.25)
+                dir_noise = 0.9 * dir_noise + gen.gauss(0, 6)
+                gust_draw = gen.random()
+
+                rate = 0
+                for (start, end, event_rate) in events:
+                    if start <= hour < end:
+                        rate = rate + event_rate
+                # The rain gauge tips by 0.1 mm
+                bucket = bucket + rate * period / 3600.0
+                rain = int(bucket * 10) / 10.0
+                bucket = bucket - rain
+
+                if t >= from_time and t < to_time:
+                    anomaly = temp_from + (temp_to - temp_from) * f
+                    temp = mean + anomaly + diurnal * math.cos(2 * math.pi * (hour - 15) / 24) + temp_noise
+                    hum = day['hum'] - 2.5 * (temp - mean - anomaly) + temp_noise * 5
+                    if rate > 0:
+                        hum = hum + 20
+                    hum = min(100, max(10, hum))
+                    wind = max(0, wind_base * (1 + 0.3 * math.cos(2 * math.pi * (hour - 14) / 24)) + wind_noise * (1 + wind_base / 4))
+                    gust = wind * (1.3 + 0.5 * gust_draw) + gust_draw
+                    direction = (wind_dir + dir_noise) % 360
+                    sun = self._sun(doy, hour)
+                    solar = max(0, 1000 * sun * (1 - 0.75 * cloud))
+
+                    sample = {
+                        'localtime': t,
+                        'temp': round(temp, 1),
+                        'hum': round(hum),
+                        'wind': round(wind, 1),
+                        'wind_dir': round(direction),
+                        'wind_gust': round(gust, 1),
+                        'wind_gust_dir': round((direction + (gust_draw - 0.5) * 40) % 360),
+                        'dew_point': round(DewPoint(temp, hum), 1),
+                        'rain': rain,
+                        'rain_rate': round(rate, 1),
+                        'pressure': round(1013 + pressure_from + (pressure_to - pressure_from) * f, 1),
+                        'uv_index': int(min(12, solar / 90)),
+                        'solar_rad': round(solar, 1) }
+                    for i in range(len(sensor_keys)):
+                        (temp_key, hum_key) = sensor_keys[i]
+                        if i == 0:
+                            # Interior sensor
+                            sample[temp_key] = round(20 + 0.1 * (temp - 20) + day['offsets'][i], 1)
+                            sample[hum_key] = round(45 + 0.2 * (hum - 45))
+                        else:
+                            sample[temp_key] = round(temp + day['offsets'][i], 1)
+                            sample[hum_key] = round(min(100, hum - day['offsets'][i] * 3))
+                    yield sample
+
+                seconds = seconds + period
+                t = t + datetime.timedelta(0, period)
+            day_start = day_start + datetime.timedelta(1)
+
+class ArchiveGenerator(object):
+    '''
+    Fills a storage with generated samples, for tests and benchmarks.
+    '''
+
+    logger = logging.getLogger('generator')
+
+    def __init__(self, config_file=None):
+        import wfcommon.storage
+        import wfcommon.config
+
+        # Prepare the configurer
+        module_map = (
+            ( "Storages", wfcommon.storage)
+        )
+
+        if config_file is None:
+            config_file = "config/generator.yaml"
+
+        configurer = wfcommon.config.Configurer(module_map)
+
+        # Initialize the option parser
+        opt_parser = optparse.OptionParser()
+        configurer.add_options(opt_parser)
+        opt_parser.add_option("--from", dest="from_date", help="First day. Default: 'years' before today", metavar="YYYY-MM-DD")
+        opt_parser.add_option("--to", dest="to_date", help="Last day (included). Default: yesterday", metavar="YYYY-MM-DD")
+        opt_parser.add_option("--years", dest="years", type="int", default=1, help="Number of years generated. Default: 1")
+        opt_parser.add_option("--seed", dest="seed", type="int", default=0, help="Seed of the generator. Default: 0")
+        opt_parser.add_option("--period", dest="period", type="int", default=300, help="Seconds between two samples. Default: 300")
+        opt_parser.add_option("--sensors", dest="sensors", type="int", default=0, help="Number of additional TH sensors, the first one being the interior sensor. Default: 0")
+        opt_parser.add_option("--batch", dest="batch", type="int", default=5000, help="Samples written at once. Default: 5000")
+
+        # Parse the options and create object trees from configuration
+        (options, args) = opt_parser.parse_args()
+
+        (config, context) = configurer.configure(options, self, config_file)
+
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        self.to_time = parse(options.to_date) + datetime.timedelta(1) if options.to_date else today
+        self.from_time = parse(options.from_date) if options.from_date else self.to_time - datetime.timedelta(int(365.25 * options.years))
+        self.generator = WeatherGenerator(options.seed, options.period, options.sensors)
+        self.batch = options.batch
+
+        self.storage = config['storage']
+        try:
+            self.storage.init(context=context)
+        except AttributeError:
+            pass # In case the element has not init method
+
+    def run(self):
+        self.logger.info("Generating samples from %s to %s", self.from_time, self.to_time)
+        start = time.time()
+        n = 0
+        batch = []
+        for sample in self.generator.samples(self.from_time, self.to_time):
+            batch.append(sample)
+            if len(batch) >= self.batch:
+                self._write(batch)
+                n = n + len(batch)
+                batch = []
+                self.logger.info("Generated %d samples up to %s", n, sample['localtime'])
+        self._write(batch)
+        n = n + len(batch)
+        elapsed = time.time() - start
+        self.logger.info("Generated %d samples in %.1f secs (%.0f samples/s)", n, elapsed, n / max(elapsed, 0.001))
+
+    def _write(self, samples):
+        if len(samples) == 0:
+            return
+        try:
+            self.storage.write_samples(samples)
+        except AttributeError:
+            # Storage without batch writes
+            for sample in samples:
+                self.storage.write_sample(sample)
+
+def parse(date):
+    return datetime.datetime.strptime(date, "%Y-%m-%d")
+
+if __name__ == "__main__":
+    driver = ArchiveGenerator()
+    driver.logger.debug("Started main()")
+    try:
+        driver.run()
+    except:
+        driver.logger.exception("An unexpected error has ocurred while generating samples:")
+    driver.logger.debug("Finished main()")
@@ -20,6 +20,7 @@ import yaml
 
 import include
 import multi
+import profiler
 import service
 import stopwatch
 import user
@@ -32,6 +33,9 @@ class YamlIncludeElement(include.IncludeElement, yaml.YAMLObject):
 class YamlMultiElement(multi.MultiElement, yaml.YAMLObject):
     yaml_tag = u'!multi'
 
+class YamlProfileElement(profiler.ProfileElement, yaml.YAMLObject):
+    yaml_tag = u'!profile'
+
 class YamlServiceElement(service.ServiceElement, yaml.YAMLObject):
     yaml_tag = u'!service'
 
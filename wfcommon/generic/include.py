@@ -16,13 +16,12 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
 import logging
 import wrapper
 import copy
 from os import path
 
-from Cheetah.Template import Template
+from wfcommon.configcache import cache
 
 class IncludeElement(wrapper.ElementWrapper):
     """
@@ -59,8 +58,7 @@ class IncludeElement(wrapper.ElementWrapper):
             if context:
                 self.variables['settings']=context
 
-            conf_str = str(Template(file=file(self.abs_path, "r"), searchList=[self.variables]))
-            config = yaml.load(conf_str)
+            config = cache.load(self.abs_path, self.variables)
             self.target = config.values()[0]
 
             return self.target
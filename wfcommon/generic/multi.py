@@ -45,11 +45,15 @@ class MultiElement(wrapper.ElementWrapper):
     children={}
     threads = []
     parallel = False
+    closed = False
 
     logger = logging.getLogger('generic.multi')
 
     def _call(self, attr, *args, **keywords):
         result = {}
+        if self.parallel:
+            self.threads = []
+            self.closed = False
         for name, r in self.children.iteritems():
 
             self.logger.debug("Calling "+attr+" on child "+name)
@@ -63,22 +67,21 @@ class MultiElement(wrapper.ElementWrapper):
 
 
         if self.parallel:
+            # Returns when closed, e.g. replaced after a configuration
+            # reload. The children threads end after their own close.
             try:
-                while True:
+                while not self.closed:
                     time.sleep(2)
             except KeyboardInterrupt:
                 self.logger.debug("^C received, closing childrens")
                 self.close()
                 raise
 
-            for thread in self.threads:
-                self.logger.debug("Main thread waiting for thread "+str(thread)+" to finish")
-                thread.join()
-
         else:
             return result
 
     def close(self):
+        self.closed = True
         for name, r in self.children.iteritems():
             try:
                 r.close()
@@ -0,0 +1,97 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import wrapper
+import logging
+import thread
+import threading
+import cProfile
+from wfcommon import profiling
+from wfcommon import metrics
+from wfcommon.atomicfile import AtomicFileWriter
+
+# Only one call is profiled at a time, a thread has only one profiler
+lock = threading.Lock()
+
+class ProfileElement(wrapper.ElementWrapper):
+    '''
+    Element wrapper profiling the calls to the wrapped object. After each
+    call, the profile of all the calls so far is written to a file:
+    - cprofile: statistics of the python profiler, in the pstats format
+      (e.g. 'python -m pstats file', snakeviz).
+    - sample: stacks of the calling thread sampled during the calls, in
+      the collapsed format of flame graphs (e.g. flamegraph.pl).
+
+    Calls made while another call is profiled are not profiled.
+
+    [ Properties ]
+
+    target [object]:
+        The wrapped object.
+
+    path [string]:
+        File to write the profile to.
+
+    mode [cprofile|sample] (optional):
+        Kind of profile. Defaults to 'cprofile'.
+
+    interval [numeric] (optional):
+        Seconds between two samples in 'sample' mode. Defaults to 0.005.
+    '''
+
+    target = None
+    path = None
+    mode = 'cprofile'
+    interval = 0.005
+
+    profiler = None
+    counts = None
+
+    logger = logging.getLogger("generic.profile")
+
+    def _call(self, attr, *args, **keywords):
+
+        assert self.target is not None, "'profile.target' must be set"
+        assert self.path is not None, "'profile.path' must be set"
+        assert self.mode in [ 'cprofile', 'sample' ], "'profile.mode' must be 'cprofile' or 'sample'"
+
+        method = self.target.__getattribute__(attr)
+
+        if not lock.acquire(False):
+            return method.__call__(*args, **keywords)
+        try:
+            if self.mode == 'cprofile':
+                if self.profiler is None:
+                    self.profiler = cProfile.Profile()
+                try:
+                    return self.profiler.runcall(method, *args, **keywords)
+                finally:
+                    self.profiler.dump_stats(self.path)
+            else:
+                if self.counts is None:
+                    self.counts = {}
+                sampler = profiling.Sampler(self.interval, [ thread.get_ident() ], self.counts)
+                sampler.start()
+                try:
+                    return method.__call__(*args, **keywords)
+                finally:
+                    sampler.stop()
+                    AtomicFileWriter().write(self.path, profiling.collapse(self.counts), compare=False)
+        finally:
+            lock.release()
+            self.logger.debug("Wrote profile of %s.%s to %s", metrics.element_name(self.target), attr, self.path)
@@ -19,9 +19,14 @@
 import logging
 import wrapper
 
+from wfcommon import configcache
+
 # The global service registry
 services = {}
 
+# Definitions of the registered instances
+definitions = {}
+
 class ServiceElement(wrapper.ElementWrapper):
     """
     Provides a dictionary of objects global to the python process.
@@ -29,6 +34,11 @@ class ServiceElement(wrapper.ElementWrapper):
     are forwarded to the registered object if an instance has already
     been registered. The call does nothing, otherwise. Calls never fail.
 
+    When the configuration is reloaded, a registered instance is kept with
+    its state (e.g. accumulator caches) if its configuration did not
+    change and the init call of the new configuration is not forwarded to
+    it. Otherwise, it is replaced by the new instance.
+
     [ Properties ]
 
     name [string]:
@@ -40,6 +50,8 @@ class ServiceElement(wrapper.ElementWrapper):
 
     name = None
     instance = None
+    registered = False
+    kept = False
 
     logger = logging.getLogger("generic.service")
 
@@ -49,10 +61,24 @@ class ServiceElement(wrapper.ElementWrapper):
 
         global services
 
-        if self.instance:
+        if self.instance and not self.registered:
+            self.registered = True
+            definition = configcache.definition(self.instance, keywords.get('context'))
             if not services.__contains__(self.name):
                 self.logger.debug('Registering service '+str(self.instance)+" under '" + self.name +"'")
                 services[self.name] = self.instance
+                definitions[self.name] = definition
+            elif definitions.has_key(self.name) and definitions[self.name] != definition:
+                self.logger.info("Configuration of service '" + self.name + "' changed, replacing it")
+                services[self.name] = self.instance
+                definitions[self.name] = definition
+            else:
+                self.logger.debug("Keeping service registered under '" + self.name + "', configuration unchanged")
+                self.kept = True
+
+        if self.kept and attr == 'init':
+            # The kept instance is already initialized
+            return
 
         if services.__contains__(self.name):
             self.logger.debug('Calling '+attr+' on ' + str(services[self.name]))
@@ -19,16 +19,24 @@
 import wrapper
 import logging
 import time
+from wfcommon import metrics
+
+calls = metrics.histogram('wfrog_stopwatch_seconds', 'Duration of the calls to elements wrapped in !stopwatch.', [ 'element', 'method' ])
 
 class StopWatchElement(wrapper.ElementWrapper):
     '''
     Element wrapper measuring duration of calls to the wrapped object. 
-    The measures in seconds are output using the log system in level INFO.
+    The measures in seconds are output using the log system in level INFO
+    and added to the metrics of the process (see /metrics on !http).
     
     [ Properties ]
     
     target [object]:
         The wrapped object.
+
+    name [string] (optional):
+        Name of the element in the metrics. Defaults to the tag of the
+        wrapped element.
     
     '''
 
@@ -37,15 +45,18 @@ class StopWatchElement(wrapper.ElementWrapper):
     logger = logging.getLogger("generic.stopwatch")
 
     target = None
+    name = None
 
     def _call(self, attr, *args, **keywords):
 
         if self.measures is None:
             self.measures = {}
 
-        start = time.clock()
+        start = time.time()
         result = self.target.__getattribute__(attr).__call__(*args, **keywords)
-        duration = time.clock() - start
+        duration = time.time() - start
+
+        calls.observe(duration, element=self.name or metrics.element_name(self.target), method=attr)
 
         if self.measures.has_key(attr):
             measure = self.measures.get(attr)
@@ -0,0 +1,153 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import httplib
+import socket
+import errno
+import logging
+import threading
+import time
+
+class HttpClientPool(object):
+    '''
+    Keeps HTTP connections alive between requests and shares them among
+    the threads of the process. The number of simultaneous requests to
+    the same host is limited. Failed requests (connection errors and
+    server errors) are retried with an exponential backoff, without
+    holding the slot of the host while waiting. Requests with a method
+    that is not idempotent (e.g. POST) are only retried when they were not
+    sent: when the connection could not be opened or when a kept alive
+    connection was closed by the server.
+    '''
+
+    idempotent_methods = [ 'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE' ]
+
+    max_per_host = 2
+    max_idle_per_host = 2
+    retries = 3
+    backoff = 2
+    timeout = 30
+
+    logger = logging.getLogger('httpclient')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.slots = {}
+
+    def _slot(self, host):
+        self.lock.acquire()
+        try:
+            if not self.slots.has_key(host):
+                self.slots[host] = threading.Semaphore(self.max_per_host)
+            return self.slots[host]
+        finally:
+            self.lock.release()
+
+    def _get_connection(self, host, timeout):
+        self.lock.acquire()
+        try:
+            connections = self.idle.get(host)
+            if connections:
+                self.logger.debug('Reusing connection to %s' % host)
+                return (connections.pop(), True)
+        finally:
+            self.lock.release()
+        self.logger.debug('Opening connection to %s' % host)
+        return (httplib.HTTPConnection(host, timeout=timeout), False)
+
+    def _release_connection(self, host, connection):
+        self.lock.acquire()
+        try:
+            connections = self.idle.setdefault(host, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        finally:
+            self.lock.release()
+        connection.close()
+
+    def _closed(self, e):
+        # Errors of a kept alive connection closed by the server
+        if isinstance(e, httplib.BadStatusLine):
+            return True
+        return isinstance(e, socket.error) and e.errno in [ errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED ]
+
+    def request(self, host, method, uri, body=None, headers={}, timeout=None):
+        '''
+        Sends a request and returns the tuple (status, reason, data).
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        idempotent = method.upper() in self.idempotent_methods
+        slot = self._slot(host)
+        delay = self.backoff
+        attempt = 0
+        while True:
+            attempt = attempt + 1
+            error = None
+            sent = False
+            slot.acquire()
+            try:
+                (connection, reused) = self._get_connection(host, timeout)
+                try:
+                    if connection.sock is None:
+                        connection.connect()
+                    sent = True
+                    connection.request(method, uri, body, headers)
+                    response = connection.getresponse()
+                    data = (response.status, response.reason, response.read())
+                except (httplib.HTTPException, socket.error), e:
+                    connection.close()
+                    if reused and self._closed(e):
+                        # The server did not get the request, try again at once
+                        self.logger.debug('Connection to %s was closed: %s' % (host, str(e)))
+                        attempt = attempt - 1
+                        continue
+                    error = e
+                else:
+                    if response.will_close:
+                        connection.close()
+                    else:
+                        self._release_connection(host, connection)
+            finally:
+                slot.release()
+
+            if error is not None:
+                if attempt > self.retries or (sent and not idempotent):
+                    raise error
+                self.logger.warning('Error requesting %s%s (retrying in %d secs.): %s' % (host, uri, delay, str(error)))
+            elif data[0] >= 500 and idempotent and attempt <= self.retries:
+                self.logger.warning('Server %s returned %d %s (retrying in %d secs.)' % (host, data[0], data[1], delay))
+            else:
+                return data
+            time.sleep(delay)
+            delay = delay * 2
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+        finally:
+            self.lock.release()
+
+# The HTTP client pool shared by the whole process
+pool = HttpClientPool()
@@ -21,6 +21,11 @@
 import optparse
 import logging
 import logging.handlers
+import threading
+import atexit
+from Queue import Queue, Full, Empty
+
+from wfcommon import metrics
 
 levels = {'debug': logging.DEBUG,
           'info': logging.INFO,
@@ -39,8 +44,16 @@ handlers [dict]:
     Dictionary configuring handlers. Keys are free names, values are:
     - handler: A python loghandler object, the actual log destination.
     - level: Optional log level for this handler.
+
+queue [true|false|dict] (optional):
+    Writes the logs in a background thread, so that logging does not wait
+    for the handlers (files, mail). Records are dropped when the queue is
+    full. Default to false. A dict configures the queue:
+    - size: Maximum number of records waiting. Default to 1000.
 '''
 
+    listener = None
+
     def add_options(self, opt_parser):
         opt_parser.add_option("-d", "--debug", action="store_true", dest="debug", help="Issues all debug messages on the console.")
         opt_parser.add_option("-v", "--verbose", action="store_true", dest="verbose", help="Issues errors on the console.")
@@ -52,6 +65,8 @@ handlers [dict]:
         logger = logging.getLogger() # root logger
 
         level = logging.INFO
+        handlers = []
+        queue_config = False
 
         if config.has_key('logging'):
 
@@ -63,6 +78,9 @@ handlers [dict]:
             if logging_config.has_key('format'):
                 formatter = logging.Formatter(logging_config['format'])
 
+            if logging_config.has_key('queue'):
+                queue_config = logging_config['queue']
+
             if logging_config.has_key('handlers'):
                 handlers_config = logging_config['handlers']
 
@@ -81,7 +99,7 @@ handlers [dict]:
 
                     handler.setFormatter(formatter)
 
-                    logger.addHandler(handler)
+                    handlers.append(handler)
 
             # If no handler is specified, by default a RotatingFileHandler with a 
             # {$process.log} filename  (see issue 85)
@@ -97,7 +115,7 @@ handlers [dict]:
                                                                maxBytes = 262144, 
                                                                backupCount = 3)
                 handler.setFormatter(formatter)
-                logger.addHandler(handler)
+                handlers.append(handler)
 
         if options.debug or options.verbose:
             if options.debug:
@@ -106,6 +124,126 @@ handlers [dict]:
                 level=logging.ERROR
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
+
+        if self.listener is not None:
+            logger.removeHandler(self.listener.queue_handler)
+            self.listener.stop()
+            listeners.remove(self.listener)
+            self.listener = None
+
+        if queue_config:
+            size = 1000
+            if isinstance(queue_config, dict) and queue_config.has_key('size'):
+                size = queue_config['size']
+            self.listener = QueueListener(Queue(size), handlers)
+            self.listener.start()
+            logger.addHandler(self.listener.queue_handler)
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
 
         logger.setLevel(level)
+
+dropped = metrics.counter('wfrog_log_dropped_total', 'Log records dropped because the logging queue was full.', [ 'level' ])
+
+class QueueHandler(logging.Handler):
+    '''
+    Puts the records in a queue without waiting. The message and exception
+    text are computed in the calling thread, the arguments may not be
+    valid anymore when the record is written.
+    '''
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Full:
+            dropped.inc(level=record.levelname)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+_formatter = logging.Formatter()
+
+# Started listeners, see after_fork()
+listeners = []
+
+class QueueListener(object):
+    '''
+    Thread writing the records of a queue to the handlers. The records left
+    are written at exit.
+    '''
+
+    _stop = object()
+
+    def __init__(self, queue, handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self.queue_handler = QueueHandler(queue)
+        self.thread = None
+        metrics.gauge('wfrog_log_queue_depth', 'Log records waiting to be written.').set_function(queue.qsize)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='logging')
+        self.thread.setDaemon(True)
+        self.thread.start()
+        if self not in listeners:
+            listeners.append(self)
+            atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._stop:
+                break
+            self.handle(record)
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def stop(self, timeout=10):
+        if self.thread is None:
+            return
+        thread = self.thread
+        self.thread = None
+        try:
+            # Waits if the queue is full, the thread is emptying it
+            self.queue.put(self._stop, True, timeout)
+            thread.join(timeout)
+        except Full:
+            pass
+        for handler in self.handlers:
+            handler.flush()
+
+def after_fork():
+    '''
+    Starts again the logging threads in a forked process, which has only
+    the thread that forked.
+    '''
+    for listener in listeners:
+        if listener.thread is not None:
+            listener.start()
+
+def flush():
+    '''
+    Writes the queued records, e.g. before a forked process exits with
+    os._exit().
+    '''
+    for listener in listeners:
+        listener.stop()
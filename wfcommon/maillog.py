@@ -22,14 +22,22 @@ import logging
 import logging.handlers
 import string
 import types
+import time
+import threading
  
 class mySMTPHandler(logging.handlers.SMTPHandler):
     """
-    A customized handler class which sends an SMTP email for each
-    logging event, and supports TLS smtp servers, like gmail
+    A customized handler class which sends logging events by SMTP email,
+    and supports TLS smtp servers, like gmail.
+
+    The events are sent in digests: one email at most every interval
+    seconds, with the events logged since the previous one. The first
+    event after a quiet interval is sent right away. Emails are always
+    sent from a timer thread, so that logging never waits for the SMTP
+    server.
     """
 
-    def __init__(self, mailhost, fromaddr, toaddrs, subject, credentials=None):
+    def __init__(self, mailhost, fromaddr, toaddrs, subject, credentials=None, interval=300, capacity=100, timeout=30):
         """
         Initialize the handler.
  
@@ -38,7 +46,12 @@ class mySMTPHandler(logging.handlers.SMTPHandler):
         (host, port) tuple format for the mailhost argument. To specify
         authentication credentials, supply a (username, password) tuple
         for the credentials argument. If TLS is required (gmail) it will
-        be activated automatically
+        be activated automatically.
+
+        interval is the minimum number of seconds between two emails, 0
+        sends an email for each event. capacity is the maximum number of
+        events in an email, the next ones are only counted. timeout is
+        the number of seconds to wait for the SMTP server.
         """
         logging.handlers.SMTPHandler.__init__(self, mailhost, fromaddr, toaddrs, subject)
  
@@ -48,14 +61,81 @@ class mySMTPHandler(logging.handlers.SMTPHandler):
         else:
             self.username = None
 
+        self.interval = interval
+        self.capacity = capacity
+        self.timeout = timeout
+        self.buffer = []
+        self.omitted = 0
+        self.last_sent = 0
+        self.timer = None
+        # Serializes the SMTP sessions, which run outside the handler lock
+        self.sending = threading.Lock()
 
     def emit(self, record):
         """
         Emit a record.
  
-        Format the record and send it to the specified addressees.
+        Adds the record to the digest, sent at once if the last email is
+        older than the interval, otherwise when the interval elapses.
         """
+        self.acquire()
+        try:
+            if len(self.buffer) < self.capacity:
+                self.buffer.append(record)
+            else:
+                self.omitted += 1
+            if self.timer is None:
+                delay = max(0, self.last_sent + self.interval - time.time())
+                self.timer = threading.Timer(delay, self._expire)
+                self.timer.setDaemon(True)
+                self.timer.start()
+        finally:
+            self.release()
+
+    def _expire(self):
+        self.acquire()
+        try:
+            self.timer = None
+            (records, omitted) = self._take()
+        finally:
+            self.release()
+        self._send(records, omitted)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            (records, omitted) = self._take()
+        finally:
+            self.release()
+        self._send(records, omitted)
+
+    def close(self):
+        self.flush()
+        logging.handlers.SMTPHandler.close(self)
+
+    def _take(self):
+        # Called with the lock held, the email is sent after releasing it
+        records = self.buffer
+        omitted = self.omitted
+        self.buffer = []
+        self.omitted = 0
+        if len(records) > 0:
+            self.last_sent = time.time()
+        return (records, omitted)
+
+    def _send(self, records, omitted):
+        if len(records) == 0:
+            return
+        self.sending.acquire()
+        try:
+            self._sendmail(records, omitted)
+        finally:
+            self.sending.release()
 
+    def _sendmail(self, records, omitted):
         try:
             try:
                 from email.utils import formatdate
@@ -64,16 +144,22 @@ class mySMTPHandler(logging.handlers.SMTPHandler):
             port = self.mailport
             if not port:
                 port = smtplib.SMTP_PORT
-            smtp = smtplib.SMTP(self.mailhost, port)
-            msg = self.format(record)
+            subject = self.getSubject(records[0])
+            if len(records) + omitted > 1:
+                subject = "%s (%d messages)" % (subject, len(records) + omitted)
+            msg = string.join([ self.format(record) for record in records ], "\r\n")
+            if omitted > 0:
+                msg = msg + "\r\n\r\n%d more messages were not included." % omitted
             msg = "From: %s\r\nTo: %s\r\nSubject: %s\r\nDate: %s\r\n\r\n%s" % (
                             self.fromaddr,
                             string.join(self.toaddrs, ","),
-                            self.getSubject(record),
+                            subject,
                             formatdate(), msg)
+            smtp = smtplib.SMTP(self.mailhost, port, timeout=self.timeout)
             smtp.ehlo()
             if smtp.has_extn('STARTTLS'):
                 smtp.starttls()
+                smtp.ehlo()
             if self.username:
                 smtp.login(self.username, self.password)
             smtp.sendmail(self.fromaddr, self.toaddrs, msg)
@@ -81,7 +167,7 @@ class mySMTPHandler(logging.handlers.SMTPHandler):
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
-            self.handleError(record)
+            self.handleError(records[0])
 
 # Test mySMTPHandler
 if __name__ == '__main__':
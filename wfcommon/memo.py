@@ -0,0 +1,84 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from wfcommon.generic.service import ServiceElement
+
+class RenderMemo(object):
+    '''
+    Memoizes the results of datasource executions during one render pass.
+
+    A memo is created at the start of each pass (see RenderEngine.process
+    and HttpRendererHandler) and put in the context under the '_memo' key.
+    The results are shared between all renderers of the pass and must be
+    considered read-only.
+
+    The memo key is made of the datasource (or service name) and the scalar values of the
+    data passed to it (e.g. 'time_end'). Structures produced by other
+    datasources are not part of the key.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+        self.locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __deepcopy__(self, memo):
+        # The memo is shared by all the copies of a render pass context
+        return self
+
+    def _key(self, source, data):
+        args = []
+        for key, value in data.iteritems():
+            if value is None or isinstance(value, (basestring, int, long, float, bool)):
+                args.append((key, value))
+        args.sort()
+        if isinstance(source, ServiceElement):
+            # Several !service elements can refer to the same datasource
+            return ('service:' + source.name, tuple(args))
+        else:
+            return (id(source), tuple(args))
+
+    def execute(self, source, data={}, context={}):
+        '''
+        Returns the result of source.execute(), executing it only once per
+        datasource and data arguments. Concurrent renderers asking for the
+        same result wait for the first one to compute it.
+        '''
+        key = self._key(source, data)
+        self.lock.acquire()
+        try:
+            if not self.locks.has_key(key):
+                self.locks[key] = threading.Lock()
+            key_lock = self.locks[key]
+        finally:
+            self.lock.release()
+
+        key_lock.acquire()
+        try:
+            if self.results.has_key(key):
+                self.hits += 1
+                return self.results[key]
+            self.misses += 1
+            result = source.execute(data=data, context=context)
+            self.results[key] = result
+            return result
+        finally:
+            key_lock.release()
@@ -0,0 +1,305 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import logging
+
+# Process-wide metrics: counters, gauges and latency histograms, exported
+# in the Prometheus text format on /metrics by the !http renderer and by
+# the HTTP input of the logger. Modules declare the metrics they update:
+#
+#   events = metrics.counter('wfrog_events_total', 'Events received.', [ 'queue', 'type' ])
+#   events.inc(queue='logger', type='temp')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from fast event handling to slow page rendering
+DEFAULT_BUCKETS = ( 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30 )
+
+logger = logging.getLogger('metrics')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+class Metric(object):
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        assert len(labels) == len(self.labels) and all([ labels.has_key(label) for label in self.labels ]), \
+            "Metric %s has labels %s, got %s" % (self.name, ', '.join(self.labels), ', '.join(labels.keys()))
+        return tuple([ str(labels[label]) for label in self.labels ])
+
+    def _label_text(self, key, extra=()):
+        pairs = zip(self.labels, key) + list(extra)
+        if len(pairs) == 0:
+            return ''
+        return '{' + ','.join([ '%s="%s"' % (name, _escape(value)) for (name, value) in pairs ]) + '}'
+
+    def _items(self):
+        self.lock.acquire()
+        try:
+            return sorted(self.values.items())
+        finally:
+            self.lock.release()
+
+    def text(self):
+        lines = [ '# HELP %s %s' % (self.name, self.help.replace('\n', ' ')),
+                  '# TYPE %s %s' % (self.name, self.type) ]
+        for (key, value) in self._items():
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+    def _sample_lines(self, key, value):
+        return [ '%s%s %s' % (self.name, self._label_text(key), _number(value)) ]
+
+class Counter(Metric):
+    '''
+    Value increasing only, e.g. a number of events.
+    '''
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.lock.acquire()
+        try:
+            self.values[key] = self.values.get(key, 0) + amount
+        finally:
+            self.lock.release()
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+    '''
+    Value going up and down, e.g. the depth of a queue. The value can be
+    given by a function called at export time.
+    '''
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        self.lock.acquire()
+        try:
+            self.values[key] = value
+        finally:
+            self.lock.release()
+
+    def set_function(self, function, **labels):
+        self.set(function, **labels)
+
+    def value(self, **labels):
+        value = self.values.get(self._key(labels))
+        if callable(value):
+            value = value()
+        return value
+
+    def _sample_lines(self, key, value):
+        if callable(value):
+            try:
+                value = value()
+            except Exception, e:
+                logger.warning("Cannot read gauge %s: %s", self.name, str(e))
+                return []
+        return Metric._sample_lines(self, key, value)
+
+class Timer(object):
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.histogram.observe(time.time() - self.start, **self.labels)
+        return False
+
+class Histogram(Metric):
+    '''
+    Distribution of durations in seconds, counted in cumulative buckets.
+    '''
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + ( float('inf'), )
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        self.lock.acquire()
+        try:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = [ [ 0 ] * len(self.buckets), 0.0, 0 ]
+                self.values[key] = entry
+            counts = entry[0]
+            for i in range(len(self.buckets)):
+                if value <= self.buckets[i]:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+        finally:
+            self.lock.release()
+
+    def time(self, **labels):
+        '''
+        Returns a context manager observing the duration of its block.
+        '''
+        return Timer(self, labels)
+
+    def count(self, **labels):
+        entry = self.values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _items(self):
+        self.lock.acquire()
+        try:
+            return [ (key, (list(counts), sum, count)) for (key, (counts, sum, count)) in sorted(self.values.items()) ]
+        finally:
+            self.lock.release()
+
+    def _sample_lines(self, key, value):
+        (counts, sum, count) = value
+        lines = []
+        cumulated = 0
+        for i in range(len(self.buckets)):
+            cumulated += counts[i]
+            lines.append('%s_bucket%s %d' % (self.name, self._label_text(key, [ ('le', _number(self.buckets[i])) ]), cumulated))
+        lines.append('%s_sum%s %s' % (self.name, self._label_text(key), _number(sum)))
+        lines.append('%s_count%s %d' % (self.name, self._label_text(key), count))
+        return lines
+
+class Registry(object):
+    '''
+    Holds the metrics by name. Declaring a metric already declared returns
+    the existing one, so that modules declare the metrics they use.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help, labels, **keywords):
+        self.lock.acquire()
+        try:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, help, labels, **keywords)
+                self.metrics[name] = metric
+            assert isinstance(metric, cls) and metric.labels == tuple(labels), \
+                "Metric %s already declared with another type or labels" % name
+            return metric
+        finally:
+            self.lock.release()
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def text(self):
+        '''
+        Returns the metrics in the Prometheus text format.
+        '''
+        self.lock.acquire()
+        try:
+            metrics = sorted(self.metrics.items())
+        finally:
+            self.lock.release()
+        lines = []
+        for (name, metric) in metrics:
+            lines.extend(metric.text())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.metrics.clear()
+        finally:
+            self.lock.release()
+
+registry = Registry()
+
+def counter(name, help, labels=()):
+    return registry.counter(name, help, labels)
+
+def gauge(name, help, labels=()):
+    return registry.gauge(name, help, labels)
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return registry.histogram(name, help, labels, buckets)
+
+def text():
+    return registry.text()
+
+def element_name(element):
+    '''
+    Name of a configuration element used in labels, e.g. '!sqlite3'.
+    '''
+    if hasattr(element, 'yaml_tag'):
+        return element.yaml_tag
+    elif hasattr(element, '__class__'):
+        return element.__class__.__name__
+    else:
+        return str(element)
+
+def timed_iter(histogram, iterable, **labels):
+    '''
+    Yields the items of iterable and observes the time spent producing
+    them, excluding the time spent by the consumer.
+    '''
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.time()
+            try:
+                item = iterator.next()
+            except StopIteration:
+                elapsed += time.time() - start
+                break
+            elapsed += time.time() - start
+            yield item
+    finally:
+        histogram.observe(elapsed, **labels)
@@ -0,0 +1,179 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import os.path
+import time
+import thread
+import threading
+import tempfile
+import signal
+import logging
+
+# Stacks of the threads of the process in the collapsed format read by
+# flame graph tools (e.g. flamegraph.pl), one line per distinct stack:
+#
+#   thread;function (file:line);function (file:line) count
+#
+# The stacks start with the thread name and the outermost function.
+
+logger = logging.getLogger('profiling')
+
+def frame_names(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+def collapse(counts):
+    '''
+    Returns the collapsed text of stacks counted in a dict.
+    '''
+    lines = [ '%s %d' % (';'.join([ name.replace(';', ':') for name in stack ]), count) for (stack, count) in counts.iteritems() ]
+    lines.sort()
+    return '\n'.join(lines) + '\n'
+
+class Sampler(object):
+    '''
+    Counts the stacks of the threads, sampled at a regular interval. The
+    sampling thread itself is not counted unless 'current' is set.
+    '''
+
+    def __init__(self, interval=0.01, threads=None, counts=None, current=False):
+        self.interval = interval
+        self.threads = threads
+        self.current = current
+        self.counts = counts if counts is not None else {}
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        names = dict([ (t.ident, t.name) for t in threading.enumerate() ])
+        current = thread.get_ident()
+        for (ident, frame) in sys._current_frames().items():
+            if (ident == current and not self.current) or (self.threads is not None and ident not in self.threads):
+                continue
+            stack = (names.get(ident, str(ident)),) + tuple(frame_names(frame))
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+        self.samples += 1
+
+    def run(self, duration):
+        '''
+        Samples in the calling thread during duration seconds.
+        '''
+        end = time.time() + duration
+        while time.time() < end and not self.stopped.isSet():
+            self.sample()
+            time.sleep(self.interval)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, args=(sys.maxint,), name='sampler')
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def text(self):
+        return collapse(self.counts)
+
+def stacks():
+    '''
+    Returns the current stacks of all threads, in the collapsed format.
+    '''
+    sampler = Sampler(current=True)
+    sampler.sample()
+    return sampler.text()
+
+def sample(duration, interval=0.01):
+    '''
+    Samples the stacks of all threads during duration seconds and returns
+    them in the collapsed format.
+    '''
+    sampler = Sampler(interval)
+    sampler.run(duration)
+    return sampler.text()
+
+def parse_seconds(value):
+    '''
+    Returns the sampling duration given by the 'seconds' parameter of a
+    /stacks request (at most 60), or None if not given. Raises ValueError
+    if it is not a positive number.
+    '''
+    if value is None:
+        return None
+    seconds = float(value)
+    if not seconds >= 0:
+        # Negative or NaN
+        raise ValueError("invalid duration: %s" % value)
+    return min(60, seconds)
+
+def text(seconds=None):
+    '''
+    Returns the current stacks, or the stacks sampled during seconds (at
+    most 60), e.g. for the 'seconds' parameter of a /stacks request.
+    '''
+    if seconds is None:
+        return stacks()
+    return sample(min(60, float(seconds)))
+
+def install(duration=10):
+    '''
+    Logs the stacks of all threads on SIGUSR1. On SIGUSR2, samples them
+    during duration seconds and writes them in a file of the temporary
+    directory.
+    '''
+    try:
+        signal.signal(signal.SIGUSR1, _log_stacks)
+        signal.signal(signal.SIGUSR2, lambda signum, frame: _start_sampling(duration))
+        # Restarts the system calls interrupted by the signals when possible
+        signal.siginterrupt(signal.SIGUSR1, False)
+        signal.siginterrupt(signal.SIGUSR2, False)
+        logger.info("Logging the thread stacks on SIGUSR1, sampling them %d seconds on SIGUSR2 (process %d)", duration, os.getpid())
+    except (AttributeError, ValueError), e:
+        # Not on this system or not in the main thread
+        logger.warning("Cannot install the stack dump signals: %s", str(e))
+
+def _log_stacks(signum, frame):
+    logger.info("Thread stacks:\n%s", stacks())
+
+def _start_sampling(duration):
+    sampling = threading.Thread(target=_write_sample, args=(duration,), name='sampling')
+    sampling.setDaemon(True)
+    sampling.start()
+
+def _write_sample(duration):
+    try:
+        text = sample(duration)
+        filename = os.path.join(tempfile.gettempdir(), 'wfrog-%d-%s.stacks' % (os.getpid(), time.strftime('%Y%m%d-%H%M%S')))
+        file = open(filename, 'w')
+        try:
+            file.write(text)
+        finally:
+            file.close()
+        logger.info("Wrote the stacks sampled during %d seconds to %s", duration, filename)
+    except Exception, e:
+        logger.exception(e)
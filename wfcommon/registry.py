@@ -0,0 +1,105 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import logging
+import threading
+import yaml
+
+class LazyElement(object):
+    '''
+    A configuration !element whose module is imported only when its tag
+    is used in a configuration file.
+    '''
+
+    def __init__(self, package, tag, module, class_name, summary):
+        self.package = package
+        self.tag = tag
+        self.module = module
+        self.class_name = class_name
+        self.summary = summary
+        self.yaml_class = None
+
+    def load(self):
+        '''
+        Imports the module and returns the yaml class of the element.
+        '''
+        if self.yaml_class is None:
+            module = load_module(self.package + '.' + self.module)
+            element_class = getattr(module, self.class_name)
+            # Same as the explicit mappings of the other packages, the
+            # metaclass registers the constructor of the tag
+            self.yaml_class = type(yaml.YAMLObject)(str('Yaml' + self.class_name), (element_class, yaml.YAMLObject),
+                                                    { 'yaml_tag': self.tag, '__module__': self.package })
+        return self.yaml_class
+
+    def construct(self, loader, node):
+        return self.load().from_yaml(loader, node)
+
+class LazyModule(object):
+    '''
+    Module imported on first attribute access, e.g. for the station
+    drivers probed by !auto.
+    '''
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self.__dict__['_module'] = load_module(self._name)
+        return getattr(self._module, attr)
+
+lock = threading.RLock()
+
+def load_module(name):
+    lock.acquire()
+    try:
+        __import__(name)
+        return sys.modules[name]
+    finally:
+        lock.release()
+
+class Registry(object):
+    '''
+    Maps the yaml tags of a package to the modules defining them. The
+    package module lists its elements with a one-line summary used by the
+    -H help, so that listing them does not import them.
+    '''
+
+    logger = logging.getLogger('config.registry')
+
+    def __init__(self, package):
+        self.package = package
+        self.elements = {}
+
+    def register(self, tag, module, class_name, summary):
+        element = LazyElement(self.package, tag, module, class_name, summary)
+        self.elements[tag] = element
+        yaml.add_constructor(tag, element.construct)
+        return element
+
+    def module(self, module):
+        return LazyModule(self.package + '.' + module)
+
+    def loaded(self):
+        '''
+        Returns the tags whose modules were imported.
+        '''
+        return [ tag for (tag, element) in self.elements.iteritems() if element.yaml_class is not None ]
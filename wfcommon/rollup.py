@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+
+# Before loading other modules add wfrog directory to sys.path to be able to use wfcommon
+import os.path
+import sys
+if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/..'))
+
+import wfcommon.storage
+import optparse
+import logging
+import datetime
+import wfcommon.config
+
+class RollupBackfill(object):
+    '''
+    Fills the summary tables of a database storage from the samples
+    already in the archive. Days are processed and committed one by one,
+    use --from to resume an interrupted backfill.
+    '''
+
+    logger = logging.getLogger('rollup')
+
+    def __init__(self, config_file=None):
+
+        # Prepare the configurer
+        module_map = (
+            ( "Storages", wfcommon.storage)
+        )
+
+        if config_file is None:
+            config_file = "config/rollup.yaml"
+
+        configurer = wfcommon.config.Configurer(module_map)
+
+        # Initialize the option parser
+        opt_parser = optparse.OptionParser()
+        configurer.add_options(opt_parser)
+        opt_parser.add_option("--from", dest="from_date", help="First day to fill", metavar="YYYY-MM-DD")
+        opt_parser.add_option("--to", dest="to_date", help="Last day to fill", metavar="YYYY-MM-DD")
+
+        # Parse the options and create object trees from configuration
+        (options, args) = opt_parser.parse_args()
+
+        (config, context) = configurer.configure(options, self, config_file)
+
+        self.from_time = parse(options.from_date) if options.from_date else None
+        self.to_time = parse(options.to_date) + datetime.timedelta(1) if options.to_date else None
+
+        self.storage = config['storage']
+        self.storage.rollups = True
+        self.storage.init(context=context)
+
+    def run(self):
+        n = self.storage.backfill_rollups(self.from_time, self.to_time)
+        self.logger.info("Processed %d samples" % n)
+
+def parse(date):
+    return datetime.datetime.strptime(date, "%Y-%m-%d")
+
+if __name__ == "__main__":
+    driver = RollupBackfill()
+    driver.logger.debug("Started main()")
+    try:
+        driver.run()
+    except:
+        driver.logger.exception("An unexpected error has ocurred while filling the summary tables:")
+    driver.logger.debug("Finished main()")
@@ -0,0 +1,119 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import mmap
+import struct
+import time
+import weakref
+import logging
+import cPickle
+
+# Values shared between the processes of a pre-forked renderer (see the
+# 'workers' property of !http). A segment is an anonymous shared memory
+# map allocated before forking. One process writes the pickled value,
+# the others read the last one written:
+#
+#   generation (8 bytes)  odd while the value is being written
+#   length (4 bytes)
+#   pickled value
+#
+# Readers retry if the generation changed while they were reading.
+
+HEADER = struct.Struct('=QI')
+
+logger = logging.getLogger('sharedmem')
+
+class Segment(object):
+    '''
+    Shared memory holding one value, written by one process at a time.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.map = mmap.mmap(-1, HEADER.size + size)
+
+    def _header(self):
+        return HEADER.unpack(self.map[0:HEADER.size])
+
+    def write(self, value):
+        '''
+        Publishes the value. Returns False if the value does not fit.
+        '''
+        data = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+        if len(data) > self.size:
+            return False
+        (generation, length) = self._header()
+        self.map[0:HEADER.size] = HEADER.pack(generation + 1, length)
+        self.map[HEADER.size:HEADER.size + len(data)] = data
+        self.map[0:HEADER.size] = HEADER.pack(generation + 2, len(data))
+        return True
+
+    def read(self, retries=100):
+        '''
+        Returns the last value published, or None if none was.
+        '''
+        for i in range(retries):
+            (generation, length) = self._header()
+            if generation == 0:
+                return None
+            if generation % 2 == 0:
+                data = self.map[HEADER.size:HEADER.size + length]
+                if self._header()[0] == generation:
+                    return cPickle.loads(data)
+            time.sleep(0.001)
+        raise IOError("Shared value kept changing while reading it")
+
+    def published(self):
+        return self._header()[0] > 0
+
+# Elements publishing values in segments, e.g. !shared datasources. They
+# provide prepare() allocating their segment and refresh(context)
+# publishing their value, returning the delay before the next refresh.
+producers = weakref.WeakValueDictionary()
+
+def register(producer):
+    producers[id(producer)] = producer
+
+def prepare():
+    '''
+    Allocates the segments of the registered producers. Must be called
+    before forking. Returns the producers.
+    '''
+    current = producers.values()
+    for producer in current:
+        producer.prepare()
+    return current
+
+def produce(current, context, stopped):
+    '''
+    Refreshes the values of the producers until the stopped event is set.
+    '''
+    due = {}
+    while not stopped.isSet():
+        now = time.time()
+        for producer in current:
+            if due.get(id(producer), 0) <= now:
+                try:
+                    due[id(producer)] = now + producer.refresh(context)
+                except Exception, e:
+                    logger.exception(e)
+                    due[id(producer)] = now + 10
+        if len(due) > 0:
+            stopped.wait(max(0.1, min(due.values()) - time.time()))
+        else:
+            stopped.wait(1)
@@ -23,12 +23,19 @@ import firebird
 import mysql
 import sqlite3
 import simulator
+import retention
+import cached
+import partitioned
+import replicated
 
 # YAML mappings
 
 class YamlCsvStorage(csvfile.CsvStorage, yaml.YAMLObject):
     yaml_tag = u'!csv'
 
+class YamlPartitionedCsvStorage(partitioned.PartitionedCsvStorage, yaml.YAMLObject):
+    yaml_tag = u'!partitioned-csv'
+
 class YamlFirebirdStorage(firebird.FirebirdStorage, yaml.YAMLObject):
     yaml_tag = u'!firebird'
 
@@ -40,3 +47,12 @@ class YamlSqlite3Storage(sqlite3.Sqlite3Storage, yaml.YAMLObject):
 
 class YamlSimulatorStorage(simulator.SimulatorStorage, yaml.YAMLObject):
     yaml_tag = u'!simulator-storage'
+
+class YamlRetentionStorage(retention.RetentionStorage, yaml.YAMLObject):
+    yaml_tag = u'!retention'
+
+class YamlCachedStorage(cached.CachedStorage, yaml.YAMLObject):
+    yaml_tag = u'!cached-storage'
+
+class YamlReplicatedStorage(replicated.ReplicatedStorage, yaml.YAMLObject):
+    yaml_tag = u'!replicated'
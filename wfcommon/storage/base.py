@@ -18,6 +18,8 @@
 
 import time
 from datetime import datetime
+from datetime import timedelta
+from wfcommon import meteo
 
 class DatabaseStorage(object):
     '''
@@ -39,9 +41,20 @@ class DatabaseStorage(object):
     # Database storages should rewrite the storage_fields variable with the actual available fields
     storage_fields = mandatory_storage_fields
 
+    # Maintain the hourly and daily summary tables
+    rollups = False
 
-    def write_sample(self, sample, context={}):
 
+    # Connection used for reading, if different from the one writing
+    read_db = None
+
+    def _reader(self):
+        if self.read_db is not None:
+            return self.read_db
+        else:
+            return self.db
+
+    def _insert_statement(self, sample):
         timestamp = time.mktime(sample['localtime'].timetuple())
         utc_time = datetime.utcfromtimestamp(timestamp)
         sql =  "INSERT INTO %s (TIMESTAMP_UTC, TIMESTAMP_LOCAL, %s) VALUES (%s, %s, %s)" % (
@@ -50,12 +63,49 @@ class DatabaseStorage(object):
                   "'%s'" % utc_time.strftime(self.time_format),
                   "'%s'" % sample['localtime'].strftime(self.time_format),
                   ', '.join(map(lambda x: self.format(sample[x.lower()] if x.lower() in sample else None), self.storage_fields)))
+        return (sql, None)
+
+    def write_sample(self, sample, context={}):
+
+        (sql, params) = self._insert_statement(sample)
         try:
             self.db.connect()
-            self.db.execute(sql)
+            if self.rollups:
+                # The summary tables are updated in the same transaction
+                self.db.execute(sql, commit=False, params=params)
+                self._update_rollups(sample)
+                self.db.commit()
+            else:
+                self.db.execute(sql, params=params)
             self.logger.debug("SQL executed: %s", sql)
         except:
             self.logger.exception("Error writting current data to database")
+            try:
+                self.db.rollback()
+            except:
+                pass
+        finally:
+            self.db.disconnect()
+
+    def write_samples(self, samples, context={}):
+        '''
+        Writes several samples in one transaction. Errors are raised and
+        nothing is written.
+        '''
+        try:
+            self.db.connect()
+            for sample in samples:
+                (sql, params) = self._insert_statement(sample)
+                self.db.execute(sql, commit=False, params=params)
+                if self.rollups:
+                    self._update_rollups(sample)
+            self.db.commit()
+        except:
+            try:
+                self.db.rollback()
+            except:
+                pass
+            raise
         finally:
             self.db.disconnect()
 
@@ -68,6 +118,15 @@ class DatabaseStorage(object):
 
         self.logger.debug("Getting samples for range: %s to %s", from_time, to_time)
 
+        if self.rollups:
+            # Compacted periods are read from the summary tables
+            for sample in self._rollup_samples(from_time, to_time):
+                yield sample
+
+        for sample in self._samples(from_time, to_time):
+            yield sample
+
+    def _select_statement(self, from_time, to_time):
         sql = ( "SELECT TIMESTAMP_UTC, TIMESTAMP_LOCAL, %s FROM %s " + \
                 " WHERE TIMESTAMP_LOCAL >= '%s' AND TIMESTAMP_LOCAL < '%s' "+ \
                 " ORDER BY TIMESTAMP_LOCAL ASC" ) % (
@@ -75,16 +134,564 @@ class DatabaseStorage(object):
                     self.tablename, 
                     from_time.strftime(self.time_format),
                     to_time.strftime(self.time_format))
+        return (sql, None)
 
+    def _samples(self, from_time, to_time):
+
+        (sql, params) = self._select_statement(from_time, to_time)
+        db = self._reader()
         try:
-            self.db.connect()
-            for row in self.db.select(sql):
-                if not isinstance(row[0], datetime):
+            db.connect()
+            for row in db.select(sql, params=params):
+                if not isinstance(row[0], datetime) or not isinstance(row[1], datetime):
                        row = list(row)
-                       row[0] = datetime.strptime(row[0], self.time_format)
+                       row[0] = self._parse_time(row[0])
+                       row[1] = self._parse_time(row[1])
                 yield row
+        finally:
+            db.disconnect()
+
+    # Aggregate functions available for push-down (see aggregate)
+    aggregate_specs = [ 'sum', 'count', 'min', 'max', 'sector' ]
+    math_specs = [ 'wind_x', 'wind_y', 'count_pair' ]
+
+    # Local time parts used to group samples per unit
+    units = [ 'year', 'month', 'day', 'hour', 'minute' ]
+
+    # Whether the database provides the SIN, COS and PI functions
+    math_functions = True
+
+    def aggregate_functions(self, context={}):
+        '''
+        Returns the names of the aggregate specifications supported by
+        aggregate().
+        '''
+        if self.math_functions:
+            return self.aggregate_specs + self.math_specs
+        else:
+            return self.aggregate_specs
+
+    def _group_expressions(self, unit):
+        parts = self.units[:self.units.index(unit)+1]
+        return [ "EXTRACT(%s FROM TIMESTAMP_LOCAL)" % part.upper() for part in parts ]
+
+    def _aggregate_expression(self, spec):
+        function = spec[0]
+        if function in [ 'sum', 'count', 'min', 'max' ]:
+            return "%s(%s)" % (function.upper(), spec[1])
+        elif function == 'wind_x':
+            return "SUM(%s*COS(PI()*(90.0-%s)/180.0))" % (spec[1], spec[2])
+        elif function == 'wind_y':
+            return "SUM(%s*SIN(PI()*(90.0-%s)/180.0))" % (spec[1], spec[2])
+        elif function == 'count_pair':
+            return "COUNT(%s+%s)" % (spec[1], spec[2])
+        else:
+            raise Exception("Unsupported aggregate: %s" % function)
+
+    def _parse_time(self, value):
+        if isinstance(value, datetime) or value is None:
+            return value
+        value = str(value)
+        try:
+            # Faster than strptime for the 'YYYY-MM-DD HH:MM:SS' format
+            return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            return datetime.strptime(value[:19], self.time_format)
+
+    def aggregate(self, from_time, to_time, unit, specs, sector=None, context={}):
+        '''
+        Returns the samples of the time range aggregated per unit of local
+        time (year, month, day, hour or minute) as a list of rows. Each row
+        starts with the first and last local timestamps of its group
+        followed by the value of each aggregate specification, a tuple
+        (function, field, ...) with a function name among the ones returned
+        by aggregate_functions(). Several rows can be returned for the same
+        group, their values must then be combined.
+
+        If sector is a tuple (speed field, direction field), the samples
+        with a positive speed are additionally grouped by wind sector and
+        the sector number (direction divided by 22.5 and rounded) follows
+        the timestamps.
+
+        When the summary tables are enabled, the whole hours or days of the
+        range are read from them. They also hold the sum, count and max of
+        the wind speeds per sector.
+        '''
+        rollup_unit = self._rollup_unit(unit, specs, sector)
+        if rollup_unit is None:
+            return self._aggregate(self.tablename, 'TIMESTAMP_LOCAL', self._aggregate_expression,
+                                   from_time, to_time, unit, specs, sector)
+
+        start = self._rollup_slot(rollup_unit, from_time)
+        if start < from_time:
+            start = self._next_rollup_slot(rollup_unit, start)
+        end = self._rollup_slot(rollup_unit, to_time)
+        if start >= end:
+            return self._aggregate(self.tablename, 'TIMESTAMP_LOCAL', self._aggregate_expression,
+                                   from_time, to_time, unit, specs, sector)
+
+        result = []
+        if from_time < start:
+            result.extend(self._aggregate(self.tablename, 'TIMESTAMP_LOCAL', self._aggregate_expression,
+                                          from_time, start, unit, specs, sector))
+        if sector is None:
+            result.extend(self._aggregate(self._rollup_table(rollup_unit), 'LAST_LOCAL', self._rollup_expression,
+                                          start, end, unit, specs, sector))
+        else:
+            result.extend(self._aggregate_sectors(self._rollup_table(rollup_unit), start, end, unit, specs, sector))
+        if end < to_time:
+            result.extend(self._aggregate(self.tablename, 'TIMESTAMP_LOCAL', self._aggregate_expression,
+                                          end, to_time, unit, specs, sector))
+        return result
+
+    def _aggregate(self, table, last_column, expression, from_time, to_time, unit, specs, sector):
+        groups = self._group_expressions(unit)
+        columns = [ "MIN(TIMESTAMP_LOCAL)", "MAX(%s)" % last_column ]
+        where = "TIMESTAMP_LOCAL >= '%s' AND TIMESTAMP_LOCAL < '%s'" % (
+                    from_time.strftime(self.time_format),
+                    to_time.strftime(self.time_format))
+        if sector is not None:
+            sector_expression = "ROUND(%s/22.5)" % sector[1]
+            columns.append(sector_expression)
+            groups = groups + [ sector_expression ]
+            where = where + " AND %s > 0 AND %s IS NOT NULL" % sector
+        columns = columns + map(expression, specs)
+
+        sql = "SELECT %s FROM %s WHERE %s GROUP BY %s" % (
+                    ', '.join(columns),
+                    table,
+                    where,
+                    ', '.join(groups))
+        self.logger.debug("Aggregating: %s", sql)
+
+        result = []
+        db = self._reader()
+        try:
+            db.connect()
+            for row in db.select(sql):
+                row = list(row)
+                row[0] = self._parse_time(row[0])
+                row[1] = self._parse_time(row[1])
+                result.append(row)
+        finally:
+            db.disconnect()
+        return result
+
+    def _aggregate_sectors(self, table, from_time, to_time, unit, specs, sector):
+        # The sector columns of the summary tables are turned into one row
+        # per group and sector, as returned by _aggregate()
+        speed = sector[0]
+        columns = [ "MIN(TIMESTAMP_LOCAL)", "MAX(LAST_LOCAL)" ]
+        for i in range(16):
+            columns.extend([ "SUM(%s_S%d_SUM)" % (speed, i), "SUM(%s_S%d_CNT)" % (speed, i), "MAX(%s_S%d_MAX)" % (speed, i) ])
+        sql = "SELECT %s FROM %s WHERE TIMESTAMP_LOCAL >= '%s' AND TIMESTAMP_LOCAL < '%s' GROUP BY %s" % (
+                    ', '.join(columns),
+                    table,
+                    from_time.strftime(self.time_format),
+                    to_time.strftime(self.time_format),
+                    ', '.join(self._group_expressions(unit)))
+        self.logger.debug("Aggregating: %s", sql)
+
+        result = []
+        db = self._reader()
+        try:
+            db.connect()
+            for row in db.select(sql):
+                first = self._parse_time(row[0])
+                last = self._parse_time(row[1])
+                for i in range(16):
+                    (total, count, maximum) = row[2+i*3:5+i*3]
+                    if not count:
+                        continue
+                    values = { 'sum': total, 'count': count, 'max': maximum }
+                    result.append([ first, last, i ] + [ values[spec[0]] for spec in specs ])
+        finally:
+            db.disconnect()
+        return result
+
+    # Summary tables: unit -> table name suffix
+    rollup_tables = { 'hour': '_HOURLY', 'day': '_DAILY' }
+
+    # Speed and direction fields summarized as wind vectors
+    wind_pairs = [ ('WIND', 'WIND_DIR'), ('WIND_GUST', 'WIND_GUST_DIR') ]
+
+    float_type = 'DOUBLE PRECISION'
+    integer_type = 'INTEGER'
+    timestamp_type = 'TIMESTAMP'
+
+    def _rollup_table(self, unit):
+        return self.tablename + self.rollup_tables[unit]
+
+    def _rollup_pairs(self):
+        return [ (speed, dir) for (speed, dir) in self.wind_pairs
+                 if speed in self.storage_fields and dir in self.storage_fields ]
+
+    def _rollup_columns(self):
+        columns = []
+        for field in self.storage_fields:
+            columns.extend([ (field+'_SUM', self.float_type), (field+'_CNT', self.integer_type),
+                             (field+'_MIN', self.float_type), (field+'_MAX', self.float_type) ])
+        for (speed, dir) in self._rollup_pairs():
+            columns.extend([ (speed+'_X', self.float_type), (speed+'_Y', self.float_type),
+                             (speed+'_XYCNT', self.integer_type) ])
+            for i in range(16):
+                columns.extend([ (speed+'_S%d_SUM' % i, self.float_type), (speed+'_S%d_CNT' % i, self.integer_type),
+                                 (speed+'_S%d_MAX' % i, self.float_type) ])
+        return columns
+
+    def _rollup_unit(self, unit, specs, sector):
+        if not self.rollups:
+            return None
+        if sector is not None:
+            # Only the speeds per sector are summarized
+            if tuple(sector) not in self._rollup_pairs():
+                return None
+            for spec in specs:
+                if spec[0] not in [ 'sum', 'count', 'max' ] or spec[1] != sector[0]:
+                    return None
+        for spec in specs:
+            if spec[0] in self.math_specs and (spec[1], spec[2]) not in self._rollup_pairs():
+                return None
+        if unit == 'hour':
+            return 'hour'
+        elif unit in [ 'day', 'month', 'year' ]:
+            return 'day'
+        else:
+            return None
+
+    def _rollup_expression(self, spec):
+        function = spec[0]
+        if function == 'sum':
+            return "SUM(%s_SUM)" % spec[1]
+        elif function == 'count':
+            return "SUM(%s_CNT)" % spec[1]
+        elif function == 'min':
+            return "MIN(%s_MIN)" % spec[1]
+        elif function == 'max':
+            return "MAX(%s_MAX)" % spec[1]
+        elif function == 'wind_x':
+            return "SUM(%s_X)" % spec[1]
+        elif function == 'wind_y':
+            return "SUM(%s_Y)" % spec[1]
+        elif function == 'count_pair':
+            return "SUM(%s_XYCNT)" % spec[1]
+        else:
+            raise Exception("Unsupported aggregate: %s" % function)
+
+    def _rollup_slot(self, unit, time):
+        if unit == 'hour':
+            return datetime(time.year, time.month, time.day, time.hour)
+        else:
+            return datetime(time.year, time.month, time.day)
+
+    def _next_rollup_slot(self, unit, slot):
+        if unit == 'hour':
+            return slot + timedelta(0, 3600)
+        else:
+            return slot + timedelta(1)
+
+    def _init_rollups(self):
+        if not self.rollups:
+            return
+        columns = self._rollup_columns()
+        for unit in self.rollup_tables.keys():
+            table = self._rollup_table(unit)
+            try:
+                existing = self._get_table_fields(table)
+            except Exception:
+                existing = []
+            try:
+                self.db.connect()
+                if len(existing) == 0:
+                    sql = "CREATE TABLE %s (TIMESTAMP_LOCAL %s NOT NULL PRIMARY KEY, LAST_LOCAL %s NOT NULL, %s)" % (
+                               table, self.timestamp_type, self.timestamp_type,
+                               ', '.join([ '%s %s' % column for column in columns ]))
+                    self.db.execute(sql)
+                    self.logger.info("Created summary table %s", table)
+                else:
+                    for (name, type) in columns:
+                        if name not in existing:
+                            self.db.execute("ALTER TABLE %s ADD %s %s" % (table, name, type))
+                            self.logger.warning("Added column %s to %s, run the rollup backfill to fill it", name, table)
+            finally:
+                self.db.disconnect()
+
+    def _rollup_add(self, values, sample):
+        for field in self.storage_fields:
+            value = sample.get(field.lower())
+            if value is None:
+                continue
+            if values.get(field+'_CNT'):
+                values[field+'_SUM'] = values[field+'_SUM'] + value
+                values[field+'_CNT'] = values[field+'_CNT'] + 1
+                values[field+'_MIN'] = min(values[field+'_MIN'], value)
+                values[field+'_MAX'] = max(values[field+'_MAX'], value)
+            else:
+                values[field+'_SUM'] = value
+                values[field+'_CNT'] = 1
+                values[field+'_MIN'] = value
+                values[field+'_MAX'] = value
+        for (speed, dir) in self._rollup_pairs():
+            speed_value = sample.get(speed.lower())
+            dir_value = sample.get(dir.lower())
+            if speed_value is None or dir_value is None:
+                continue
+            x = meteo.WindX(speed_value, dir_value)
+            y = meteo.WindY(speed_value, dir_value)
+            if values.get(speed+'_XYCNT'):
+                values[speed+'_X'] = values[speed+'_X'] + x
+                values[speed+'_Y'] = values[speed+'_Y'] + y
+                values[speed+'_XYCNT'] = values[speed+'_XYCNT'] + 1
+            else:
+                values[speed+'_X'] = x
+                values[speed+'_Y'] = y
+                values[speed+'_XYCNT'] = 1
+            if speed_value > 0:
+                # Same sectors as the wind sector formulas
+                sector = speed + '_S%d' % (int(round(dir_value/22.5)) % 16)
+                if values.get(sector+'_CNT'):
+                    values[sector+'_SUM'] = values[sector+'_SUM'] + speed_value
+                    values[sector+'_CNT'] = values[sector+'_CNT'] + 1
+                    values[sector+'_MAX'] = max(values[sector+'_MAX'], speed_value)
+                else:
+                    values[sector+'_SUM'] = speed_value
+                    values[sector+'_CNT'] = 1
+                    values[sector+'_MAX'] = speed_value
+
+    def _rollup_write(self, table, slot, last, values, update):
+        names = [ name for (name, type) in self._rollup_columns() ]
+        if update:
+            sql = "UPDATE %s SET LAST_LOCAL = '%s', %s WHERE TIMESTAMP_LOCAL = '%s'" % (
+                      table,
+                      last.strftime(self.time_format),
+                      ', '.join([ '%s = %s' % (name, self.format(values.get(name))) for name in names ]),
+                      slot.strftime(self.time_format))
+        else:
+            sql = "INSERT INTO %s (TIMESTAMP_LOCAL, LAST_LOCAL, %s) VALUES ('%s', '%s', %s)" % (
+                      table,
+                      ', '.join(names),
+                      slot.strftime(self.time_format),
+                      last.strftime(self.time_format),
+                      ', '.join([ self.format(values.get(name)) for name in names ]))
+        self.db.execute(sql, commit=False)
+
+    def _update_rollups(self, sample):
+        # Called within the transaction inserting the sample
+        names = [ name for (name, type) in self._rollup_columns() ]
+        localtime = sample['localtime']
+        for unit in self.rollup_tables.keys():
+            table = self._rollup_table(unit)
+            slot = self._rollup_slot(unit, localtime)
+            sql = "SELECT LAST_LOCAL, %s FROM %s WHERE TIMESTAMP_LOCAL = '%s'" % (
+                      ', '.join(names), table, slot.strftime(self.time_format))
+            rows = list(self.db.select(sql, commit=False))
+            if len(rows) > 0:
+                values = dict(zip(names, rows[0][1:]))
+                last = max(self._parse_time(rows[0][0]), localtime)
+            else:
+                values = {}
+                last = localtime
+            self._rollup_add(values, sample)
+            self._rollup_write(table, slot, last, values, len(rows) > 0)
+
+    def backfill_rollups(self, from_time=None, to_time=None, context={}):
+        '''
+        Rebuilds the summary tables from the samples of the time range (the
+        whole archive by default), one day at a time. Each day is committed
+        separately, so an interrupted backfill can be resumed from the last
+        day logged. Days whose samples were compacted are left untouched.
+        Returns the number of samples processed.
+        '''
+        assert self.rollups, "'rollups' must be enabled on the storage"
+
+        (first, last) = self.sample_bounds()
+        if first is None:
+            return 0
+        if from_time is None or from_time < first:
+            from_time = first
+        if to_time is None:
+            to_time = last
+
+        count = 0
+        day = self._rollup_slot('day', from_time)
+        while day <= to_time:
+            count = count + self._rollup_day(day, context=context)
+            if day.day == 1:
+                self.logger.info("Summary tables filled up to %s (%d samples)", day.strftime('%Y-%m-%d'), count)
+            day = self._next_rollup_slot('day', day)
+        self.logger.info("Summary tables filled up to %s (%d samples)", to_time.strftime('%Y-%m-%d'), count)
+        return count
+
+    def sample_bounds(self, context={}):
+        '''
+        Returns the local times of the first and last samples, or (None, None)
+        if there is no sample.
+        '''
+        db = self._reader()
+        try:
+            db.connect()
+            rows = list(db.select("SELECT MIN(TIMESTAMP_LOCAL), MAX(TIMESTAMP_LOCAL) FROM %s" % self.tablename))
+        finally:
+            db.disconnect()
+        return (self._parse_time(rows[0][0]), self._parse_time(rows[0][1]))
+
+    def compacted_until(self, context={}):
+        '''
+        Returns the local time before which the samples were compacted into
+        the summary tables, or None if no samples were compacted.
+        '''
+        if not self.rollups:
+            return None
+        (first, last) = self.sample_bounds()
+        db = self._reader()
+        try:
+            db.connect()
+            if first is None:
+                rows = list(db.select("SELECT MAX(LAST_LOCAL) FROM %s" % self._rollup_table('day')))
+            else:
+                rows = list(db.select("SELECT MAX(LAST_LOCAL) FROM %s WHERE LAST_LOCAL < '%s'" % (
+                                          self._rollup_table('day'), first.strftime(self.time_format))))
+        finally:
+            db.disconnect()
+        compacted = self._parse_time(rows[0][0])
+        if compacted is None:
+            return None
+        return first if first is not None else compacted + timedelta(seconds=1)
+
+    def _rollup_day(self, day, delete_samples=False, context={}):
+        # Rebuilds the summary rows of one day in a single transaction,
+        # optionally deleting its samples. Returns the number of samples.
+        next_day = self._next_rollup_slot('day', day)
+        keys = self.keys()
+        buckets = {}
+        count = 0
+        for row in self._samples(day, next_day):
+            sample = dict(zip(keys, row))
+            sample['localtime'] = self._parse_time(sample['localtime'])
+            for unit in self.rollup_tables.keys():
+                slot = self._rollup_slot(unit, sample['localtime'])
+                if not buckets.has_key((unit, slot)):
+                    buckets[(unit, slot)] = [ sample['localtime'], {} ]
+                bucket = buckets[(unit, slot)]
+                bucket[0] = max(bucket[0], sample['localtime'])
+                self._rollup_add(bucket[1], sample)
+            count = count + 1
+
+        where = "TIMESTAMP_LOCAL >= '%s' AND TIMESTAMP_LOCAL < '%s'" % (
+                    day.strftime(self.time_format),
+                    next_day.strftime(self.time_format))
+        try:
+            self.db.connect()
+            for unit in self.rollup_tables.keys():
+                self.db.execute("DELETE FROM %s WHERE %s" % (self._rollup_table(unit), where), commit=False)
+            for (unit, slot), (last, values) in buckets.iteritems():
+                self._rollup_write(self._rollup_table(unit), slot, last, values, False)
+            if delete_samples:
+                self.db.execute("DELETE FROM %s WHERE %s" % (self.tablename, where), commit=False)
+            self.db.commit()
+        except:
+            self.db.rollback()
+            raise
         finally:
             self.db.disconnect()
+        return count
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        '''
+        Moves the samples older than samples_before into the summary tables
+        and deletes them, one day per transaction so that the progress is
+        kept if interrupted. Days before 'since' are considered already
+        compacted. After each day, progress is called with the time up to
+        which the samples are compacted. Hourly summaries older than
+        hourly_before are deleted as well, the daily ones are kept forever.
+        '''
+        assert self.rollups, "'rollups' must be enabled on the storage"
+
+        (first, last) = self.sample_bounds()
+        limit = self._rollup_slot('day', samples_before)
+        count = 0
+        if first is not None:
+            day = self._rollup_slot('day', first)
+            if since is not None:
+                day = max(day, self._rollup_slot('day', since))
+            while day < limit:
+                count = count + self._rollup_day(day, delete_samples=True, context=context)
+                self.logger.info("Compacted samples up to %s (%d samples)", day.strftime('%Y-%m-%d'), count)
+                day = self._next_rollup_slot('day', day)
+                if progress is not None:
+                    progress(day)
+
+        if hourly_before is not None:
+            # Never delete hourly summaries of days still having samples
+            hourly_limit = min(self._rollup_slot('day', hourly_before), limit)
+            try:
+                self.db.connect()
+                self.db.execute("DELETE FROM %s WHERE TIMESTAMP_LOCAL < '%s'" % (
+                                    self._rollup_table('hour'),
+                                    hourly_limit.strftime(self.time_format)))
+            finally:
+                self.db.disconnect()
+        return count
+
+    def _rollup_samples(self, from_time, to_time):
+        # Samples rebuilt from the summary tables for the compacted periods.
+        # The finest available summary is used.
+        (first, last) = self.sample_bounds()
+        boundary = first if first is not None else to_time
+        if from_time >= boundary:
+            return
+
+        db = self._reader()
+        try:
+            db.connect()
+            rows = list(db.select("SELECT MIN(TIMESTAMP_LOCAL) FROM %s" % self._rollup_table('hour')))
+        finally:
+            db.disconnect()
+        hourly_first = self._parse_time(rows[0][0])
+        if hourly_first is None or hourly_first > boundary:
+            hourly_first = boundary
+
+        for (unit, until) in [ ('day', hourly_first), ('hour', boundary) ]:
+            names = [ name for (name, type) in self._rollup_columns() ]
+            sql = "SELECT LAST_LOCAL, %s FROM %s WHERE TIMESTAMP_LOCAL >= '%s' AND TIMESTAMP_LOCAL < '%s' AND LAST_LOCAL < '%s' ORDER BY TIMESTAMP_LOCAL ASC" % (
+                      ', '.join(names),
+                      self._rollup_table(unit),
+                      from_time.strftime(self.time_format),
+                      to_time.strftime(self.time_format),
+                      until.strftime(self.time_format))
+            try:
+                db.connect()
+                rows = list(db.select(sql))
+            finally:
+                db.disconnect()
+            for row in rows:
+                yield self._rollup_sample(self._parse_time(row[0]), dict(zip(names, row[1:])))
+
+    # How summaries are turned back into samples, 'avg' otherwise
+    rollup_sample_functions = { 'RAIN': 'sum', 'RAIN_RATE': 'max', 'WIND_GUST': 'max', 'UV_INDEX': 'max' }
+
+    def _rollup_sample(self, localtime, values):
+        # The sample is timestamped as the last sample of the summary
+        sample = {}
+        for field in self.storage_fields:
+            function = self.rollup_sample_functions.get(field, 'avg')
+            if not values.get(field+'_CNT'):
+                sample[field] = None
+            elif function == 'sum':
+                sample[field] = values[field+'_SUM']
+            elif function == 'max':
+                sample[field] = values[field+'_MAX']
+            else:
+                sample[field] = float(values[field+'_SUM']) / values[field+'_CNT']
+        for (speed, dir) in self._rollup_pairs():
+            if values.get(speed+'_XYCNT'):
+                sample[dir] = meteo.WindDir(values[speed+'_X'] / values[speed+'_XYCNT'],
+                                            values[speed+'_Y'] / values[speed+'_XYCNT'])
+            else:
+                sample[dir] = None
+        utc_time = datetime.utcfromtimestamp(time.mktime(localtime.timetuple()))
+        return [ utc_time, localtime ] + [ sample[field] for field in self.storage_fields ]
 
     def format(self, value):
         if value is None:
@@ -0,0 +1,231 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+
+class CachedStorage(object):
+    '''
+    Keeps the samples read from a storage in memory, in blocks of fixed
+    duration, so that the consumers reading overlapping ranges (e.g.
+    several accumulators) do not read and decode the same samples again.
+
+    Blocks ended for a while are considered immutable. The block containing
+    the current time is read again after 'refresh' seconds, or as soon as a
+    sample is written through this element. The least recently used blocks
+    are dropped when the cache exceeds its size.
+
+    The samples returned are shared and must not be modified.
+
+    [ Properties ]
+
+    storage [storage]:
+        The underlying storage.
+
+    block [numeric] (optional):
+        Duration of a block in seconds. Blocks are aligned on local
+        midnight. Defaults to 86400.
+
+    size [numeric] (optional):
+        Maximum number of samples kept in memory. Defaults to 200000.
+
+    refresh [numeric] (optional):
+        Number of seconds a block not yet ended is kept before being read
+        again. Defaults to 60.
+    '''
+
+    storage = None
+    block = 86400
+    size = 200000
+    refresh = 60
+
+    lock = None
+    blocks = None
+    count = 0
+    hits = 0
+    misses = 0
+    localtime_index = None
+
+    logger = logging.getLogger('storage.cached')
+
+    origin = datetime(1970, 1, 1)
+
+    def init(self, context=None):
+        try:
+            self.storage.init(context=context)
+        except AttributeError:
+            pass # In case the element has not init method
+        self._init_cache()
+
+    def _init_cache(self):
+        if self.lock is None:
+            self.lock = threading.Lock()
+            # Block start -> (samples, expiration time or None)
+            self.blocks = OrderedDict()
+            self.count = 0
+
+    def keys(self, context={}):
+        return self.storage.keys(context=context)
+
+    def aggregate_functions(self, context={}):
+        return self.storage.aggregate_functions(context=context)
+
+    def aggregate(self, from_time, to_time, unit, specs, sector=None, context={}):
+        return self.storage.aggregate(from_time, to_time, unit, specs, sector=sector, context=context)
+
+    def compacted_until(self, context={}):
+        return self.storage.compacted_until(context=context)
+
+    def write_sample(self, sample, context={}):
+        self.storage.write_sample(sample, context=context)
+        if self.lock is not None:
+            self._invalidate(self._block_start(sample['localtime']))
+
+    def sample_bounds(self, context={}):
+        return self.storage.sample_bounds(context=context)
+
+    def write_samples(self, samples, context={}):
+        self.storage.write_samples(samples, context=context)
+        if self.lock is not None:
+            for start in set([ self._block_start(sample['localtime']) for sample in samples ]):
+                self._invalidate(start)
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        self.storage.compact(samples_before, hourly_before, since=since, progress=progress, context=context)
+        self.clear()
+
+    def clear(self):
+        '''
+        Empties the cache.
+        '''
+        if self.lock is not None:
+            self.lock.acquire()
+            try:
+                self.blocks.clear()
+                self.count = 0
+            finally:
+                self.lock.release()
+
+    def _block_start(self, time):
+        delta = time - self.origin
+        seconds = delta.days * 86400 + delta.seconds
+        return self.origin + timedelta(0, seconds - seconds % self.block)
+
+    def _get(self, start, now):
+        self.lock.acquire()
+        try:
+            entry = self.blocks.pop(start, None)
+            if entry is None:
+                return None
+            (samples, expires) = entry
+            if expires is not None and expires <= now:
+                self.count -= len(samples) + 1
+                return None
+            # Most recently used blocks are at the end
+            self.blocks[start] = entry
+            return samples
+        finally:
+            self.lock.release()
+
+    def _store(self, start, samples, now):
+        cost = len(samples) + 1
+        if cost > self.size:
+            return
+        end = start + timedelta(0, self.block)
+        if end + timedelta(0, self.refresh) <= now:
+            expires = None
+        else:
+            expires = now + timedelta(0, self.refresh)
+        self.lock.acquire()
+        try:
+            old = self.blocks.pop(start, None)
+            if old is not None:
+                self.count -= len(old[0]) + 1
+            self.blocks[start] = (samples, expires)
+            self.count += cost
+            while self.count > self.size:
+                (key, (evicted, expires)) = self.blocks.popitem(last=False)
+                self.count -= len(evicted) + 1
+        finally:
+            self.lock.release()
+
+    def _invalidate(self, start):
+        self.lock.acquire()
+        try:
+            entry = self.blocks.pop(start, None)
+            if entry is not None:
+                self.count -= len(entry[0]) + 1
+        finally:
+            self.lock.release()
+
+    def _fetch(self, from_time, to_time, now, context):
+        # Reads whole blocks from the storage and caches them while
+        # yielding their samples
+        size = timedelta(0, self.block)
+        start = from_time
+        samples = []
+        for sample in self.storage.samples(from_time, to_time, context=context):
+            localtime = sample[self.localtime_index]
+            while localtime >= start + size:
+                self._store(start, samples, now)
+                start = start + size
+                samples = []
+            samples.append(sample)
+            yield sample
+        while start < to_time:
+            self._store(start, samples, now)
+            start = start + size
+            samples = []
+
+    def samples(self, from_time=datetime.fromtimestamp(0), to_time=datetime.now(), context={}):
+        self._init_cache()
+        if self.localtime_index is None:
+            self.localtime_index = self.storage.keys(context=context).index('localtime')
+        index = self.localtime_index
+
+        now = datetime.now()
+        size = timedelta(0, self.block)
+        start = self._block_start(from_time)
+        while start < to_time:
+            samples = self._get(start, now)
+            cached = samples is not None
+            if cached:
+                self.hits += 1
+                end = start + size
+            else:
+                # Read the following missing blocks at once
+                end = start + size
+                while end < to_time and self._get(end, now) is None:
+                    end = end + size
+                self.misses += 1
+                self.logger.debug("Reading blocks from %s to %s", start, end)
+                samples = self._fetch(start, end, now, context)
+            for sample in samples:
+                localtime = sample[index]
+                if localtime >= to_time:
+                    if cached:
+                        break
+                    else:
+                        # Finish reading the block so that it is cached
+                        continue
+                if localtime >= from_time:
+                    yield sample
+            start = end
@@ -24,6 +24,13 @@ import csv
 import time
 from datetime import datetime
 import sys
+import tempfile
+import threading
+
+from wfcommon.formula.base import AverageFormula
+from wfcommon.formula.base import MaxFormula
+from wfcommon.formula.base import SumFormula
+from wfcommon.formula.wind import PredominantWindFormula
 
 class CsvStorage(object):
     '''
@@ -41,8 +48,46 @@ class CsvStorage(object):
 
     logger = logging.getLogger('storage.csv')
 
+    # Protects the file while it is rewritten by compact(). Created per
+    # storage, on first use as the storages are created by yaml.
+    _lock = None
+    creation_lock = threading.Lock()
+
+    def _get_lock(self):
+        if self._lock is None:
+            self.creation_lock.acquire()
+            try:
+                if self._lock is None:
+                    self._lock = threading.Lock()
+            finally:
+                self.creation_lock.release()
+        return self._lock
+
+    lock = property(_get_lock)
+
     def write_sample(self, sample, context={}):
-        self.logger.debug(sample)
+        self.lock.acquire()
+        try:
+            self._write_sample(sample)
+        finally:
+            self.lock.release()
+
+    def write_samples(self, samples, context={}):
+        '''
+        Appends several samples at once. They must be in chronological order.
+        '''
+        self.lock.acquire()
+        try:
+            (file, writer) = self._open_writer()
+            try:
+                for sample in samples:
+                    writer.writerow(self._sample_row(sample))
+            finally:
+                file.close()
+        finally:
+            self.lock.release()
+
+    def _open_writer(self):
         if os.path.exists(self.path):
             file = open(self.path, 'a')
             writer = csv.writer(file)
@@ -54,15 +99,23 @@ class CsvStorage(object):
             writer = csv.writer(file)
             writer.writerow(self.columns)
             file.flush()
+        return (file, writer)
 
+    def _sample_row(self, sample):
         sample_row = []
 
         now = sample['localtime']
         sample_row.append(int(time.mktime(now.timetuple()))) # timestamp
         sample_row.append(now.strftime('%Y-%m-%d %H:%M:%S')) # localtime
         for key in self.columns[2:]:
-            sample_row.append(sample[key])
+            sample_row.append(sample.get(key))
+        return sample_row
 
+    def _write_sample(self, sample):
+        self.logger.debug(sample)
+        (file, writer) = self._open_writer()
+
+        sample_row = self._sample_row(sample)
         writer.writerow(sample_row)
 
         self.logger.debug("Writing row: %s", sample_row)
@@ -91,39 +144,81 @@ class CsvStorage(object):
         from_timestamp = int(time.mktime(from_time.timetuple()))
         file = self._position_cursor(from_timestamp)
         to_timestamp = time.mktime(to_time.timetuple())
-        reader = csv.reader(file)
+        try:
+            for sample in self._read_samples(csv.reader(file), from_timestamp, to_timestamp):
+                yield sample
+        finally:
+            file.close()
+
+    def _read_samples(self, reader, from_timestamp, to_timestamp):
         counter=0
+        for line in reader:
+            counter=counter+1
+            if len(line) == 0 or line[0].strip() == '':
+                self.logger.warn('Encountered empty line after '+str(counter)+' lines')
+                continue
+            if not line[0].strip().isdigit():
+                continue # Header
+            ts = int(line[0])
+            if ts < from_timestamp:
+                continue
+            if ts >= to_timestamp:
+                return
+            sample = line[1:]
+            sample[0] = datetime.fromtimestamp(ts)
+            length = len(sample)
+
+            for i in range(1,length):
+                if sample[i] != '' and sample[i] != None:
+                    sample[i] = float(sample[i])
+                else:
+                    sample[i] = None
+
+            sample.append(datetime.utcfromtimestamp(ts))
+
+            yield sample
+
+    def sample_bounds(self, context={}):
+        '''
+        Returns the local times of the first and last samples, or (None, None)
+        if there is no sample.
+        '''
+        if not os.path.exists(self.path):
+            return (None, None)
+        (first, last) = self._file_bounds(self.path)
+        if first is None:
+            return (None, None)
+        return (datetime.fromtimestamp(first), datetime.fromtimestamp(last))
+
+    def _file_bounds(self, path):
+        # Timestamps of the first and last lines of a file
+        file = open(path, 'r')
         try:
+            reader = csv.reader(file)
+            first = None
             for line in reader:
-                counter=counter+1
-                if len(line) == 0 or line[0].strip() == '':
-                    self.logger.warn('Encountered empty line after '+str(counter)+' lines')
-                    continue
-                ts = int(line[0])
-                if ts < from_timestamp:
-                    continue
-                if ts >= to_timestamp:
-                    raise StopIteration
-                sample = line[1:]
-                sample[0] = datetime.fromtimestamp(ts)
-                length = len(sample)
-
-                for i in range(1,length):
-                    if sample[i] != '' and sample[i] != None:
-                        sample[i] = float(sample[i])
-                    else:
-                        sample[i] = None
-
-                sample.append(datetime.utcfromtimestamp(ts))
-
-                yield sample
+                if len(line) > 0 and line[0].strip().isdigit():
+                    first = int(line[0])
+                    break
+            if first is None:
+                return (None, None)
+            # Read the end of the file to find the last line
+            size = os.path.getsize(path)
+            file.seek(max(0, size - 4096))
+            last = first
+            for line in csv.reader(file.read().splitlines()[1:]):
+                if len(line) > 0 and line[0].strip().isdigit():
+                    last = int(line[0])
         finally:
             file.close()
+        return (first, last)
 
-    def _position_cursor(self, timestamp):
-        size = os.path.getsize(self.path)
+    def _position_cursor(self, timestamp, path=None):
+        if path is None:
+            path = self.path
+        size = os.path.getsize(path)
         step = offset = size / 2
-        file = open(self.path, 'r')
+        file = open(path, 'r')
 
         while abs(step) > 1:
             last_pos = file.tell()
@@ -151,6 +246,112 @@ class CsvStorage(object):
 
         return file
 
+    # How compacted samples are calculated: column -> (formula, source column).
+    # Other columns are averaged.
+    compaction_formulas = {
+        'wind_dir': (PredominantWindFormula, 'wind'),
+        'wind_gust': (MaxFormula, 'wind_gust'),
+        'wind_gust_dir': (PredominantWindFormula, 'wind_gust'),
+        'rain': (SumFormula, 'rain'),
+        'rain_rate': (MaxFormula, 'rain_rate'),
+        'uv_index': (MaxFormula, 'uv_index') }
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        '''
+        Replaces the samples older than samples_before by one sample per
+        hour calculated with the compaction formulas and timestamped as the
+        last sample of the hour. Samples before 'since' are already
+        compacted and copied as they are. The file is rewritten once
+        to a temporary file which then replaces it. Returns the number of
+        samples compacted.
+        '''
+        if not os.path.exists(self.path):
+            return 0
+        limit = int(time.mktime(samples_before.timetuple()))
+        start = int(time.mktime(since.timetuple())) if since is not None else None
+
+        self.lock.acquire()
+        try:
+            dir = os.path.realpath(os.path.dirname(self.path))
+            (fd, temp_path) = tempfile.mkstemp(dir=dir, prefix='.'+os.path.basename(self.path)+'.', suffix='.tmp')
+            try:
+                input = open(self.path, 'r')
+                output = os.fdopen(fd, 'w')
+                try:
+                    count = self._compact(csv.reader(input), csv.writer(output), limit, start)
+                finally:
+                    input.close()
+                    output.close()
+                if os.name == 'nt':
+                    os.remove(self.path)
+                os.rename(temp_path, self.path)
+            except:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        finally:
+            self.lock.release()
+        self.logger.info("Compacted %d samples older than %s", count, samples_before)
+        if progress is not None:
+            progress(samples_before)
+        return count
+
+    def _compact(self, reader, writer, limit, start=None):
+        header = reader.next()
+        writer.writerow(header)
+        count = 0
+        hour = None
+        rows = []
+        for line in reader:
+            if len(line) == 0 or line[0].strip() == '':
+                continue
+            timestamp = int(line[0])
+            if start is not None and timestamp < start:
+                writer.writerow(line)
+                continue
+            if timestamp >= limit:
+                self._write_compacted(writer, rows)
+                rows = []
+                writer.writerow(line)
+                continue
+            if line[1][:13] != hour:
+                self._write_compacted(writer, rows)
+                rows = []
+                hour = line[1][:13]
+            rows.append(line)
+            count = count + 1
+            if count % 10000 == 0:
+                self.logger.info("Compacting, reached %s (%d samples)", line[1], count)
+        self._write_compacted(writer, rows)
+        return count
+
+    def _write_compacted(self, writer, rows):
+        if len(rows) == 0:
+            return
+        if len(rows) == 1:
+            # Already compacted or single sample
+            writer.writerow(rows[0])
+            return
+
+        formulas = {}
+        for column in self.columns[2:]:
+            (formula_class, source) = self.compaction_formulas.get(column, (AverageFormula, column))
+            formulas[column] = formula_class(self.columns.index(source))
+        for row in rows:
+            sample = [ float(v) if v != '' else None for v in row[2:] ]
+            sample = [ None, None ] + sample + [ None ] * (len(self.columns) - len(row))
+            for formula in formulas.values():
+                formula.append(sample)
+
+        # Keep the time of the last sample so that it stays in the same slices
+        result = rows[-1][:2]
+        for column in self.columns[2:]:
+            value = formulas[column].value()
+            if type(value) == tuple:
+                value = value[0]   # Predominant wind returns (degrees, text)
+            result.append(value if value is not None else '')
+        writer.writerow(result)
+
     timestamp_length = 10
 
     def _get_timestamp(self, file):
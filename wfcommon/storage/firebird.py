@@ -41,6 +41,13 @@ class FirebirdStorage(base.DatabaseStorage):
 
     tablename [string] (optional):
         Table name. Defaults to 'METEO'.   
+
+    rollups [true|false] (optional):
+        Maintain hourly and daily summary tables (named after the table
+        with the _HOURLY and _DAILY suffixes) along with the samples.
+        Accumulators then read them for long spans. The tables are
+        created when missing. Use 'wfcommon/rollup.py' to fill them from
+        an existing archive. Defaults to false.
     '''
     
     database = 'localhost:/var/lib/firebird/2.0/data/wfrog.db'
@@ -63,10 +70,13 @@ class FirebirdStorage(base.DatabaseStorage):
         self.storage_fields = self.mandatory_storage_fields + \
                               [field for field in self.optional_storage_fields if field in table_fields]
         self.logger.info("Table %s detected with fields: %s" % (self.tablename, ', '.join(self.storage_fields)))
+        self._init_rollups()
 
 
-    def _get_table_fields(self):
-        sql = "SELECT RDB$FIELD_NAME FROM RDB$RELATION_FIELDS WHERE RDB$RELATION_NAME = '%s'" % self.tablename
+    def _get_table_fields(self, tablename=None):
+        if tablename is None:
+            tablename = self.tablename
+        sql = "SELECT RDB$FIELD_NAME FROM RDB$RELATION_FIELDS WHERE RDB$RELATION_NAME = '%s'" % tablename
         fields = []
 
         try:
@@ -43,6 +43,13 @@ class MysqlStorage(base.DatabaseStorage):
 
     tablename [string] (optional):
         Table name. Defaults to 'METEO'.   
+
+    rollups [true|false] (optional):
+        Maintain hourly and daily summary tables (named after the table
+        with the _HOURLY and _DAILY suffixes) along with the samples.
+        Accumulators then read them for long spans. The tables are
+        created when missing. Use 'wfcommon/rollup.py' to fill them from
+        an existing archive. Defaults to false.
     '''
 
     database = 'wfrog'
@@ -51,6 +58,9 @@ class MysqlStorage(base.DatabaseStorage):
     user = 'root'
     password = 'root'
 
+    # TIMESTAMP columns are updated automatically by MySQL
+    timestamp_type = 'DATETIME'
+
     logger = logging.getLogger('storage.mysql')
 
     def init(self, context=None):
@@ -66,10 +76,13 @@ class MysqlStorage(base.DatabaseStorage):
         self.storage_fields = self.mandatory_storage_fields + \
                               [field for field in self.optional_storage_fields if field in table_fields]
         self.logger.info("Table %s detected with fields: %s" % (self.tablename, ', '.join(self.storage_fields)))
+        self._init_rollups()
 
 
-    def _get_table_fields(self):
-        sql = "show columns from %s;" % self.tablename
+    def _get_table_fields(self, tablename=None):
+        if tablename is None:
+            tablename = self.tablename
+        sql = "show columns from %s;" % tablename
         fields = []
 
         try:
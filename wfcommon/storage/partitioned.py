@@ -0,0 +1,343 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import os.path
+import re
+import csv
+import gzip
+import zlib
+import time
+from datetime import datetime
+from StringIO import StringIO
+
+from csvfile import CsvStorage
+from wfcommon.atomicfile import AtomicFileWriter
+
+class PartitionedCsvStorage(CsvStorage):
+    '''
+    Stores samples in CSV files, one per month (e.g. 2010-03.csv), in a
+    directory. The files have the same format as the !csv storage.
+
+    Once the samples of a new month are written, the previous months are
+    compressed with gzip (e.g. 2010-03.csv.gz, readable with gunzip) by
+    blocks of rows. An index file (e.g. 2010-03.idx) gives the time range
+    and the position of each block, so that only the blocks overlapping
+    the requested period are read and decompressed. Late samples are
+    inserted in time order, rewriting their month.
+
+    An existing !csv file can be converted with 'wfcommon/storagecopy.py'.
+
+    [ Properties ]
+
+    path [string]:
+        The directory holding the files.
+
+    compress [true|false] (optional):
+        Compress the months ended. Defaults to true.
+
+    block [numeric] (optional):
+        Number of rows per compressed block. Defaults to 1000.
+    '''
+
+    path = None
+    compress = True
+    block = 1000
+
+    file = None
+    writer = None
+    open_month = None
+    # Timestamp of the last row of the open month
+    last_timestamp = None
+
+    logger = logging.getLogger('storage.partitioned')
+
+    month_file = re.compile(r'^(\d{4}-\d{2})\.csv(\.gz)?$')
+
+    def _month(self, time):
+        return time.strftime('%Y-%m')
+
+    def _file(self, month, suffix='.csv'):
+        return os.path.join(self.path, month + suffix)
+
+    def _months(self):
+        if not os.path.exists(self.path):
+            return []
+        months = set()
+        for name in os.listdir(self.path):
+            match = self.month_file.match(name)
+            if match:
+                months.add(match.group(1))
+        return sorted(months)
+
+    def write_sample(self, sample, context={}):
+        self.write_samples([ sample ], context=context)
+
+    def write_samples(self, samples, context={}):
+        self.lock.acquire()
+        try:
+            late = {}
+            for sample in samples:
+                self.logger.debug(sample)
+                month = self._month(sample['localtime'])
+                row = self._sample_row(sample)
+                if self._late(month, int(row[0])):
+                    late.setdefault(month, []).append(row)
+                else:
+                    writer = self._writer(month)
+                    writer.writerow(row)
+                    self.last_timestamp = int(row[0])
+            if self.file is not None:
+                self.file.flush()
+            for month in sorted(late.keys()):
+                self._insert(month, late[month])
+        finally:
+            self.lock.release()
+
+    def _late(self, month, timestamp):
+        # True if the row cannot be appended to its month: the month is
+        # compressed or has later rows
+        if month == self.open_month:
+            return self.last_timestamp is not None and timestamp < self.last_timestamp
+        if os.path.exists(self._file(month, '.csv.gz')):
+            return True
+        if os.path.exists(self._file(month)):
+            (first, last) = self._file_bounds(self._file(month))
+            return last is not None and timestamp < last
+        return False
+
+    def _insert(self, month, late_rows):
+        if month == self.open_month:
+            self._close()
+        # The late rows formatted as the rows read
+        text = StringIO()
+        csv.writer(text).writerows(late_rows)
+        late_rows = list(csv.reader(text.getvalue().splitlines()))
+        rows = [ line for line in self._month_rows(month) if len(line) > 0 ]
+        header = [ row for row in rows if not row[0].strip().isdigit() ][:1] or [ self.columns ]
+        rows = [ row for row in rows if row[0].strip().isdigit() ] + late_rows
+        if os.path.exists(self._file(month, '.csv.gz')):
+            self._write_compressed(month, header + rows)
+        else:
+            # Stable, the rows of the same second keep their order
+            rows.sort(key=lambda row: int(row[0]))
+            output = StringIO()
+            csv.writer(output).writerows(header + rows)
+            AtomicFileWriter().write(self._file(month), output.getvalue(), compare=False)
+        self.logger.info("Inserted %d late samples in %s", len(late_rows), month)
+
+    def _writer(self, month):
+        if month == self.open_month:
+            return self.writer
+        self._close()
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        path = self._file(month)
+        if os.path.exists(path):
+            (first, self.last_timestamp) = self._file_bounds(path)
+            self.file = open(path, 'a')
+            self.writer = csv.writer(self.file)
+        else:
+            self.file = open(path, 'w')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+        self.open_month = month
+        if self.compress:
+            for closed in self._months():
+                if closed < month and os.path.exists(self._file(closed)):
+                    self._compress(closed)
+        return self.writer
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.writer = None
+        self.open_month = None
+        self.last_timestamp = None
+
+    def _compress(self, month):
+        file = open(self._file(month), 'r')
+        try:
+            rows = [ line for line in csv.reader(file) if len(line) > 0 ]
+        finally:
+            file.close()
+        self._write_compressed(month, rows)
+        os.remove(self._file(month))
+        self.logger.info("Compressed %s (%d samples)", month, len(rows) - 1)
+
+    def _write_compressed(self, month, rows):
+        # Each block is a complete gzip member, the file is their concatenation
+        data = []
+        index = StringIO()
+        index_writer = csv.writer(index)
+        offset = 0
+        header = [ row for row in rows if not row[0].strip().isdigit() ][:1]
+        rows = [ row for row in rows if row[0].strip().isdigit() ]
+        # The index requires the rows in time order
+        rows.sort(key=lambda row: int(row[0]))
+        for i in range(0, len(rows), self.block):
+            block = rows[i:i+self.block]
+            text = StringIO()
+            csv.writer(text).writerows((header if i == 0 else []) + block)
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            member = compressor.compress(text.getvalue()) + compressor.flush()
+            data.append(member)
+            index_writer.writerow([ block[0][0], block[-1][0], offset, len(member) ])
+            offset = offset + len(member)
+        # The index is written last: until then, readers scan the whole
+        # compressed file
+        if os.path.exists(self._file(month, '.idx')):
+            os.remove(self._file(month, '.idx'))
+        writer = AtomicFileWriter()
+        writer.write(self._file(month, '.csv.gz'), ''.join(data), compare=False)
+        writer.write(self._file(month, '.idx'), index.getvalue(), compare=False)
+
+    def _blocks(self, month):
+        # (first timestamp, last timestamp, offset, length) of the blocks
+        path = self._file(month, '.idx')
+        if not os.path.exists(path):
+            return None
+        file = open(path, 'r')
+        try:
+            return [ tuple(map(int, line)) for line in csv.reader(file) if len(line) == 4 ]
+        finally:
+            file.close()
+
+    def _read_block(self, file, offset, length):
+        file.seek(offset)
+        text = zlib.decompress(file.read(length), 16 + zlib.MAX_WBITS)
+        return csv.reader(text.splitlines())
+
+    def _month_rows(self, month, from_timestamp=None, to_timestamp=None):
+        # Rows of a month, restricted to the blocks overlapping the time
+        # range for compressed months
+        path = self._file(month, '.csv.gz')
+        if os.path.exists(path):
+            blocks = self._blocks(month)
+            if blocks is None:
+                file = gzip.open(path, 'rb')
+                try:
+                    for line in csv.reader(file):
+                        yield line
+                finally:
+                    file.close()
+            else:
+                file = open(path, 'rb')
+                try:
+                    for (first, last, offset, length) in blocks:
+                        if from_timestamp is not None and last < from_timestamp:
+                            continue
+                        if to_timestamp is not None and first >= to_timestamp:
+                            break
+                        for line in self._read_block(file, offset, length):
+                            yield line
+                finally:
+                    file.close()
+        else:
+            path = self._file(month)
+            if from_timestamp is None:
+                file = open(path, 'r')
+            else:
+                file = self._position_cursor(from_timestamp, path)
+            try:
+                for line in csv.reader(file):
+                    yield line
+            finally:
+                file.close()
+
+    def samples(self, from_time=datetime.fromtimestamp(0), to_time=datetime.now(), context={}):
+        from_timestamp = int(time.mktime(from_time.timetuple()))
+        to_timestamp = time.mktime(to_time.timetuple())
+        first_month = self._month(from_time)
+        last_month = self._month(to_time)
+        for month in self._months():
+            if month < first_month or month > last_month:
+                continue
+            rows = self._month_rows(month, from_timestamp, to_timestamp)
+            for sample in self._read_samples(rows, from_timestamp, to_timestamp):
+                yield sample
+
+    def sample_bounds(self, context={}):
+        months = self._months()
+        if len(months) == 0:
+            return (None, None)
+        first = self._month_bounds(months[0])[0]
+        last = self._month_bounds(months[-1])[1]
+        if first is None:
+            return (None, None)
+        return (datetime.fromtimestamp(first), datetime.fromtimestamp(last))
+
+    def _month_bounds(self, month):
+        if os.path.exists(self._file(month, '.csv.gz')):
+            blocks = self._blocks(month)
+            if blocks:
+                return (blocks[0][0], blocks[-1][1])
+            timestamps = [ int(line[0]) for line in self._month_rows(month) if len(line) > 0 and line[0].strip().isdigit() ]
+            if len(timestamps) == 0:
+                return (None, None)
+            return (timestamps[0], timestamps[-1])
+        else:
+            return self._file_bounds(self._file(month))
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        '''
+        Replaces the samples older than samples_before by one sample per
+        hour, as the !csv storage. Only the months concerned are rewritten,
+        months ending before 'since' are already compacted and skipped.
+        The lock is taken per month so that writes go on meanwhile and
+        progress is called after each month. Returns the number of samples
+        compacted.
+        '''
+        limit = int(time.mktime(samples_before.timetuple()))
+        start = int(time.mktime(since.timetuple())) if since is not None else None
+        count = 0
+        self.lock.acquire()
+        try:
+            months = self._months()
+        finally:
+            self.lock.release()
+        for month in months:
+            self.lock.acquire()
+            try:
+                (first, last) = self._month_bounds(month)
+                if first is None or first >= limit:
+                    continue
+                if start is not None and last < start:
+                    continue
+                output = StringIO()
+                rows = [ line for line in self._month_rows(month) if len(line) > 0 ]
+                if len(rows) == 0 or rows[0][0].strip().isdigit():
+                    rows = [ self.columns ] + rows
+                count = count + self._compact(iter(rows), csv.writer(output), limit, start)
+                rows = list(csv.reader(output.getvalue().splitlines()))
+                if os.path.exists(self._file(month, '.csv.gz')):
+                    self._write_compressed(month, rows)
+                else:
+                    if month == self.open_month:
+                        self._close()
+                    AtomicFileWriter().write(self._file(month), output.getvalue(), compare=False)
+            finally:
+                self.lock.release()
+            if progress is not None and last < limit:
+                progress(datetime.fromtimestamp(last + 1))
+        self.logger.info("Compacted %d samples older than %s", count, samples_before)
+        if progress is not None:
+            progress(samples_before)
+        return count
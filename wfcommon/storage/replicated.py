@@ -0,0 +1,290 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import time
+import os
+import os.path
+import json
+from Queue import Queue, Empty
+from datetime import datetime
+
+from wfcommon.atomicfile import AtomicFileWriter
+
+class ReplicatedStorage(object):
+    '''
+    Writes the samples to a primary storage and copies them to secondary
+    storages in background threads, e.g. a local sqlite3 database and a
+    remote MySQL database. Reads are served by the primary only, so that
+    a slow or unavailable secondary never delays the logger nor the
+    renderers.
+
+    Samples which could not be written to a secondary are kept in a
+    backlog and written again every 'retry' seconds, in order, before the
+    new samples. The replicas start with the first sample written, so
+    that the processes only reading the storage (e.g. the renderer) do not
+    replicate nor open the backlogs.
+
+    [ Properties ]
+
+    primary [storage]:
+        The storage written synchronously and used for reading.
+
+    secondaries [list] (optional):
+        The storages receiving a copy of the samples.
+
+    backlog [string] (optional):
+        Directory where the backlogs of the secondaries are kept, so that
+        they survive a restart. By default the backlogs are kept in memory.
+
+    retry [numeric] (optional):
+        Seconds between two attempts to write the backlog. Defaults to 60.
+
+    batch [numeric] (optional):
+        Maximum number of backlog samples written at once. Defaults to 500.
+    '''
+
+    primary = None
+    secondaries = []
+    backlog = None
+    retry = 60
+    batch = 500
+
+    replicas = None
+    context = None
+    lock = threading.Lock()
+
+    logger = logging.getLogger('storage.replicated')
+
+    def init(self, context=None):
+        try:
+            self.primary.init(context=context)
+        except AttributeError:
+            pass # In case the element has not init method
+        self.context = context
+
+    def _replicas(self):
+        # Started once per instance, even if init is called again
+        if self.replicas is None:
+            self.lock.acquire()
+            try:
+                if self.replicas is None:
+                    replicas = []
+                    for i in range(len(self.secondaries)):
+                        if self.backlog is not None:
+                            backlog = FileBacklog(os.path.join(self.backlog, 'replica-%d.backlog' % i))
+                        else:
+                            backlog = MemoryBacklog()
+                        replica = Replica(self.secondaries[i], 'replica %d' % i, backlog, self.retry, self.batch, self.context)
+                        replica.start()
+                        replicas.append(replica)
+                    self.replicas = replicas
+            finally:
+                self.lock.release()
+        return self.replicas
+
+    def keys(self, context={}):
+        return self.primary.keys(context=context)
+
+    def samples(self, from_time=datetime.fromtimestamp(0), to_time=datetime.now(), context={}):
+        return self.primary.samples(from_time, to_time, context=context)
+
+    def sample_bounds(self, context={}):
+        return self.primary.sample_bounds(context=context)
+
+    def aggregate_functions(self, context={}):
+        return self.primary.aggregate_functions(context=context)
+
+    def aggregate(self, from_time, to_time, unit, specs, sector=None, context={}):
+        return self.primary.aggregate(from_time, to_time, unit, specs, sector=sector, context=context)
+
+    def compacted_until(self, context={}):
+        return self.primary.compacted_until(context=context)
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        return self.primary.compact(samples_before, hourly_before, since=since, progress=progress, context=context)
+
+    def write_sample(self, sample, context={}):
+        self.primary.write_sample(sample, context=context)
+        for replica in self._replicas():
+            replica.put(sample)
+
+    def write_samples(self, samples, context={}):
+        self.primary.write_samples(samples, context=context)
+        for replica in self._replicas():
+            for sample in samples:
+                replica.put(sample)
+
+class Replica(object):
+    '''
+    Writes the samples queued for one secondary storage.
+    '''
+
+    logger = logging.getLogger('storage.replicated')
+
+    def __init__(self, storage, name, backlog, retry, batch, context):
+        self.storage = storage
+        self.name = name
+        self.backlog = backlog
+        self.retry = retry
+        self.batch = batch
+        self.context = context
+        self.queue = Queue()
+        self.initialized = False
+        self.next_retry = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        thread = threading.Thread(target=self.run)
+        thread.setDaemon(True)
+        thread.start()
+
+    def put(self, sample):
+        self.queue.put(dict(sample))
+
+    def _write(self, samples):
+        if not self.initialized:
+            try:
+                self.storage.init(context=self.context)
+            except AttributeError:
+                pass # In case the element has not init method
+            self.initialized = True
+        try:
+            # Batch writes raise the errors
+            self.storage.write_samples(samples, context=self.context)
+        except AttributeError:
+            for sample in samples:
+                self.storage.write_sample(sample, context=self.context)
+        self.written += len(samples)
+
+    def run(self):
+        while True:
+            try:
+                sample = self.queue.get(timeout=1)
+            except Empty:
+                sample = None
+
+            if sample is not None:
+                if len(self.backlog) > 0:
+                    # Keep the order of the samples
+                    self.backlog.append(sample)
+                else:
+                    try:
+                        self._write([ sample ])
+                    except Exception, e:
+                        self.failed += 1
+                        self.logger.warning("Cannot write to %s, sample kept in backlog: %s", self.name, str(e))
+                        self.backlog.append(sample)
+                        self.next_retry = time.time() + self.retry
+
+            if len(self.backlog) > 0 and time.time() >= self.next_retry:
+                self.catch_up()
+
+    def catch_up(self):
+        '''
+        Writes the backlog, by batches. Stops at the first error.
+        '''
+        self.logger.info("Writing backlog of %d samples to %s", len(self.backlog), self.name)
+        try:
+            while len(self.backlog) > 0:
+                samples = self.backlog.head(self.batch)
+                self._write(samples)
+                self.backlog.remove(len(samples))
+            self.logger.info("Backlog of %s written", self.name)
+        except Exception, e:
+            self.failed += 1
+            self.logger.warning("Cannot write backlog to %s (%d samples left, retrying in %d secs.): %s",
+                                self.name, len(self.backlog), self.retry, str(e))
+            self.next_retry = time.time() + self.retry
+
+class MemoryBacklog(object):
+
+    def __init__(self):
+        self.samples = []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def append(self, sample):
+        self.samples.append(sample)
+
+    def head(self, count):
+        return self.samples[:count]
+
+    def remove(self, count):
+        del self.samples[:count]
+
+class FileBacklog(object):
+    '''
+    Backlog kept in a file, one sample per line in JSON.
+    '''
+
+    time_format = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, path):
+        self.path = path
+        self.samples = []
+        if os.path.exists(path):
+            file = open(path, 'r')
+            try:
+                for line in file:
+                    if line.strip() != '':
+                        self.samples.append(self._decode(line))
+            finally:
+                file.close()
+        else:
+            dir = os.path.dirname(path)
+            if dir != '' and not os.path.exists(dir):
+                os.makedirs(dir)
+
+    def _encode(self, sample):
+        sample = dict(sample)
+        sample['localtime'] = sample['localtime'].strftime(self.time_format)
+        return json.dumps(sample)
+
+    def _decode(self, line):
+        sample = json.loads(line)
+        sample = dict([ (str(key), value) for (key, value) in sample.iteritems() ])
+        sample['localtime'] = datetime.strptime(sample['localtime'], self.time_format)
+        return sample
+
+    def __len__(self):
+        return len(self.samples)
+
+    def append(self, sample):
+        file = open(self.path, 'a')
+        try:
+            file.write(self._encode(sample) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        finally:
+            file.close()
+        self.samples.append(sample)
+
+    def head(self, count):
+        return self.samples[:count]
+
+    def remove(self, count):
+        del self.samples[:count]
+        if len(self.samples) == 0:
+            os.remove(self.path)
+        else:
+            content = ''.join([ self._encode(sample) + '\n' for sample in self.samples ])
+            AtomicFileWriter(fsync=True).write(self.path, content, compare=False)
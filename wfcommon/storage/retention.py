@@ -0,0 +1,163 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import time
+import threading
+from datetime import datetime
+from datetime import timedelta
+from wfcommon.atomicfile import AtomicFileWriter
+
+class RetentionStorage(object):
+    '''
+    Applies a retention policy to a storage. Samples older than a given
+    number of days are compacted into hourly and daily summaries. The
+    compaction runs in a background thread started by the sample writes,
+    so that writing a sample never waits for it.
+
+    Each run starts from a checkpoint, the time before which the samples
+    are already compacted, which is advanced as the compaction progresses
+    (after each day in database storages, after each month in partitioned
+    storages). Database connections are kept per thread, so the compaction
+    does not share the connection of the writes.
+
+    Database storages must have 'rollups' enabled. The compacted periods
+    are then read from the summary tables: accumulators aggregate them with
+    the storage (even when their 'pushdown' is disabled) while samples()
+    returns one sample per hour, or per day once the hourly summaries are
+    deleted, holding the averages. Formulas computed from these samples
+    (e.g. wind chill, heat index) thus lose precision on compacted periods.
+    CSV storages replace old samples by one sample per hour.
+
+    [ Properties ]
+
+    storage [storage]:
+        The underlying storage.
+
+    raw [numeric] (optional):
+        Number of days the samples are kept. Defaults to 30.
+
+    hourly [numeric] (optional):
+        Number of days the hourly summaries are kept (database storages
+        only). Daily summaries are never deleted. Defaults to keeping them.
+
+    period [numeric] (optional):
+        Number of seconds between two compactions. Defaults to 86400.
+
+    checkpoint [string] (optional):
+        File where the checkpoint is kept, so that a restart does not
+        walk again through the compacted periods. By default the checkpoint
+        is kept in memory only.
+    '''
+
+    storage = None
+    raw = 30
+    hourly = None
+    period = 86400
+    checkpoint = None
+
+    last_compaction = None
+    # Samples before this time are already compacted
+    compacted = None
+    thread = None
+
+    logger = logging.getLogger('storage.retention')
+
+    def init(self, context=None):
+        try:
+            self.storage.init(context=context)
+        except AttributeError:
+            pass # In case the element has not init method
+        self.compacted = self._read_checkpoint()
+
+    def keys(self, context={}):
+        return self.storage.keys(context=context)
+
+    def samples(self, from_time=datetime.fromtimestamp(0), to_time=datetime.now(), context={}):
+        return self.storage.samples(from_time, to_time, context=context)
+
+    def aggregate_functions(self, context={}):
+        return self.storage.aggregate_functions(context=context)
+
+    def aggregate(self, from_time, to_time, unit, specs, sector=None, context={}):
+        return self.storage.aggregate(from_time, to_time, unit, specs, sector=sector, context=context)
+
+    def compacted_until(self, context={}):
+        return self.storage.compacted_until(context=context)
+
+    def sample_bounds(self, context={}):
+        return self.storage.sample_bounds(context=context)
+
+    def compact(self, samples_before, hourly_before=None, since=None, progress=None, context={}):
+        return self.storage.compact(samples_before, hourly_before, since=since, progress=progress, context=context)
+
+    def write_samples(self, samples, context={}):
+        self.storage.write_samples(samples, context=context)
+
+    def write_sample(self, sample, context={}):
+        self.storage.write_sample(sample, context=context)
+
+        now = time.time()
+        if self.last_compaction is None or self.last_compaction + self.period <= now:
+            if self.thread is None or not self.thread.isAlive():
+                self.last_compaction = now
+                self.thread = threading.Thread(target=self.run, args=(context,), name='retention')
+                self.thread.setDaemon(True)
+                self.thread.start()
+
+    def run(self, context={}):
+        '''
+        Compacts the samples from the checkpoint up to the retention limit.
+        '''
+        now = datetime.now()
+        samples_before = now - timedelta(self.raw)
+        hourly_before = now - timedelta(self.hourly) if self.hourly is not None else None
+        self.logger.info("Compacting samples older than %s since %s", samples_before, self.compacted)
+        try:
+            self.storage.compact(samples_before, hourly_before, since=self.compacted,
+                                 progress=self._progress, context=context)
+            self._progress(samples_before)
+        except Exception, e:
+            self.logger.exception(e)
+
+    def _progress(self, compacted):
+        if self.compacted is None or compacted > self.compacted:
+            self.compacted = compacted
+            self._write_checkpoint(compacted)
+
+    def _read_checkpoint(self):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None
+        try:
+            f = open(self.checkpoint, 'r')
+            try:
+                return datetime.fromtimestamp(float(f.read().strip()))
+            finally:
+                f.close()
+        except (IOError, ValueError), e:
+            self.logger.warning("Ignoring checkpoint %s: %s", self.checkpoint, e)
+            return None
+
+    def _write_checkpoint(self, compacted):
+        if self.checkpoint is None:
+            return
+        try:
+            AtomicFileWriter().write(self.checkpoint, str(time.mktime(compacted.timetuple())), compare=False)
+        except (IOError, OSError), e:
+            self.logger.warning("Cannot write checkpoint %s: %s", self.checkpoint, e)
@@ -70,8 +70,8 @@ class SimulatorStorage(object):
         sample = copy.copy(self.base)
 
         t = from_time
+        gen = random.Random()
         while t < to_time:
-            gen = random.Random()
             minutes = int(time.mktime(t.timetuple())/60)
             gen.seed(self.seed+minutes)
 
@@ -18,6 +18,8 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import time
+import datetime
 import base
 import wfcommon.database
 
@@ -32,14 +34,67 @@ class Sqlite3Storage(base.DatabaseStorage):
 
     tablename [string] (optional):
         Table name. Defaults to 'METEO'.
+
+    rollups [true|false] (optional):
+        Maintain hourly and daily summary tables (named after the table
+        with the _HOURLY and _DAILY suffixes) along with the samples.
+        Accumulators then read them for long spans. The tables are
+        created when missing. Use 'wfcommon/rollup.py' to fill them from
+        an existing archive. Defaults to false.
+
+    profile [default|performance] (optional):
+        'performance' tunes the database for a logger writing while
+        renderers read: write-ahead journal, so that readers are not
+        blocked by the writer, relaxed synchronous level, memory mapped
+        reads, connections kept open with their prepared statements and
+        separate read-only connections for the readers. Defaults to
+        'default', which leaves the database settings unchanged.
+
+    journal [string] (optional):
+        Journal mode (e.g. DELETE, WAL). Defaults to WAL with the
+        performance profile.
+
+    synchronous [string] (optional):
+        Synchronous level (OFF, NORMAL, FULL). Defaults to NORMAL with the
+        performance profile.
+
+    mmap_size [numeric] (optional):
+        Number of bytes of the database file mapped in memory. Defaults
+        to 268435456 with the performance profile.
     '''
 
     database = None
+    profile = 'default'
+    journal = None
+    synchronous = None
+    mmap_size = None
+
+    profiles = {
+        'default': {},
+        'performance': { 'journal': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 268435456 } }
 
     logger = logging.getLogger('storage.sqlite3')
 
+    def _pragmas(self):
+        settings = self.profiles[self.profile]
+        pragmas = []
+        for (name, pragma) in [ ('journal', 'journal_mode'), ('synchronous', 'synchronous'), ('mmap_size', 'mmap_size') ]:
+            value = getattr(self, name)
+            if value is None:
+                value = settings.get(name)
+            if value is not None:
+                pragmas.append((pragma, value))
+        return pragmas
+
     def init(self, context=None):
-        self.db = wfcommon.database.Sqlite3(self.database)
+        assert self.profiles.has_key(self.profile), "'sqlite3.profile' must be one of %s" % ', '.join(self.profiles.keys())
+        if self.profile == 'performance':
+            self.db = wfcommon.database.Sqlite3(self.database, pragmas=self._pragmas(),
+                                                persistent=True, detect_types=False)
+            self.read_db = wfcommon.database.Sqlite3(self.database, pragmas=self._pragmas(),
+                                                read_only=True, persistent=True, detect_types=False)
+        else:
+            self.db = wfcommon.database.Sqlite3(self.database, pragmas=self._pragmas())
 
         table_fields = self._get_table_fields()
         # Verify Mandatory fields
@@ -51,10 +106,53 @@ class Sqlite3Storage(base.DatabaseStorage):
         self.storage_fields = self.mandatory_storage_fields + \
                               [field for field in self.optional_storage_fields if field in table_fields]
         self.logger.info("Table %s detected with fields: %s" % (self.tablename, ', '.join(self.storage_fields)))
+        self._init_rollups()
+        self.math_functions = self._has_math_functions()
+
+    def _has_math_functions(self):
+        # Math functions are optional in sqlite builds
+        try:
+            self.db.connect()
+            try:
+                list(self.db.select("SELECT COS(PI())"))
+                return True
+            except Exception:
+                return False
+        finally:
+            self.db.disconnect()
+
+    # Parameters let sqlite reuse the statements from its cache
+
+    def _insert_statement(self, sample):
+        timestamp = time.mktime(sample['localtime'].timetuple())
+        utc_time = datetime.datetime.utcfromtimestamp(timestamp)
+        sql = "INSERT INTO %s (TIMESTAMP_UTC, TIMESTAMP_LOCAL, %s) VALUES (?, ?, %s)" % (
+                  self.tablename,
+                  ', '.join(self.storage_fields),
+                  ', '.join([ '?' ] * len(self.storage_fields)))
+        params = [ utc_time.strftime(self.time_format), sample['localtime'].strftime(self.time_format) ] + \
+                 [ sample.get(field.lower()) for field in self.storage_fields ]
+        return (sql, params)
+
+    def _select_statement(self, from_time, to_time):
+        sql = ( "SELECT TIMESTAMP_UTC, TIMESTAMP_LOCAL, %s FROM %s " + \
+                " WHERE TIMESTAMP_LOCAL >= ? AND TIMESTAMP_LOCAL < ? "+ \
+                " ORDER BY TIMESTAMP_LOCAL ASC" ) % (
+                    ', '.join(self.storage_fields),
+                    self.tablename)
+        return (sql, [ from_time.strftime(self.time_format), to_time.strftime(self.time_format) ])
+
+    # Timestamps are stored as text, group on their prefix
+    unit_lengths = { 'year': 4, 'month': 7, 'day': 10, 'hour': 13, 'minute': 16 }
+
+    def _group_expressions(self, unit):
+        return [ "SUBSTR(TIMESTAMP_LOCAL, 1, %d)" % self.unit_lengths[unit] ]
 
 
-    def _get_table_fields(self):
-        sql = "PRAGMA table_info(%s);" % self.tablename
+    def _get_table_fields(self, tablename=None):
+        if tablename is None:
+            tablename = self.tablename
+        sql = "PRAGMA table_info(%s);" % tablename
         fields = []
 
         try:
@@ -26,12 +26,32 @@ if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/..'))
 import wfcommon.storage
 import optparse
 import logging
+import datetime
+import threading
+import time
+import os
 import wfcommon.config
+from Queue import Queue
+from wfcommon.atomicfile import AtomicFileWriter
 
 class StorageCopy(object):
+    '''
+    Copies the samples of a storage to another one.
+
+    The time range is split in partitions read and converted by several
+    worker threads while a writer writes them in chronological order, by
+    batches. After each batch the time of the last sample written is saved
+    in a checkpoint file, use --resume to continue an interrupted copy.
+    '''
 
     logger = logging.getLogger('storagecopy')
 
+    # Seconds between two progress messages
+    progress_period = 10
+
+    # Seconds spent reading the source in a dry run
+    dry_run_time = 30
+
     def __init__(self, config_file=None):
 
         # Prepare the configurer
@@ -47,12 +67,21 @@ class StorageCopy(object):
         # Initialize the option parser
         opt_parser = optparse.OptionParser()
         configurer.add_options(opt_parser)
+        opt_parser.add_option("--from", dest="from_date", help="Copy the samples from this day", metavar="YYYY-MM-DD")
+        opt_parser.add_option("--to", dest="to_date", help="Copy the samples up to this day (included)", metavar="YYYY-MM-DD")
+        opt_parser.add_option("--workers", dest="workers", type="int", default=4, help="Number of reading threads. Default: 4")
+        opt_parser.add_option("--partition", dest="partition", type="int", default=7, help="Days read at once by a thread. Default: 7")
+        opt_parser.add_option("--batch", dest="batch", type="int", default=1000, help="Samples written in one transaction. Default: 1000")
+        opt_parser.add_option("--checkpoint", dest="checkpoint", default="storagecopy.checkpoint", help="Checkpoint file. Default: storagecopy.checkpoint", metavar="FILE")
+        opt_parser.add_option("--resume", action="store_true", dest="resume", help="Resume from the checkpoint file")
+        opt_parser.add_option("--dry-run", action="store_true", dest="dry_run", help="Read the source for %d seconds and estimate the copy time" % self.dry_run_time)
 
         # Parse the options and create object trees from configuration
         (options, args) = opt_parser.parse_args()
 
         (config, context) = configurer.configure(options, self, config_file)
 
+        self.options = options
         self.from_storage = config['from']
         self.to_storage = config['to']
         try:
@@ -60,24 +89,167 @@ class StorageCopy(object):
         except AttributeError:
             pass # In case the element has not init method
 
+        if not options.dry_run:
+            try:
+                self.to_storage.init(context=context)
+            except AttributeError:
+                pass # In case the element has not init method
+
+    def _bounds(self):
+        options = self.options
+        if options.from_date and options.to_date:
+            return (parse(options.from_date), parse(options.to_date) + datetime.timedelta(1))
         try:
-            self.to_storage.init(context=context)
+            (first, last) = self.from_storage.sample_bounds()
         except AttributeError:
-            pass # In case the element has not init method
+            # Storage not telling its bounds, find the first sample
+            first = None
+            for sample in self.from_storage.samples():
+                first = sample[self.from_storage.keys().index('localtime')]
+                break
+            last = datetime.datetime.now()
+        if first is None:
+            return (None, None)
+        from_time = parse(options.from_date) if options.from_date else first.replace(microsecond=0)
+        to_time = parse(options.to_date) + datetime.timedelta(1) if options.to_date else last.replace(microsecond=0) + datetime.timedelta(0, 1)
+        return (from_time, to_time)
 
-    def run(self):
+    def _read_checkpoint(self):
+        if not os.path.exists(self.options.checkpoint):
+            return None
+        file = open(self.options.checkpoint, 'r')
+        try:
+            return datetime.datetime.strptime(file.read().strip(), '%Y-%m-%d %H:%M:%S')
+        finally:
+            file.close()
+
+    def _partitions(self, from_time, to_time):
+        partitions = []
+        size = datetime.timedelta(self.options.partition)
+        start = from_time
+        while start < to_time:
+            partitions.append((start, min(start + size, to_time)))
+            start = start + size
+        return partitions
 
+    def _read(self, partitions, tasks, results, condition, slots):
         keys = self.from_storage.keys()
+        while True:
+            # Take the slot first so that the partitions given out are
+            # never waiting for one
+            slots.acquire()
+            index = tasks.get()
+            if index is None:
+                slots.release()
+                return
+            (start, end) = partitions[index]
+            try:
+                result = [ dict(zip(keys, sample)) for sample in self.from_storage.samples(start, end) ]
+            except Exception, e:
+                self.logger.exception("Error reading samples from %s to %s" % (start, end))
+                result = e
+            condition.acquire()
+            try:
+                results[index] = result
+                condition.notifyAll()
+            finally:
+                condition.release()
+
+    def _write(self, samples):
+        if self.options.dry_run:
+            return
+        try:
+            self.to_storage.write_samples(samples)
+        except AttributeError:
+            # Storage without batch writes
+            for sample in samples:
+                self.to_storage.write_sample(sample)
+
+    def run(self):
+        options = self.options
+        (from_time, to_time) = self._bounds()
+        if from_time is None:
+            self.logger.info("No sample to copy")
+            return
+
+        if options.resume:
+            checkpoint = self._read_checkpoint()
+            if checkpoint is not None:
+                self.logger.info("Resuming after %s", checkpoint)
+                from_time = checkpoint + datetime.timedelta(0, 1)
+
+        partitions = self._partitions(from_time, to_time)
+        self.logger.info("Copying samples from %s to %s in %d partitions", from_time, to_time, len(partitions))
+
+        tasks = Queue()
+        for index in range(len(partitions)):
+            tasks.put(index)
+        for i in range(options.workers):
+            tasks.put(None)
+
+        results = {}
+        condition = threading.Condition()
+        # Limits the partitions held in memory
+        slots = threading.Semaphore(options.workers * 2)
+        for i in range(options.workers):
+            thread = threading.Thread(target=self._read, args=(partitions, tasks, results, condition, slots))
+            thread.setDaemon(True)
+            thread.start()
+
+        writer = AtomicFileWriter(fsync=True)
+        span = float(total_seconds(to_time - from_time))
+        start_time = time.time()
+        last_progress = start_time
         n = 0
+        done = 0
+        last_written = None
+        for index in range(len(partitions)):
+            condition.acquire()
+            try:
+                while not results.has_key(index):
+                    condition.wait(1)
+                result = results.pop(index)
+            finally:
+                condition.release()
+            slots.release()
+            if isinstance(result, Exception):
+                raise result
+
+            for i in range(0, len(result), options.batch):
+                batch = result[i:i+options.batch]
+                self._write(batch)
+                n += len(batch)
+                last_written = batch[-1]['localtime']
+                if not options.dry_run:
+                    writer.write(options.checkpoint, last_written.strftime('%Y-%m-%d %H:%M:%S'), compare=False)
+
+            now = time.time()
+            done = total_seconds(partitions[index][1] - from_time) / span
+            if now - last_progress > self.progress_period:
+                last_progress = now
+                rate = n / (now - start_time)
+                eta = (now - start_time) * (1 - done) / done
+                self.logger.info("Copied %d samples up to %s (%.1f%%), %.0f samples/s, ETA %s" % (
+                    n, partitions[index][1], done * 100, rate, datetime.timedelta(0, int(eta))))
+
+            if options.dry_run and now - start_time > self.dry_run_time:
+                break
+
+        elapsed = time.time() - start_time
+        if options.dry_run:
+            estimate = elapsed / done if done > 0 else 0
+            print "Read %d samples in %.1f secs (%.0f samples/s), %.1f%% of the range" % (n, elapsed, n / max(elapsed, 0.001), done * 100)
+            print "Estimated time to read the whole range: %s (writing not included)" % datetime.timedelta(0, int(estimate))
+        else:
+            self.logger.info("Copied %d samples in %.1f secs (%.0f samples/s)" % (n, elapsed, n / max(elapsed, 0.001)))
+            if os.path.exists(options.checkpoint):
+                os.remove(options.checkpoint)
+
+def parse(date):
+    return datetime.datetime.strptime(date, "%Y-%m-%d")
 
-        for sample in self.from_storage.samples():
-            if n % 500 == 0: 
-                self.logger.info("Processed %d samples" % n)
-            sample_to_write = {}
-            for i in range(len(keys)):
-                sample_to_write[keys[i]] = sample[i]
-            self.to_storage.write_sample(sample_to_write)
-            n += 1
+def total_seconds(delta):
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
 
 if __name__ == "__main__":
     driver = StorageCopy()
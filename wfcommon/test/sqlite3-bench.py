@@ -0,0 +1,97 @@
+import os,sys
+import time
+import datetime
+import random
+import tempfile
+import threading
+import sqlite3
+
+if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/../..'))
+
+import wfcommon.storage.sqlite3
+
+# Compares the sqlite3 storage profiles with a logger writing samples while
+# renderers read the last day of samples.
+#
+# usage: sqlite3-bench.py [days of archive] [seconds] [readers]
+
+days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+duration = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+readers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+schema = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../database/db-sqlite3.sql'))
+
+def sample(localtime):
+    return { 'localtime': localtime, 'temp': random.uniform(-10, 30), 'hum': random.uniform(20, 100),
+             'wind': random.uniform(0, 20), 'wind_dir': random.randint(0, 359),
+             'wind_gust': random.uniform(0, 30), 'wind_gust_dir': random.randint(0, 359),
+             'dew_point': random.uniform(-10, 20), 'rain': random.choice([0, 0, 0, 0.3]),
+             'rain_rate': 0, 'pressure': random.uniform(980, 1030) }
+
+def create(path, start):
+    connection = sqlite3.connect(path)
+    connection.executescript(open(schema).read())
+    connection.close()
+    storage = wfcommon.storage.sqlite3.Sqlite3Storage()
+    storage.database = path
+    storage.init()
+    time = start
+    while time < start + datetime.timedelta(days):
+        storage.write_sample(sample(time))
+        time = time + datetime.timedelta(0, 600)
+
+def run(profile, path, start):
+    storage = wfcommon.storage.sqlite3.Sqlite3Storage()
+    storage.database = path
+    storage.profile = profile
+    storage.init()
+
+    end = time.time() + duration
+    counts = { 'writes': 0, 'reads': 0, 'samples': 0, 'errors': 0 }
+    lock = threading.Lock()
+    last = [ start + datetime.timedelta(days) ]
+
+    def write():
+        while time.time() < end:
+            last[0] = last[0] + datetime.timedelta(0, 60)
+            storage.write_sample(sample(last[0]))
+            lock.acquire()
+            counts['writes'] += 1
+            lock.release()
+
+    def read():
+        while time.time() < end:
+            try:
+                n = len(list(storage.samples(last[0] - datetime.timedelta(1), last[0])))
+            except Exception:
+                n = None
+            lock.acquire()
+            if n is None:
+                counts['errors'] += 1
+            else:
+                counts['reads'] += 1
+                counts['samples'] += n
+            lock.release()
+
+    threads = [ threading.Thread(target=write) ] + [ threading.Thread(target=read) for i in range(readers) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print "%-12s writes/s: %8.1f  reads/s: %8.1f  samples read/s: %10.1f  errors: %d" % (
+        profile, counts['writes'] / float(duration), counts['reads'] / float(duration),
+        counts['samples'] / float(duration), counts['errors'])
+
+start = datetime.datetime(2010, 1, 1)
+for profile in [ 'default', 'performance' ]:
+    (fd, path) = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.remove(path)
+    try:
+        create(path, start)
+        run(profile, path, start)
+    finally:
+        for suffix in [ '', '-wal', '-shm' ]:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
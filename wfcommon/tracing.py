@@ -0,0 +1,104 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+
+from wfcommon import metrics
+
+# Traces of the events from the station to the storage. When enabled
+# ('trace: true' in the driver or logger configuration), each event
+# carries a list of (stamp, time) pairs, one per hop:
+#
+#   station       the station sent the event to the driver
+#   driver.queue  the driver took it from its queue to send it
+#   logger.input  the logger input received it
+#   logger.queue  the logger took it from its queue for the collectors
+#   buffer        !buffer forwarded it, after retention
+#   storage       !aggregator wrote the sample aggregating it
+#   xmlfile       !xmlfile wrote the current values
+#
+# Stamps are kept only on the events already traced when tracing is
+# disabled, so that a traced driver is followed by any logger. Across
+# HTTP, the durations include the clock difference of the hosts.
+
+enabled = False
+
+logger = logging.getLogger('tracing')
+
+hops = metrics.histogram('wfrog_event_hop_seconds', 'Time spent by the traced events between two stamps.', [ 'hop' ])
+stages = metrics.histogram('wfrog_event_latency_seconds', 'Time from the station to a stamp, for the traced events.', [ 'stamp' ])
+
+def trace(event):
+    '''
+    Returns the trace of an event, or None if the event is not traced.
+    '''
+    return getattr(event, '__dict__', {}).get('_trace')
+
+def stamp(event, name):
+    '''
+    Adds a stamp to the trace of the event, starting the trace if tracing
+    is enabled.
+    '''
+    current = trace(event)
+    if current is None:
+        if not enabled:
+            return
+        current = []
+        # Set in __dict__ so that driver events do not serialize it as a value
+        event.__dict__['_trace'] = current
+    _add(current, name, time.time())
+
+def finish(traces, name):
+    '''
+    Measures the last hop of traces and logs them in debug level. The
+    traces are not modified, several collectors can receive the same
+    events (e.g. !aggregator and !xmlfile).
+    '''
+    now = time.time()
+    for current in traces:
+        _measure(current, name, now)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Trace: %s", describe(current + [ (name, now) ]))
+
+def _add(current, name, now):
+    _measure(current, name, now)
+    current.append((name, now))
+
+def _measure(current, name, now):
+    if len(current) > 0:
+        (last, last_time) = current[-1]
+        hops.observe(max(0, now - last_time), hop=last + '>' + name)
+        stages.observe(max(0, now - current[0][1]), stamp=name)
+
+def describe(current):
+    if len(current) == 0:
+        return ''
+    start = current[0][1]
+    return ', '.join([ '%s +%.1fms' % (name, (stamp_time - start) * 1000) for (name, stamp_time) in current ])
+
+def encode(current):
+    return ','.join([ '%s@%.6f' % (name, stamp_time) for (name, stamp_time) in current ])
+
+def decode(text):
+    current = []
+    for item in str(text).split(','):
+        if '@' in item:
+            (name, stamp_time) = item.split('@', 1)
+            current.append((name, float(stamp_time)))
+    return current
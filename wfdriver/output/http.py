@@ -19,6 +19,7 @@
 import httplib
 import urlparse
 import logging
+from wfcommon import tracing
 
 class HttpOutput(object):
     '''
@@ -43,7 +44,7 @@ class HttpOutput(object):
                 self.path = self.path + '?' + parts.query
 
         try:
-            self.connection.request('POST', self.url, str(event))
+            self.connection.request('POST', self.url, self._message(event))
             response = self.connection.getresponse()
             response.read()
         except Exception, e:
@@ -54,3 +55,12 @@ class HttpOutput(object):
         if response.status != 200:
             self.logger.critical('HTTP '+response.status+' '+response.reason)
             self.connection = None
+
+    def _message(self, event):
+        message = str(event)
+        trace = tracing.trace(event)
+        if trace is not None:
+            # Extension element after the values of the event
+            end = message.rindex('</')
+            message = message[:end] + '<_trace>' + tracing.encode(trace) + '</_trace>' + message[end:]
+        return message
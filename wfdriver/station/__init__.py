@@ -16,57 +16,38 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-
-import simulator
-import wmrs200
-import wmr928nx
-import wmr200
-import vantagepro
-import vantagepro2
-import wh1080
-import wh3080
-import ws23xx
-import ws28xx
+from wfcommon.registry import Registry
 import auto
 
-# YAML mappings and registration for auto-detect
-
-class YamlAutoDetectStation(auto.AutoDetectStation, yaml.YAMLObject):
-    yaml_tag = u'!auto'
-
-class YamlWMR200Station(wmr200.WMR200Station, yaml.YAMLObject):
-    yaml_tag = u'!wmr200'
-auto.stations.append(wmr200)
-
-class YamlWMRS200Station(wmrs200.WMRS200Station, yaml.YAMLObject):
-    yaml_tag = u'!wmrs200'
-auto.stations.append(wmrs200)
-
-class YamlWMR928NXStation(wmr928nx.WMR928NXStation, yaml.YAMLObject):
-    yaml_tag = u'!wmr928nx'
-auto.stations.append(wmr928nx)
-
-class YamlVantageProStation(vantagepro.VantageProStation, yaml.YAMLObject):
-    yaml_tag = u'!vantagepro'
-
-class YamlVantageProStation(vantagepro2.VantageProStation, yaml.YAMLObject):
-    yaml_tag = u'!vantagepro2'
-
-class YamlWH1080Station(wh1080.WH1080Station, yaml.YAMLObject):
-    yaml_tag = u'!wh1080'
-    
-class YamlWH3080Station(wh3080.WH3080Station, yaml.YAMLObject):
-    yaml_tag = u'!wh3080'
-
-class YamlWS2300Station(ws23xx.WS2300Station, yaml.YAMLObject):
-    yaml_tag = u'!ws2300'    
-
-class YamlWS28xxStation(ws28xx.WS28xxStation, yaml.YAMLObject):
-    yaml_tag = u'!ws28xx'
-auto.stations.append(ws28xx)
-
-class YamlRandomSimulator(simulator.RandomSimulator, yaml.YAMLObject):
-    yaml_tag = u'!random-simulator'
-auto.stations.append(simulator)
-
+# YAML mappings and registration for auto-detect. The modules are imported
+# when their tag is used or when !auto probes them.
+
+elements = Registry(__name__)
+
+elements.register(u'!auto', 'auto', 'AutoDetectStation',
+    "Auto detect station")
+elements.register(u'!wmr200', 'wmr200', 'WMR200Station',
+    "Station driver for the Oregon Scientific WMR200")
+auto.stations.append(elements.module('wmr200'))
+elements.register(u'!wmrs200', 'wmrs200', 'WMRS200Station',
+    "Station driver for the Oregon Scientific WMRS200")
+auto.stations.append(elements.module('wmrs200'))
+elements.register(u'!wmr928nx', 'wmr928nx', 'WMR928NXStation',
+    "Station driver for the Oregon Scientific WMR928NX")
+auto.stations.append(elements.module('wmr928nx'))
+elements.register(u'!vantagepro', 'vantagepro', 'VantageProStation',
+    "Station driver for the Davis VantagePro")
+elements.register(u'!vantagepro2', 'vantagepro2', 'VantageProStation',
+    "Station driver for the Davis VantagePro and VantagePro2")
+elements.register(u'!wh1080', 'wh1080', 'WH1080Station',
+    "Station driver for Fine Offset WH1080, WH1081, WH1090, WH1091, WH2080, WH2081")
+elements.register(u'!wh3080', 'wh3080', 'WH3080Station',
+    "Station driver for Fine Offset WH3080")
+elements.register(u'!ws2300', 'ws23xx', 'WS2300Station',
+    "Station driver for LaCrosse WS2300")
+elements.register(u'!ws28xx', 'ws28xx', 'WS28xxStation',
+    "Station driver for LaCrosse WS28xx")
+auto.stations.append(elements.module('ws28xx'))
+elements.register(u'!random-simulator', 'simulator', 'RandomSimulator',
+    "Simulates a station")
+auto.stations.append(elements.module('simulator'))
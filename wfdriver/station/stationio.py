@@ -0,0 +1,169 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import errno
+import select
+import logging
+
+# Common input/output of the station drivers:
+#
+#   open_serial   opens a serial port by name or URL (e.g. socket://,
+#                 rfc2217://, loop:// for tests)
+#   PortReader    waits for the port to be readable and reads the bytes
+#                 available instead of blocking on fixed-size reads
+#   AdaptivePoll  poll interval short while data arrives, longer when idle
+
+logger = logging.getLogger('station.io')
+
+def open_serial(port, baudrate, **keywords):
+    '''
+    Opens a serial port by number, device name or pyserial URL.
+    '''
+    import serial
+    try:
+        return serial.serial_for_url(port, baudrate, **keywords)
+    except AttributeError:
+        # happens when the installed pyserial is older than 2.5. use the
+        # Serial class directly then.
+        return serial.Serial(port, baudrate, **keywords)
+
+class AdaptivePoll(object):
+    '''
+    Interval between two polls of a station following the data rate. It
+    is divided by factor when a poll returns data and multiplied by it
+    when a poll returns nothing, within [minimum, maximum]. Also usable
+    as a backoff between retries after errors.
+    '''
+
+    def __init__(self, minimum, maximum, initial=None, factor=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.initial = initial if initial is not None else minimum
+        self.interval = self.initial
+
+    def data(self):
+        self.interval = max(self.minimum, self.interval / self.factor)
+        return self.interval
+
+    def idle(self):
+        self.interval = min(self.maximum, self.interval * self.factor)
+        return self.interval
+
+    def reset(self):
+        self.interval = self.initial
+
+    def wait(self):
+        time.sleep(self.interval)
+
+class PortReader(object):
+    '''
+    Reads a port (pyserial or any object with read()) returning the
+    bytes as soon as they arrive. Waits with select() on ports having
+    a file descriptor, otherwise polls the number of bytes waiting with
+    an adaptive interval (e.g. loop:// or rfc2217:// ports). Bytes are
+    read in chunks of at most chunk_size bytes.
+    '''
+
+    def __init__(self, port, chunk_size=4096, poll=None):
+        self.port = port
+        self.chunk_size = chunk_size
+        self.poll = poll if poll is not None else AdaptivePoll(0.005, 0.25)
+        self.buffer = bytearray()
+        try:
+            self.fd = port.fileno()
+        except Exception:
+            self.fd = None
+
+    def waiting(self):
+        '''
+        Number of bytes waiting in the port, or None if unknown.
+        '''
+        try:
+            if hasattr(self.port, 'in_waiting'):
+                return self.port.in_waiting
+            if hasattr(self.port, 'inWaiting'):
+                return self.port.inWaiting()
+        except Exception:
+            pass
+        return None
+
+    def wait(self, timeout):
+        '''
+        Waits at most timeout seconds for bytes to read. Returns True if
+        the port is readable.
+        '''
+        if self.fd is not None:
+            end = time.time() + timeout
+            while True:
+                try:
+                    (readable, w, x) = select.select([ self.fd ], [], [], max(0, end - time.time()))
+                    return len(readable) > 0
+                except select.error, e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+        if self.waiting() is None:
+            # Nothing to wait on, the read will block with the port timeout
+            return True
+        end = time.time() + timeout
+        while True:
+            if self.waiting() > 0:
+                self.poll.data()
+                return True
+            remaining = end - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll.interval, remaining))
+            self.poll.idle()
+
+    def read(self, timeout):
+        '''
+        Returns the bytes received, waiting at most timeout seconds for
+        the first ones. Returns an empty string on timeout.
+        '''
+        if len(self.buffer) > 0:
+            data = str(self.buffer[0:self.chunk_size])
+            del self.buffer[0:self.chunk_size]
+            return data
+        if not self.wait(timeout):
+            return ''
+        waiting = self.waiting()
+        return self.port.read(max(1, min(self.chunk_size, waiting or 1)))
+
+    def read_exactly(self, size, timeout):
+        '''
+        Returns size bytes, or less if they did not arrive within timeout
+        seconds. Bytes received beyond size are kept for the next reads.
+        '''
+        end = time.time() + timeout
+        while len(self.buffer) < size:
+            remaining = end - time.time()
+            if remaining <= 0 or not self.wait(remaining):
+                break
+            waiting = self.waiting()
+            data = self.port.read(max(1, min(self.chunk_size, waiting or (size - len(self.buffer)))))
+            if len(data) == 0:
+                break
+            self.buffer.extend(data)
+        data = str(self.buffer[0:size])
+        del self.buffer[0:size]
+        return data
+
+    def clear(self):
+        self.buffer = bytearray()
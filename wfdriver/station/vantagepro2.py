@@ -21,6 +21,7 @@ import logging
 from wfcommon import units
 import struct
 import array
+from stationio import open_serial, PortReader, AdaptivePoll
 
 class VantageProStation(object):
 
@@ -70,23 +71,20 @@ class VantageProStation(object):
 
 
     def run(self, generate_event, send_event, context={}):
-        import serial
 
         _LoopStruct = LoopStruct(self.rain_bucket)
 
         assert self.rain_bucket in ['eu', 'us']
         assert self.baud in [19200, 9600, 4800, 2400, 1200]
 
+        # Retries sooner after a transient error, up to the former delay
+        backoff = AdaptivePoll(2, self.loops * 2)
+
         while True:
             self.logger.info("Opening serial port")
             ## Open Serial port
-            #self._port = serial.Serial(self.port, self.baud, timeout=10)
-            try:
-                self._port = serial.serial_for_url(self.port, self.baud, timeout=10)
-            except AttributeError:
-                # happens when the installed pyserial is older than 2.5. use the
-                # Serial class directly then.
-                self._port = serial.Serial(self.port, self.baud, timeout=10)
+            self._port = open_serial(self.port, self.baud, timeout=10)
+            self._reader = PortReader(self._port)
 
             try:
                 bad_CRC = 0 
@@ -94,7 +92,7 @@ class VantageProStation(object):
                 self._cmd( 'LOOP', self.loops)       
 
                 for x in xrange(self.loops):
-                    raw = self._port.read( _LoopStruct.size ) # read data
+                    raw = self._reader.read_exactly( _LoopStruct.size, 10 ) # read data
                     self.logger.debug('read: ' + raw.encode('hex'))
 
                     crc_ok = VProCRC.verify( raw )
@@ -192,14 +190,17 @@ class VantageProStation(object):
                         if bad_CRC > 1:
                             raise Exception("CRC error")
 
+                backoff.reset()
                 time.sleep(2)
 
             except Exception, e:
                 self.logger.error(e)
-                time.sleep(self.loops * 2)
+                backoff.wait()
+                backoff.idle()
             finally:
                 self._port.close()
                 self._port = None
+                self._reader = None
 
 
     def _wakeup(self):
@@ -208,8 +209,9 @@ class VantageProStation(object):
         '''
         self.logger.debug("send: WAKEUP")
         for i in xrange(3):
+            self._reader.clear()
             self._port.write('\n')                    # wakeup device
-            ack = self._port.read(len(self.WAKE_ACK)) # read wakeup string
+            ack = self._reader.read_exactly(len(self.WAKE_ACK), 10) # read wakeup string
             self.logger.debug('read: ' + ack.encode('hex'))
             if ack == self.WAKE_ACK:
                 return
@@ -227,14 +229,15 @@ class VantageProStation(object):
             cmd = "%s %s" % (cmd, ' '.join(str(a) for a in args))
         self.logger.debug('send: ' + cmd)
         for i in xrange(3):
+            self._reader.clear()
             self._port.write( cmd + '\n')
             if ok:
-                ack = self._port.read(len(self.OK))  # read OK
+                ack = self._reader.read_exactly(len(self.OK), 10)  # read OK
                 self.logger.debug('read: ' + ack.encode('hex'))
                 if ack == self.OK:
                     return
             else:
-                ack = self._port.read(len(self.ACK))  # read ACK
+                ack = self._reader.read_exactly(len(self.ACK), 10)  # read ACK
                 self.logger.debug('read: ' + ack.encode('hex'))
                 if ack == self.ACK:
                     return
@@ -53,6 +53,7 @@ import logging
 import threading
 import platform
 import sys
+from stationio import AdaptivePoll
 
 windDirMap = { 0:"N", 1:"NNE", 2:"NE", 3:"ENE",
                4:"E", 5:"ESE", 6:"SE", 7:"SSE",
@@ -82,6 +83,44 @@ def detect():
 class WMR200Error(IOError):
   "Used to signal an error condition"
 
+class FrameBuffer(object):
+    '''
+    Octets received from the station. Frames are taken at a moving start
+    index instead of copying the octets left after each frame, so that
+    splitting a long transfer (e.g. the history log sent after an outage)
+    takes a time linear in its size.
+    '''
+
+    def __init__(self):
+      self.data = bytearray()
+      self.start = 0
+
+    def clear(self):
+      del self.data[:]
+      self.start = 0
+
+    def extend(self, octets):
+      self.data.extend(octets)
+
+    def __len__(self):
+      return len(self.data) - self.start
+
+    def __getitem__(self, index):
+      return self.data[self.start + index]
+
+    def sum(self, size):
+      "Sum of the next size octets"
+      return sum(self.data[self.start:self.start + size])
+
+    def take(self, size):
+      "Removes the next size octets and returns them as a list"
+      frame = list(self.data[self.start:self.start + size])
+      self.start += size
+      return frame
+
+    def octets(self):
+      return list(self.data[self.start:])
+
 class WMR200Station(BaseStation):
     '''
     Station driver for the Oregon Scientific WMR200.
@@ -128,6 +167,8 @@ class WMR200Station(BaseStation):
       # Counters for each of the differnt data record types (0xD1 -
       # 0xD9)
       self.recordCounters = [ 0, 0, 0, 0, 0, 0, 0, 0, 0 ]
+      # The octets received by receiveFrames
+      self.buffer = FrameBuffer()
       self.devh = None
 
     def _list2bytes(self, d):
@@ -364,7 +405,8 @@ class WMR200Station(BaseStation):
     # are responses to a 0xD0 command. 0xD8 frames are probably not
     # used. The meaning of 0xD9 frames is currently unknown.
     def receiveFrames(self):
-      packets = []
+      packets = self.buffer
+      packets.clear()
       # Collect packets until we get no more data. By then we should have
       # received one or more frames.
       while True:
@@ -372,8 +414,13 @@ class WMR200Station(BaseStation):
         if packet == None:
           break
         # The first octet is the length. Only length octets are valid data.
-        packets += packet[1:packet[0] + 1]
+        packets.extend(packet[1:packet[0] + 1])
+
+      return self.scanFrames(packets)
 
+    # Takes the frames from the octets received. Returns None if there
+    # are no valid frames.
+    def scanFrames(self, packets):
       frames = []
       while True:
         if len(packets) == 0:
@@ -392,40 +439,39 @@ class WMR200Station(BaseStation):
           # All frames must start with 0xD1 - 0xD9. If the first byte is
           # not within this range, we don't have a proper frame start.
           # Discard all octets and restart with the next packet.
-          self.logger.error("Bad frame: %s" % self._list2bytes(packets))
+          self.logger.error("Bad frame: %s" % self._list2bytes(packets.octets()))
           self.badFrames += 1
           break
 
         if packets[0] == 0xD1 and len(packets) == 1:
           # 0xD1 frames have only 1 octet.
-          frame = packets[0:1]
-          packets = packets[1:len(packets)]
-          frames.append(frame)
+          frames.append(packets.take(1))
         elif len(packets) < 2 or len(packets) < packets[1]:
           # 0xD2 - 0xD9 frames use the 2nd octet to specifiy the length of the
           # frame. The length includes the type and length octet.
-          self.logger.error("Short frame: %s" % self._list2bytes(packets))
+          self.logger.error("Short frame: %s" % self._list2bytes(packets.octets()))
           self.badFrames += 1
           break
         elif packets[1] < 8:
 	  # All valid D2 - D9 frames must have at least a length of 8
           self.logger.error("Bad frame length: %d" % packets[1])
           self.badFrames += 1
+          # The frame end is unknown, discard all octets.
+          break
         else:
           # This is for all frames with length byte and checksum.
-          frame = packets[0:packets[1]]
-          packets = packets[packets[1]:len(packets)]
+          length = packets[1]
 
           # The last 2 octets of D2 - D9 frames are always the low and high byte
           # of the checksum. We ignore all frames that don't have a matching
           # checksum.
-          if self.checkSum(frame[0:len(frame)-2],
-                           frame[len(frame) - 2] |
-                           (frame[len(frame) - 1] << 8)) == False:
+          if self.checkSum(packets.sum(length - 2),
+                           packets[length - 2] |
+                           (packets[length - 1] << 8)) == False:
             self.checkSumErrors += 1
             break
 
-          frames.append(frame)
+          frames.append(packets.take(length))
 
       if len(frames) > 0:
         if len(frames) > 2:
@@ -437,6 +483,8 @@ class WMR200Station(BaseStation):
         return None
 
     def logData(self):
+      # Asks again sooner while the station has data to send
+      idle = AdaptivePoll(0.5, usbTimeout)
       while True:
         # Requesting the next set of data frames by sending a D0
         # command.
@@ -447,8 +495,10 @@ class WMR200Station(BaseStation):
         if frames == None:
           # The station does not have any data right now. Just wait a
           # bit and ask again.
-          time.sleep(usbTimeout)
+          idle.wait()
+          idle.idle()
         else:
+          idle.data()
           # Send the received frames to the decoder.
           for frame in frames:
             self.decodeFrame(frame)
@@ -707,10 +757,9 @@ class WMR200Station(BaseStation):
       if record[3] & 0x10:
         self.logger.warning("Rain sensor: Battery low")
 
-    def checkSum(self, packet, checkSum):
-      sum = 0
-      for byte in packet:
-        sum += byte
+    # The checksum is the 16 bits sum of the frame octets before it. sum
+    # is the value computed from the frame, e.g. by FrameBuffer.sum().
+    def checkSum(self, sum, checkSum):
       if sum != checkSum:
         self.logger.error("Checksum error: %d instead of %d" % (sum, checkSum))
         return False
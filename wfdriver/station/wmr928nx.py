@@ -27,6 +27,7 @@ import logging
 import time
 import threading
 from base import BaseStation
+from stationio import open_serial, PortReader
 
 class WMR928NXStation(BaseStation):
     '''
@@ -78,20 +79,11 @@ class WMR928NXStation(BaseStation):
             try:
                 self.logger.info("Opening serial port")
                 ## Open Serial port
-                try:
-                    ser = serial.serial_for_url(self.port, 9600, 
-                                                parity=serial.PARITY_NONE, 
-                                                bytesize=serial.EIGHTBITS,
-                                                stopbits=serial.STOPBITS_ONE,
-                                                timeout=60)
-                except AttributeError:
-                    # happens when the installed pyserial is older than 2.5. use the
-                    # Serial class directly then.
-                    ser = serial.Serial(self.port, 9600, 
-                                        parity=serial.PARITY_NONE, 
-                                        bytesize=serial.EIGHTBITS,
-                                        stopbits=serial.STOPBITS_ONE,
-                                        timeout=60)
+                ser = open_serial(self.port, 9600, 
+                                  parity=serial.PARITY_NONE, 
+                                  bytesize=serial.EIGHTBITS,
+                                  stopbits=serial.STOPBITS_ONE,
+                                  timeout=60)
                 #ser = serial.Serial()
                 #ser.setBaudrate(9600)
                 #ser.setParity(serial.PARITY_NONE)
@@ -131,8 +123,9 @@ class WMR928NXStation(BaseStation):
             0x0f: (7, 'Clock', self._parse_clock_record)}    
             
         input_buffer = []
+        reader = PortReader(ser)
         while True:
-            buffer = ser.read(10) # Read next 10 bytes and return
+            buffer = reader.read(60) # Bytes received, as soon as they arrive
             
             if len(buffer)== 0:
                 # 60s timeout expired without data received
@@ -143,6 +136,7 @@ class WMR928NXStation(BaseStation):
                     time.sleep(10)
                     ser.open()
                     ser.setRTS(True)
+                    reader = PortReader(ser)
                     self.logger.warning("Serial port reinitialized")
                 except:
                     pass
@@ -34,6 +34,7 @@ import logging
 import threading
 import platform
 import sys
+from stationio import AdaptivePoll
 
 forecastMap = { 0:'PartlyCloudy', 1:'Rainy', 2:'Cloudy', 3:'Sunny', 4:'Snowy' }
 comfortLevelMap = { 0:'-', 1:'Good',  2:'Poor', 3:'Fair' }
@@ -147,6 +148,9 @@ class WMRS200Station(BaseStation):
 
         input_buffer = []
         errors = 0
+        # interruptRead already waits for the events, only pause when
+        # it returns at once without data
+        pause = AdaptivePoll(0.1, 1)
         while True:
             try:
                 # Ignore USBError("No error") exceptions http://bugs.debian.org/476796
@@ -155,15 +159,18 @@ class WMRS200Station(BaseStation):
                                                 0x0000008,            # bytes to read
                                                 15000)                # timeout (15 seconds)
                     errors = 0
+                    pause.reset()
                 except usb.USBError, e:
                     if e.args == ('No error',):
                         self.logger.debug('USBError("No error") exception received. Ignoring...(http://bugs.debian.org/476796)')
                         packet = None
-                        time.sleep(1)
+                        pause.wait()
+                        pause.idle()
                     elif e.args == ('Connection timed out',):
                         self.logger.debug('No event received within timeout.')
                         packet = None
-                        time.sleep(1)                        
+                        pause.wait()
+                        pause.idle()
                     else:
                         raise e
             except Exception, e:
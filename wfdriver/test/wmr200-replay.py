@@ -0,0 +1,74 @@
+import os,sys
+import time
+import random
+import logging
+
+if __name__ == "__main__": sys.path.append(os.path.abspath(sys.path[0] + '/../..'))
+
+from wfdriver.station.wmr200 import WMR200Station, FrameBuffer
+
+# Replays the USB packets of a WMR200 through the frame reassembly of the
+# driver, e.g. the history log sent after an outage, and reports the
+# frames per second.
+#
+# usage: wmr200-replay.py [dump file | frames]
+#
+# The dump is a driver log at debug level ('Packet: 07 D2 2A ...' lines)
+# or a file with the hexadecimal octets of one packet per line. Without
+# dump, history frames are generated.
+
+def history(count):
+    packets = []
+    octets = []
+    for i in range(count):
+        # Type, length, time stamp, rain, wind, UV, pressure, no external
+        # sensor and the inside/outside temperature and humidity
+        frame = [ 0xD2, 42 ] + [ random.randint(0, 255) for j in range(30) ] + [ 0 ] + [ random.randint(0, 255) for j in range(7) ]
+        checksum = sum(frame)
+        octets += frame + [ checksum & 0xFF, checksum >> 8 ]
+    start = 0
+    while start < len(octets):
+        size = min(len(octets) - start, random.randint(1, 7))
+        packets.append([ size ] + octets[start:start + size] + [ 0 ] * (7 - size))
+        start += size
+    return packets
+
+def load(path):
+    packets = []
+    for line in open(path):
+        if 'Packet:' in line:
+            line = line.split('Packet:', 1)[1]
+        elif ':' in line:
+            continue
+        octets = [ int(octet, 16) for octet in line.split() ]
+        if len(octets) == 8 and octets[0] <= 7:
+            packets.append(octets)
+    return packets
+
+def replay(station, packets):
+    buffer = FrameBuffer()
+    for packet in packets:
+        buffer.extend(packet[1:packet[0] + 1])
+    return station.scanFrames(buffer) or []
+
+if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+    packets = load(sys.argv[1])
+else:
+    packets = history(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+
+logging.basicConfig(level=logging.WARNING)
+station = WMR200Station()
+station.init()
+
+best = None
+for i in range(3):
+    start = time.time()
+    frames = replay(station, packets)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+        best = elapsed
+
+octets = sum([ packet[0] for packet in packets ])
+print "packets: %d  octets: %d  frames: %d  bad frames: %d  checksum errors: %d" % (
+    len(packets), octets, len(frames), station.badFrames / 3, station.checkSumErrors / 3)
+print "%.3f s  frames/s: %.1f  octets/s: %.1f" % (best, len(frames) / max(best, 1e-9), octets / max(best, 1e-9))
@@ -30,10 +30,16 @@ from output import stdio
 import optparse
 import logging
 import wfcommon.config
+from wfcommon import metrics
+from wfcommon import tracing
 from threading import Thread
 from Queue import Queue, Full
 import event
 
+events_received = metrics.counter('wfrog_events_total', 'Events put in the queue of the driver or the logger.', [ 'queue', 'type' ])
+events_dropped = metrics.counter('wfrog_events_dropped_total', 'Events dropped because the queue was full.', [ 'queue', 'type' ])
+queue_depth = metrics.gauge('wfrog_queue_depth', 'Events waiting in the queue.', [ 'queue' ])
+
 def gen(type):
     e = event.Event(type)
     return e
@@ -50,6 +56,10 @@ output [output]:
     Destination of events sent by this driver. Typically a WESTEP
     connector if running standalone.
 
+trace [true|false] (optional):
+    Carries on the events the time of each hop from the station to the
+    storage, measured in the metrics of the logger. Defaults to false.
+
 logging [logging configuration] (optional):
     See below the Logging Configuration section.
 '''
@@ -88,19 +98,26 @@ logging [logging configuration] (optional):
             self.output = config['output']
         if config.has_key('queue_size'):
             self.queue_size = config['queue_size']
+        if config.has_key('trace'):
+            tracing.enabled = config['trace']
 
         self.event_queue = Queue(self.queue_size)
+        queue_depth.set_function(lambda: self.event_queue.qsize(), queue='driver')
 
     def enqueue_event(self,event):
         self.logger.debug('Enqueuing: %s, Queue size: %d', event, self.event_queue.qsize())
+        tracing.stamp(event, 'station')
         try:
             self.event_queue.put(event, block=False)
+            events_received.inc(queue='driver', type=event._type)
         except Full:
+            events_dropped.inc(queue='driver', type=event._type)
             self.logger.critical('Consumer of events is dead or not consuming quickly enough')
 
     def output_loop(self):
         while True:
             event = self.event_queue.get(block=True)
+            tracing.stamp(event, 'driver.queue')
             try:
                 self.output.send_event(event)
             except Exception:
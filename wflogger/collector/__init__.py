@@ -16,23 +16,17 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
+from wfcommon.registry import Registry
 
-import aggregator
-import flush
-import xmlfile
-import buffer
+# YAML mappings, the modules are imported when their tag is used
 
-# YAML mappings
+elements = Registry(__name__)
 
-class YamlAggregatorCollector(aggregator.AggregatorCollector, yaml.YAMLObject):
-    yaml_tag = u'!aggregator'
-
-class YamlFlushCollector(flush.FlushCollector, yaml.YAMLObject):
-    yaml_tag = u'!flush'
-
-class YamlBufferCollector(buffer.BufferCollector, yaml.YAMLObject):
-    yaml_tag = u'!buffer'
-
-class YamlXmlFileCollector(xmlfile.XmlFileCollector, yaml.YAMLObject):
-    yaml_tag = u'!xmlfile'
+elements.register(u'!aggregator', 'aggregator', 'AggregatorCollector',
+    "Collects events, compute aggregated values incrementally and issues samples to an underlying storage on 'flush events'")
+elements.register(u'!flush', 'flush', 'FlushCollector',
+    "Forwards incoming events to a wrapped collector and periodically issues a 'flush event'")
+elements.register(u'!buffer', 'buffer', 'BufferCollector',
+    "Collects events and wait for some rentention time before sending them to an underlying collector")
+elements.register(u'!xmlfile', 'xmlfile', 'XmlFileCollector',
+    "Keep the latest event values and flush them in an XML file on 'flush events'")
@@ -20,11 +20,14 @@ import logging
 import base
 import datetime
 import wfcommon.meteo
+from wfcommon import metrics
 
 MAX_TH_SENSORS = 10  # 0 ..9 
 MAIN_TH_SENSOR = 1   # sensor number 1 is the main TH sensor
 INT_TH_SENSOR = 0    # sensor number 0 is the interior TH sensor
 
+storage_writes = metrics.histogram('wfrog_storage_write_seconds', 'Time to write a sample to the storage.', [ 'storage' ])
+
 class AggregatorCollector(base.BaseCollector):
     '''
     Collects events, compute aggregated values incrementally and issues
@@ -210,4 +213,5 @@ class AggregatorCollector(base.BaseCollector):
 
             self.logger.debug("Flushing sample: "+repr(sample))
 
-            self.storage.write_sample(sample, context=context)
+            with storage_writes.time(storage=metrics.element_name(self.storage)):
+                self.storage.write_sample(sample, context=context)
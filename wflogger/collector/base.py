@@ -20,6 +20,7 @@ import logging
 import wfcommon.meteo
 from wfcommon.formula.base import AverageFormula
 import datetime
+from wfcommon import tracing
 
 class BaseCollector(object):
     '''
@@ -34,10 +35,21 @@ class BaseCollector(object):
 
     storage = None
 
+    # Name of the last stamp of the traced events, see wfcommon.tracing
+    trace_stamp = 'storage'
+    _traces = None
+
     def send_event(self, event, context={}):
 
         self.init()
 
+        trace = tracing.trace(event)
+        if trace is not None:
+            # Completed when the period is flushed
+            if self._traces is None:
+                self._traces = []
+            self._traces.append(trace)
+
         if hasattr(event, "timestamp") and event.timestamp is not None:
             self._timestamp_last = event.timestamp
         else:
@@ -45,6 +57,9 @@ class BaseCollector(object):
 
         if event._type == "_flush":
             self.flush(context)
+            if self._traces:
+                tracing.finish(self._traces, self.trace_stamp)
+                self._traces = []
         else:
             if event._type == 'rain':
                 self._report_rain(event.total, event.rate)
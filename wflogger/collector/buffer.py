@@ -23,6 +23,7 @@ import wfcommon.meteo
 import itertools
 import logging
 import heapq
+from wfcommon import tracing
 
 class BufferCollector(object):
     '''
@@ -121,6 +122,7 @@ class BufferCollector(object):
              return None
 
     def forward_event(self, event, context):
+        tracing.stamp(event, 'buffer')
         if self.last_flush is None:
             # Initialize flush timer with first event.
             self.last_flush = event.timestamp
@@ -22,6 +22,7 @@ import time
 import os.path
 from lxml import etree
 from lxml.builder import E
+from wfcommon.atomicfile import AtomicFileWriter
 
 def element(parent, name):
     result = parent.find(name)
@@ -34,16 +35,31 @@ class XmlFileCollector(base.BaseCollector):
     Keep the latest event values and flush them in an XML file on
     'flush events'. Should be wrapped in a !flush elements to receive
     the 'flush events'.
+    The file is replaced atomically and is only rewritten when at least
+    one value changed or when 'refresh' seconds elapsed since the last
+    write, so that the 'time' element stays current with steady values.
 
     [ Properties ]
 
     path [string]:
         Location of the XML file to write.
+
+    fsync [true|false] (optional):
+        Force the content to disk before replacing the file.
+        Defaults to false.
+
+    refresh [numeric] (optional):
+        Maximum number of seconds between two writes of unchanged values.
+        Defaults to 60.
     '''
 
     path = None
+    fsync = False
+    refresh = 60
     doc = None
+    writer = None
     initialized = False
+    trace_stamp = 'xmlfile'
 
 
     logger = logging.getLogger('collector.xmlfile')
@@ -95,20 +111,24 @@ class XmlFileCollector(base.BaseCollector):
 
     def flush(self, context={}):
 
+        if self.writer is None:
+            self.writer = AtomicFileWriter(self.fsync)
+
         time_elt = element(self.doc, 'time')
+        time_elt.text = None
+        values_string = etree.tostring(self.doc)
         time_elt.text = time.strftime("%Y-%m-%d %H:%M:%S")
 
         doc_string = etree.tostring(self.doc)
 
         self.logger.debug("Flushing: %s to %s", doc_string, self.path)
 
-        dir = os.path.realpath(os.path.dirname(self.path))
-        if not os.path.exists(dir):
-            os.makedirs(dir)
+        # The time is updated at each refresh period even if the values
+        # did not change
+        signature = values_string + str(int(time.time() / self.refresh))
 
-        file = open(self.path, 'w')
-        file.write(doc_string)
-        file.close()
+        if not self.writer.write(self.path, doc_string, signature=signature):
+            self.logger.debug("Values unchanged (%d writes skipped)", self.writer.skipped)
 
     def reset(self, context={}):
         self.doc = E.current()
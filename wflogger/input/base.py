@@ -18,6 +18,7 @@
 
 import logging
 import urllib
+from wfcommon import tracing
 
 class XmlInput(object):
     '''
@@ -75,7 +76,10 @@ class XmlInput(object):
         # transform the objectified XML to a pure python object to be able to add typed fields
         pure_event = Event()
         for el in event.iterchildren():
-            pure_event.__setattr__(el.tag, el)
+            if el.tag == '_trace':
+                pure_event._trace = tracing.decode(el.text)
+            else:
+                pure_event.__setattr__(el.tag, el)
         if(timestamp):
             pure_event.timestamp = timestamp
         self.send_event(pure_event)
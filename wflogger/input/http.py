@@ -17,8 +17,11 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import cgi
 import logging
 import base
+from wfcommon import metrics
+from wfcommon import profiling
 
 server_map = {}
 
@@ -47,6 +50,28 @@ class HTTPEventHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
     def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') == '/metrics' and self.input.metrics:
+            text = metrics.text()
+            self.send_response(200)
+            self.send_header('Content-type', metrics.CONTENT_TYPE)
+            self.send_header('Content-length', len(text))
+            self.end_headers()
+            self.wfile.write(text)
+            return
+        if self.path.split('?')[0].rstrip('/') == '/stacks' and self.input.stacks:
+            params = dict(cgi.parse_qsl(self.path.split('?', 1)[1] if '?' in self.path else ''))
+            try:
+                seconds = profiling.parse_seconds(params.get('seconds'))
+            except ValueError:
+                self.send_error(400, "Invalid seconds parameter")
+                return
+            text = profiling.text(seconds)
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain')
+            self.send_header('Content-length', len(text))
+            self.end_headers()
+            self.wfile.write(text)
+            return
         self.send_response(200)
         text="Ready to receive events."
         self.send_header('Content-type', "text/html")
@@ -62,9 +87,22 @@ class HttpInput(base.XmlInput):
     
     port [numeric] (optional):
         The TCP port listening to events. Default to 8888.
+
+    metrics [true|false] (optional):
+        Serves the metrics of the process (queues, events, storage
+        writes) on /metrics, in the Prometheus text format. Default to
+        true.
+
+    stacks [true|false] (optional):
+        Serves the stacks of the threads of the process on /stacks, in
+        the collapsed format of flame graphs. With '?seconds=N', the
+        stacks are sampled during N seconds (at most 60), the events
+        are not received meanwhile. Default to false.
     """
 
     port = 8888
+    metrics = True
+    stacks = False
 
     logger = logging.getLogger("input.http")
 
@@ -31,10 +31,16 @@ import optparse
 import logging
 import time
 import wfcommon.config
+from wfcommon import metrics
+from wfcommon import tracing
 from threading import Thread
 from Queue import Queue, Full
 import copy
 
+events_received = metrics.counter('wfrog_events_total', 'Events put in the queue of the driver or the logger.', [ 'queue', 'type' ])
+events_dropped = metrics.counter('wfrog_events_dropped_total', 'Events dropped because the queue was full.', [ 'queue', 'type' ])
+queue_depth = metrics.gauge('wfrog_queue_depth', 'Events waiting in the queue.', [ 'queue' ])
+
 def gen(type):
     return event.Event(type)
 
@@ -60,6 +66,11 @@ embed [dict] (optional):
     are dictionaries with the following key-values:
     - config: specifies the configuration file of the embedded module.
 
+trace [true|false] (optional):
+    Measures the time of each hop of the events, from the station to the
+    storage, in the metrics (wfrog_event_hop_seconds). Events already
+    traced by the driver are followed in any case. Defaults to false.
+
 logging [logging configuration] (optional):
     See below the Logging Configuration section.
 '''
@@ -106,14 +117,20 @@ logging [logging configuration] (optional):
             self.period = config['period']
         if config.has_key('embed'):
             self.embedded = config['embed']
+        if config.has_key('trace'):
+            tracing.enabled = config['trace']
 
         self.event_queue = Queue(self.queue_size)
+        queue_depth.set_function(lambda: self.event_queue.qsize(), queue='logger')
 
     def enqueue_event(self, event):
         self.logger.debug("Got '%s' event. Queue size: %d", event._type, self.event_queue.qsize())
+        tracing.stamp(event, 'logger.input')
         try:
             self.event_queue.put(event, block=False)
+            events_received.inc(queue='logger', type=event._type)
         except Full:
+            events_dropped.inc(queue='logger', type=event._type)
             self.logger.critical('Consumer of events is dead or not consuming quickly enough')
 
     def input_loop(self):
@@ -123,6 +140,7 @@ logging [logging configuration] (optional):
         context = copy.deepcopy(self.context)
         while True:
             event = self.event_queue.get(block=True)
+            tracing.stamp(event, 'logger.queue')
             try:
                 self.collector.send_event(event, context=context)
             except Exception:
@@ -32,6 +32,10 @@ import inspect
 import logging
 import traceback
 import wfcommon.dict
+from wfcommon import configcache
+from wfcommon import metrics
+
+reloads = metrics.counter('wfrog_config_reloads_total', 'Configuration reloads after a change of the configuration files.', [ 'result' ])
 
 class RendererConfigurer(wfcommon.config.Configurer):
     """Returns a configuration read from a yaml file (default to wfrender.yaml in cwd)"""
@@ -42,6 +46,7 @@ class RendererConfigurer(wfcommon.config.Configurer):
     logger=logging.getLogger("config")
 
     embedded = False
+    renderer_definition = None
 
     def __init__(self, opt_parser):
         # Prepare the configurer
@@ -54,22 +59,29 @@ class RendererConfigurer(wfcommon.config.Configurer):
 
         wfcommon.config.Configurer.__init__(self, module_map)
         self.add_options(opt_parser)
+        opt_parser.add_option("-r", "--reload-config", action="store_true", dest="reload_config", help="Reloads the yaml configuration if it changes during execution")
         # deactivated because untested with new structure
         # TODO: test and fix if needed
-#        opt_parser.add_option("-r", "--reload-config", action="store_true", dest="reload_config", help="Reloads the yaml configuration if it changes during execution")
 #        opt_parser.add_option("-M", "--reload-modules", action="store_true", dest="reload_mod", help="Reloads the data source, renderer and extension modules if they change during execution")
-#        opt_parser.add_option("-c", "--command", dest="command", help="A command to execute after automatic reload. Useful to trigger events during development such as browser reload.")
+        opt_parser.add_option("-c", "--command", dest="command", help="A command to execute after automatic reload. Useful to trigger events during development such as browser reload.")
 
     def configure_engine(self, engine, options, args, embedded, config_file, settings_file=None):
 
         # TODO: remove if above fixed
         options.reload_mod=False
-        options.reload_config=False
-        options.command=False
 
         (config, config_context) = self.configure(options, engine, config_file, settings_file, embedded=embedded)
 
-        engine.root_renderer = config["renderer"]
+        renderer = config["renderer"]
+        if options.reload_config:
+            # Keeps the running renderers if their configuration did not change
+            definition = configcache.definition(renderer, config_context)
+            if engine.root_renderer is not None and definition == self.renderer_definition:
+                self.logger.info("Renderer configuration unchanged, keeping the running renderers")
+                renderer = engine.root_renderer
+            self.renderer_definition = definition
+
+        engine.root_renderer = renderer
 
         engine.initial_context = wfcommon.dict.merge(engine.initial_context, config_context)
 
@@ -79,44 +91,66 @@ class RendererConfigurer(wfcommon.config.Configurer):
             modules = []
             modules.extend(self.builtins)
             modules.extend(self.extensions.keys())
-            FileWatcher(options, modules, self, engine, options, args).start()
+            FileWatcher(modules, self, engine, options, args).start()
 
 class FileWatcher(Thread):
+    '''
+    Checks every few seconds the configuration files loaded (main file,
+    settings and included files) and reloads the configuration when one
+    changes. Templates are not watched, the template renderers compile
+    them again when they change.
+
+    Unchanged services are kept with their caches, and the running
+    renderers are replaced only if their configuration changed.
+    '''
 
     logger = logging.getLogger("config.watcher")
 
-    def __init__(self, options, modules, configurer, engine, *args, **kwargs):
+    interval = 2
+
+    def __init__(self, modules, configurer, engine, options, args):
         Thread.__init__(self)
-        self.config_file = options.config
+        self.setDaemon(True)
         self.options = options
         self.modules = modules
         self.configurer = configurer
         self.engine = engine
         self.args = args
-        self.kwargs = kwargs
+
+    def files(self):
+        files = configcache.cache.files()
+        if self.configurer.settings_file:
+            files.append(os.path.abspath(self.configurer.settings_file))
+        return files
+
+    def modified(self):
+        modified = {}
+        for f in self.files():
+            try:
+                modified[f] = os.stat(f).st_mtime
+            except OSError:
+                modified[f] = None
+        return modified
 
     def run(self):
-        config_this_modified = time.time()
-        templates_this_modified = time.time()
+        config_modified = self.modified()
 
         modules_modified = {}
         for m in self.modules:
             modules_modified[m] = time.time()
         while self.engine.daemon:
-
-            config_last_modified = os.stat(self.config_file).st_mtime
-            if config_last_modified > config_this_modified and self.options.reload_config:
-                self.logger.debug("Changed detected on "+self.config_file)
-                self.reconfigure()
-                config_this_modified = config_last_modified
-                continue
-
-            templates_last_modified = last_mod('templates')
-            if templates_last_modified > templates_this_modified and self.options.reload_config:
-                self.logger.debug("Changed detected on templates")
-                self.reconfigure()
-                templates_this_modified = templates_last_modified
-                continue
+            time.sleep(self.interval)
+
+            if self.options.reload_config:
+                last_modified = self.modified()
+                if last_modified != config_modified:
+                    changed = [ f for f in last_modified.keys() if last_modified[f] != config_modified.get(f) ]
+                    self.logger.debug("Change detected on "+", ".join(changed))
+                    # Lets the editor finish writing
+                    time.sleep(self.interval)
+                    self.reconfigure()
+                    config_modified = self.modified()
+                    continue
 
             if self.options.reload_mod:
                 for m in modules_modified.keys():
@@ -132,12 +166,21 @@ class FileWatcher(Thread):
     def reconfigure(self):
         self.logger.info("Reconfiguring engine...")
         old_root_renderer = self.engine.root_renderer
-        self.configurer.configure(self.engine,*self.args, **self.kwargs)
         try:
-            old_root_renderer.close()
-            time.sleep(0.1)
-        except:
-            pass
+            self.configurer.configure_engine(self.engine, self.options, self.args, True,
+                                             self.configurer.config_file, self.configurer.settings_file)
+        except Exception, e:
+            self.logger.exception("Cannot reload the configuration, keeping the current one: %s", str(e))
+            reloads.inc(result='error')
+            return
+        reloads.inc(result='success')
+        if self.engine.root_renderer is not old_root_renderer:
+            self.logger.info("Restarting renderers")
+            try:
+                old_root_renderer.close()
+                time.sleep(0.1)
+            except:
+                pass
         if self.options.command:
             self.logger.info("Running command: "+self.options.command)
             command_thread = CommandThread()
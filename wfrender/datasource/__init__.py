@@ -22,12 +22,17 @@ import accumulator
 import database
 import xmlquery
 import simulator
+import periods
+import shared
 
 # YAML mappings
 
 class YamlAccumulatorDataSource(accumulator.AccumulatorDatasource, yaml.YAMLObject):
     yaml_tag = u'!accumulator'
 
+class YamlPeriodStatsDataSource(periods.PeriodStatsDatasource, yaml.YAMLObject):
+    yaml_tag = u'!period-stats'
+
 class YamlSimulatorDataSource(simulator.SimulatorDataSource, yaml.YAMLObject):
     yaml_tag = u'!simulator'
 
@@ -36,3 +41,6 @@ class YamlDatabaseDataSource(database.DatabaseDataSource, yaml.YAMLObject):
 
 class YamlCurrentConditionsXmlDataSource(xmlquery.CurrentConditionsXmlDataSource, yaml.YAMLObject):
     yaml_tag = u'!currentxml'
+
+class YamlSharedDataSource(shared.SharedDataSource, yaml.YAMLObject):
+    yaml_tag = u'!shared'
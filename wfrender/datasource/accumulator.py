@@ -28,10 +28,16 @@ from wfcommon.formula.wind import WindSectorMaxFormula
 from wfcommon.formula.wind import WindSectorFrequencyFormula
 from wfcommon.formula.temp import WindChillMinFormula
 from wfcommon.formula.temp import HeatIndexMaxFormula
+from pushdown import AggregatePlanner
+from wfcommon import metrics
 
 import copy
 import datetime
 import threading
+import time
+
+storage_reads = metrics.histogram('wfrog_storage_read_seconds', 'Time to read samples or aggregates from the storage.', [ 'storage', 'operation' ])
+refreshes = metrics.histogram('wfrog_accumulator_refresh_seconds', 'Time to update the series of an accumulator.', [ 'slice', 'span' ])
 
 class AccumulatorDatasource(object):
     '''
@@ -69,6 +75,13 @@ class AccumulatorDatasource(object):
 
     caching [true|false] (optional):
         Enable/disable caching for normal requests. Defaults to true.
+
+    pushdown [true|false] (optional):
+        When the storage is a database, let the database aggregate the
+        samples per slice instead of reading all of them. Formulas that
+        cannot be translated are still computed from the samples.
+        Periods compacted by a !retention storage are always aggregated
+        by the database. Defaults to true.
     '''
 
     storage = None
@@ -112,6 +125,8 @@ class AccumulatorDatasource(object):
 
     caching = True
 
+    pushdown = True
+
     logger = logging.getLogger("datasource.accumulator")
 
     last_timestamp = datetime.datetime.fromtimestamp(0)
@@ -121,11 +136,18 @@ class AccumulatorDatasource(object):
     lock = threading.Lock()
 
     class Slice(object):
-        def __init__(self, formulas, from_time, to_time, keys):
+        def __init__(self, formulas, from_time, to_time, keys, pushed=()):
             self.formulas = copy.deepcopy(formulas)
             self.from_time = from_time
             self.to_time = to_time
 
+            # formulas computed from the samples, the others are filled by the planner
+            self.sample_formulas = []
+            for measure, serie in self.formulas.iteritems():
+                for name, formula in serie.iteritems():
+                    if (measure, name) not in pushed:
+                        self.sample_formulas.append(formula)
+
             # replace string keys with index for performance
             for serie in self.formulas.values():
                 for formula in serie.values():
@@ -136,9 +158,12 @@ class AccumulatorDatasource(object):
                         formula.index = map(lambda x: keys.index(x), formula.index)
 
         def add_sample(self, sample):
-            for serie in self.formulas.values():
-                for formula in serie.values():
-                    formula.append(sample)
+            for formula in self.sample_formulas:
+                formula.append(sample)
+
+        def add_sample_to(self, sample, names):
+            for (measure, name) in names:
+                self.formulas[measure][name].append(sample)
 
     def get_slice_duration(self):
         if self.slice == 'minute':
@@ -197,6 +222,24 @@ class AccumulatorDatasource(object):
             format_list = self.formats[self.slice]
         return [[slice.from_time.strftime(format) for slice in slices] for format in format_list]
 
+    def get_planner(self, keys, context, force=False):
+        if not self.pushdown and not force:
+            return None
+        try:
+            functions = self.storage.aggregate_functions(context=context)
+        except AttributeError:
+            # Not a database storage
+            return None
+        if not functions:
+            return None
+        return AggregatePlanner(self.formulas, keys, functions, self.slice)
+
+    def get_compacted_until(self, context):
+        try:
+            return self.storage.compacted_until(context=context)
+        except AttributeError:
+            return None
+
     def update_slices(self, slices, from_time, to_time, context, last_timestamp=None):
         if len(slices) > 0:
             slice_from_time = slices[-1].to_time
@@ -206,10 +249,12 @@ class AccumulatorDatasource(object):
         # Create the necessary slices
         t = self.get_slice_start(slice_from_time)
         keys = self.storage.keys(context=context)
+        planner = self.get_planner(keys, context)
+        pushed = planner.pushed if planner else ()
         while t < to_time:
             end = self.get_next_slice_start(t)
             self.logger.debug("Creating slice %s - %s", t, end)
-            slice = self.Slice(self.formulas, t, end, keys)
+            slice = self.Slice(self.formulas, t, end, keys, pushed)
             slices.append(slice)
             t = end
 
@@ -222,8 +267,38 @@ class AccumulatorDatasource(object):
         self.logger.debug("Update from %s ", update_from_time)
         s = 0
         to_delete = 0
+
+        storage_name = metrics.element_name(self.storage)
+
+        # Compacted periods are only summaries: the samples rebuilt from them
+        # are hourly or daily averages. Their min, max, sums and counts are
+        # aggregated by the storage even when the pushdown is disabled.
+        compacted = None
+        if not planner:
+            compacted = self.get_compacted_until(context)
+            compacted_planner = None
+            if compacted is not None and compacted > update_from_time:
+                compacted_planner = self.get_planner(keys, context, force=True)
+            if compacted_planner:
+                with storage_reads.time(storage=storage_name, operation='aggregate'):
+                    compacted_planner.fill(self.storage, slices, update_from_time, min(compacted, to_time), context)
+            else:
+                compacted = None
+
+        if planner:
+            with storage_reads.time(storage=storage_name, operation='aggregate'):
+                pushed_timestamp = planner.fill(self.storage, slices, update_from_time, to_time, context)
+            if pushed_timestamp:
+                last_timestamp = pushed_timestamp
+                for i in range(len(slices)):
+                    if slices[i].to_time < from_time:
+                        to_delete = i
+            if len(planner.fallback) == 0:
+                return last_timestamp, to_delete
+
         localtime_index = keys.index('localtime')
-        for sample in self.storage.samples(update_from_time, to_time, context=context):
+        samples = self.storage.samples(update_from_time, to_time, context=context)
+        for sample in metrics.timed_iter(storage_reads, samples, storage=storage_name, operation='samples'):
             # find the first slice receiving the samples
             sample_localtime = sample[localtime_index]
             while slices[s].to_time < sample_localtime:
@@ -231,7 +306,10 @@ class AccumulatorDatasource(object):
                     # count of obsolete slices to delete
                     to_delete=s
                 s = s + 1
-            slices[s].add_sample(sample)
+            if compacted is not None and sample_localtime < compacted:
+                slices[s].add_sample_to(sample, compacted_planner.fallback)
+            else:
+                slices[s].add_sample(sample)
             last_timestamp = sample_localtime
         return last_timestamp, to_delete
 
@@ -283,6 +361,7 @@ class AccumulatorDatasource(object):
             self.lock.acquire()
             try:
                 if self.last_timestamp < to_time - datetime.timedelta(0,self.period) or self.cached_series is None:
+                    start = time.time()
                     if self.cached_slices is None: 
                         self.cached_slices = []
 
@@ -295,15 +374,17 @@ class AccumulatorDatasource(object):
                     self.last_timestamp = last_timestamp
 
                     self.cached_series = self.get_series(self.cached_slices)
+                    refreshes.observe(time.time() - start, slice=self.slice, span=self.span)
             finally:
                 self.lock.release()
 
             return self.cached_series
 
         else: # use_cache == False
-            slices = []
-            self.update_slices(slices, from_time, to_time, context)
-            return self.get_series(slices)
+            with refreshes.time(slice=self.slice, span=self.span):
+                slices = []
+                self.update_slices(slices, from_time, to_time, context)
+                return self.get_series(slices)
 
 def parse(isodate):
     if len(isodate) == 10:
@@ -0,0 +1,272 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import copy
+import datetime
+import threading
+from collections import deque
+
+from wfcommon.formula.base import MinFormula
+from wfcommon.formula.base import MaxFormula
+from wfcommon.formula.base import SumFormula
+from wfcommon.generic.service import ServiceElement
+
+class PeriodStatsDatasource(object):
+    '''
+    Maintains period-to-date aggregates of a storage in an incremental way.
+    Only the samples added since the last refresh are read from the storage,
+    so that the calendar periods (today, this month, this year) and the
+    rolling windows (last hour, last 24 hours) are never re-scanned.
+
+    The result is a dictionary keyed by period ('current', 'hour', '24h',
+    'day', 'month', 'year'). 'current' contains the last value of each
+    measure, or None when the measure was not updated for 'max_age'
+    seconds (e.g. a dead sensor). The other periods contain the 'min_', 'max_' aggregates of
+    temp, hum and pressure, 'max_gust' and 'rain_fall'.
+
+    Publishers share one instance per storage (see get_period_stats).
+
+    [ Properties ]
+
+    storage [storage]:
+        The underlying storage to get samples.
+
+    period [numeric] (optional):
+        Number of seconds between two refreshes of the aggregates.
+        Defaults to 60.
+
+    max_age [numeric] (optional):
+        Number of seconds after which the last value of a measure is
+        removed from 'current'. Defaults to 3600.
+    '''
+
+    storage = None
+    period = 60
+    max_age = 3600
+
+    current_keys = [ 'temp', 'dew_point', 'hum', 'hum2', 'pressure', 'wind',
+                     'wind_dir', 'wind_gust', 'wind_gust_dir', 'rain', 'rain_rate',
+                     'uv_index', 'solar_rad', 'localtime', 'utctime' ]
+
+    aggregate_formulas = {
+        'max_temp' : (MaxFormula, 'temp'),
+        'min_temp' : (MinFormula, 'temp'),
+        'max_hum' : (MaxFormula, 'hum'),
+        'min_hum' : (MinFormula, 'hum'),
+        'max_pressure' : (MaxFormula, 'pressure'),
+        'min_pressure' : (MinFormula, 'pressure'),
+        'max_gust' : (MaxFormula, 'wind_gust'),
+        'rain_fall' : (SumFormula, 'rain') }
+
+    # Rolling windows: name -> (window length, bucket length)
+    windows = { 'hour' : (datetime.timedelta(0, 3600), datetime.timedelta(0, 60)),
+                '24h' : (datetime.timedelta(1), datetime.timedelta(0, 600)) }
+
+    logger = logging.getLogger("datasource.periods")
+
+    keys = None
+    last_timestamp = None
+    last_refresh = None
+    current = None
+    calendar = None
+    buckets = None
+    lock = None
+
+    class Bucket(object):
+        def __init__(self, specs, from_time, to_time):
+            self.from_time = from_time
+            self.to_time = to_time
+            self.formulas = {}
+            for name, (formula_class, index) in specs.iteritems():
+                self.formulas[name] = formula_class(index)
+
+        def add_sample(self, sample):
+            for formula in self.formulas.values():
+                formula.append(sample)
+
+        def values(self):
+            result = {}
+            for name, formula in self.formulas.iteritems():
+                result[name] = formula.value()
+            return result
+
+    def _init(self, context):
+        self.lock = threading.Lock()
+        self.keys = self.storage.keys(context=context)
+        self.specs = {}
+        for name, (formula_class, key) in self.aggregate_formulas.iteritems():
+            if key in self.keys:
+                self.specs[name] = (formula_class, self.keys.index(key))
+        # Last value of each measure and its time: key -> (value, localtime)
+        self.current_indexes = {}
+        for key in self.current_keys:
+            if key in self.keys:
+                self.current_indexes[key] = self.keys.index(key)
+        self.current = {}
+        self.calendar = {}
+        self.buckets = {}
+        for name in self.windows.keys():
+            self.buckets[name] = deque()
+
+    def _calendar_bounds(self, name, time):
+        if name == 'day':
+            start = datetime.datetime(time.year, time.month, time.day)
+            return (start, start + datetime.timedelta(1))
+        elif name == 'month':
+            start = datetime.datetime(time.year, time.month, 1)
+            if time.month == 12:
+                return (start, datetime.datetime(time.year + 1, 1, 1))
+            else:
+                return (start, datetime.datetime(time.year, time.month + 1, 1))
+        elif name == 'year':
+            return (datetime.datetime(time.year, 1, 1), datetime.datetime(time.year + 1, 1, 1))
+
+    def _bucket_start(self, time, size):
+        seconds = (time - datetime.datetime(time.year, time.month, time.day)).seconds
+        seconds = seconds - seconds % size.seconds
+        return datetime.datetime(time.year, time.month, time.day) + datetime.timedelta(0, seconds)
+
+    def _add_sample(self, sample, localtime):
+        for key, index in self.current_indexes.iteritems():
+            if sample[index] is not None:
+                self.current[key] = (sample[index], localtime)
+
+        for name in [ 'day', 'month', 'year' ]:
+            bucket = self.calendar.get(name)
+            if bucket is None or bucket.to_time <= localtime:
+                (from_time, to_time) = self._calendar_bounds(name, localtime)
+                bucket = self.Bucket(self.specs, from_time, to_time)
+                self.calendar[name] = bucket
+            bucket.add_sample(sample)
+
+        for name, (length, size) in self.windows.iteritems():
+            buckets = self.buckets[name]
+            if len(buckets) == 0 or buckets[-1].to_time <= localtime:
+                from_time = self._bucket_start(localtime, size)
+                buckets.append(self.Bucket(self.specs, from_time, from_time + size))
+            buckets[-1].add_sample(sample)
+
+    def _expire(self, now):
+        for key, (value, localtime) in self.current.items():
+            if localtime <= now - datetime.timedelta(0, self.max_age):
+                del self.current[key]
+        for name in [ 'day', 'month', 'year' ]:
+            bucket = self.calendar.get(name)
+            if bucket is not None and bucket.to_time <= now:
+                del self.calendar[name]
+        for name, (length, size) in self.windows.iteritems():
+            buckets = self.buckets[name]
+            while len(buckets) > 0 and buckets[0].to_time <= now - length:
+                buckets.popleft()
+
+    def refresh(self, context={}):
+        '''
+        Reads the samples added to the storage since the last refresh.
+        '''
+        now = datetime.datetime.now()
+        if self.last_timestamp is None:
+            # First scan starts at the beginning of the oldest period
+            from_time = min(datetime.datetime(now.year, 1, 1),
+                            now - max([ length for (length, size) in self.windows.values() ]))
+        else:
+            # Add 1 sec to last_timestamp so that the same sample is not retrieved twice
+            from_time = self.last_timestamp + datetime.timedelta(seconds=1)
+        self.logger.debug("Update from %s", from_time)
+
+        localtime_index = self.keys.index('localtime')
+        count = 0
+        for sample in self.storage.samples(from_time, now, context=context):
+            localtime = sample[localtime_index]
+            self._add_sample(sample, localtime)
+            self.last_timestamp = localtime
+            count = count + 1
+        self._expire(now)
+        self.last_refresh = now
+        self.logger.debug("Added %d samples, last timestamp: %s", count, self.last_timestamp)
+
+    def _merge(self, formula_class, values):
+        values = [ v for v in values if v is not None ]
+        if len(values) == 0:
+            return None
+        if formula_class == MaxFormula:
+            return max(values)
+        elif formula_class == MinFormula:
+            return min(values)
+        else:
+            return sum(values)
+
+    def snapshot(self, context={}):
+        '''
+        Returns a copy of the current aggregates, refreshing them first
+        if they are older than 'period' seconds.
+        '''
+        if self.lock is None:
+            self._init(context)
+
+        self.lock.acquire()
+        try:
+            now = datetime.datetime.now()
+            if self.last_refresh is None or self.last_refresh < now - datetime.timedelta(0, self.period):
+                self.refresh(context)
+
+            limit = now - datetime.timedelta(0, self.max_age)
+            current = dict([ (key, None) for key in self.current_indexes.keys() ])
+            for key, (value, localtime) in self.current.iteritems():
+                if localtime > limit:
+                    current[key] = value
+            result = { 'current': current }
+            empty = dict([ (name, None) for name in self.specs.keys() ])
+            for name in [ 'day', 'month', 'year' ]:
+                bucket = self.calendar.get(name)
+                result[name] = bucket.values() if bucket is not None else copy.copy(empty)
+            for name in self.windows.keys():
+                bucket_values = [ bucket.values() for bucket in self.buckets[name] ]
+                result[name] = {}
+                for key, (formula_class, index) in self.specs.iteritems():
+                    result[name][key] = self._merge(formula_class, [ v[key] for v in bucket_values ])
+            return result
+        finally:
+            self.lock.release()
+
+    def execute(self, data={}, context={}):
+        return self.snapshot(context)
+
+# Instances shared by the publishers, keyed by storage
+shared_stats = {}
+shared_lock = threading.Lock()
+
+def get_period_stats(storage):
+    '''
+    Returns the period statistics shared by all users of the given storage.
+    Storages referenced through a !service element are keyed by service name.
+    '''
+    if isinstance(storage, ServiceElement):
+        key = 'service:' + storage.name
+    else:
+        key = id(storage)
+
+    shared_lock.acquire()
+    try:
+        if not shared_stats.has_key(key):
+            stats = PeriodStatsDatasource()
+            stats.storage = storage
+            shared_stats[key] = stats
+        return shared_stats[key]
+    finally:
+        shared_lock.release()
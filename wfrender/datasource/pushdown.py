@@ -0,0 +1,196 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import logging
+
+from wfcommon.formula.base import AverageFormula
+from wfcommon.formula.base import CountFormula
+from wfcommon.formula.base import MinFormula
+from wfcommon.formula.base import MaxFormula
+from wfcommon.formula.base import SumFormula
+from wfcommon.formula.wind import PredominantWindFormula
+from wfcommon.formula.wind import WindSectorAverageFormula
+from wfcommon.formula.wind import WindSectorMaxFormula
+from wfcommon.formula.wind import WindSectorFrequencyFormula
+
+class AggregatePlanner(object):
+    '''
+    Translates the formulas of an accumulator into grouped aggregate
+    queries executed by a database storage (see DatabaseStorage.aggregate)
+    and feeds the partial results into the formulas of the slices.
+
+    Only formulas of the standard classes are pushed down. The others
+    (e.g. wind chill, heat index) are listed in 'fallback' and must be
+    computed from the samples.
+    '''
+
+    logger = logging.getLogger("datasource.pushdown")
+
+    # Python slice units to database grouping units. Weeks are aggregated
+    # per day and merged into their slice.
+    units = { 'minute': 'minute', 'hour': 'hour', 'day': 'day',
+              'week': 'day', 'month': 'month', 'year': 'year' }
+
+    def __init__(self, formulas, keys, functions, slice):
+        self.unit = self.units[slice]
+        self.specs = []
+        self.targets = []
+        self.sectors = {}
+        self.pushed = set()
+        self.fallback = []
+
+        for measure, series in formulas.iteritems():
+            for serie, formula in series.iteritems():
+                if self._plan(measure, serie, formula, keys, functions):
+                    self.pushed.add((measure, serie))
+                else:
+                    self.fallback.append((measure, serie))
+        self.logger.debug("Pushed down: %s, fallback: %s", sorted(self.pushed), self.fallback)
+
+    def _add_specs(self, specs):
+        positions = []
+        for spec in specs:
+            if spec not in self.specs:
+                self.specs.append(spec)
+            positions.append(self.specs.index(spec))
+        return positions
+
+    def _plan(self, measure, serie, formula, keys, functions):
+        if type(formula.index) != str or formula.index not in keys:
+            return False
+        field = formula.index.upper()
+        kind = type(formula)
+
+        if kind in [ AverageFormula, SumFormula ]:
+            specs = [ ('sum', field), ('count', field) ]
+        elif kind == CountFormula:
+            specs = [ ('count', field) ]
+        elif kind == MinFormula:
+            specs = [ ('min', field) ]
+        elif kind == MaxFormula:
+            specs = [ ('max', field) ]
+        elif kind == PredominantWindFormula:
+            # Direction is the key following the speed
+            position = keys.index(formula.index) + 1
+            if position >= len(keys):
+                return False
+            direction = keys[position].upper()
+            specs = [ ('wind_x', field, direction), ('wind_y', field, direction), ('count_pair', field, direction) ]
+        elif kind in [ WindSectorAverageFormula, WindSectorMaxFormula, WindSectorFrequencyFormula ]:
+            position = keys.index(formula.index) + 1
+            if 'sector' not in functions or position >= len(keys):
+                return False
+            sector = (field, keys[position].upper())
+            self.sectors.setdefault(sector, []).append((measure, serie, kind))
+            return True
+        else:
+            return False
+
+        for spec in specs:
+            if spec[0] not in functions:
+                return False
+        self.targets.append((measure, serie, kind, self._add_specs(specs)))
+        return True
+
+    def _find_slice(self, slices, starts, time):
+        i = bisect.bisect_right(starts, time) - 1
+        if i >= 0 and time < slices[i].to_time:
+            return slices[i]
+        return None
+
+    def fill(self, storage, slices, from_time, to_time, context={}):
+        '''
+        Aggregates the samples of the time range in the storage and merges
+        the result into the slices. Returns the timestamp of the last sample
+        or None if the range is empty.
+        '''
+        starts = [ slice.from_time for slice in slices ]
+        last_timestamp = None
+
+        if len(self.targets) > 0:
+            for row in storage.aggregate(from_time, to_time, self.unit, self.specs, context=context):
+                slice = self._find_slice(slices, starts, row[0])
+                if slice is None:
+                    continue
+                if last_timestamp is None or row[1] > last_timestamp:
+                    last_timestamp = row[1]
+                values = row[2:]
+                for (measure, serie, kind, positions) in self.targets:
+                    self._merge(slice.formulas[measure][serie], kind, [ values[p] for p in positions ])
+
+        for sector, targets in self.sectors.iteritems():
+            sector_specs = [ ('sum', sector[0]), ('count', sector[0]), ('max', sector[0]) ]
+            for row in storage.aggregate(from_time, to_time, self.unit, sector_specs, sector=sector, context=context):
+                slice = self._find_slice(slices, starts, row[0])
+                if slice is None or row[2] is None:
+                    continue
+                if last_timestamp is None or row[1] > last_timestamp:
+                    last_timestamp = row[1]
+                i = int(row[2]) % 16
+                for (measure, serie, kind) in targets:
+                    self._merge_sector(slice.formulas[measure][serie], kind, i, row[3:])
+
+        return last_timestamp
+
+    def _merge(self, formula, kind, values):
+        if kind == AverageFormula:
+            (total, count) = values
+            if count:
+                formula.sum = formula.sum + total
+                formula.count = formula.count + count
+        elif kind == SumFormula:
+            (total, count) = values
+            if count:
+                formula.sum = formula.sum + total
+                formula.empty = False
+        elif kind == CountFormula:
+            if values[0]:
+                formula.count = formula.count + values[0]
+        elif kind == MinFormula:
+            if values[0] is not None:
+                formula.min = min(formula.min, values[0])
+        elif kind == MaxFormula:
+            if values[0] is not None:
+                formula.max = max(formula.max, values[0])
+        elif kind == PredominantWindFormula:
+            (x, y, count) = values
+            if count:
+                formula.sumX = formula.sumX + x
+                formula.sumY = formula.sumY + y
+                formula.count = formula.count + count
+
+    def _merge_sector(self, formula, kind, i, values):
+        (total, count, maximum) = values
+        if kind == WindSectorAverageFormula:
+            if formula.sums is None:
+                formula.sums = [0]*16
+                formula.counts = [0]*16
+            formula.sums[i] = formula.sums[i] + total
+            formula.counts[i] = formula.counts[i] + count
+        elif kind == WindSectorMaxFormula:
+            if formula.values is None:
+                formula.values = [0]*16
+            if maximum > formula.values[i]:
+                formula.values[i] = maximum
+        elif kind == WindSectorFrequencyFormula:
+            if formula.sums is None:
+                formula.sums = [0]*16
+                formula.count = 0
+            formula.sums[i] = formula.sums[i] + float(count)
+            formula.count = formula.count + count
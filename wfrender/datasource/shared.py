@@ -0,0 +1,80 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import copy
+
+from wfcommon import sharedmem
+from wfcommon.memo import RenderMemo
+
+class SharedDataSource(object):
+    """
+    Shares the result of a datasource between the worker processes of
+    a !http renderer with 'workers'. One producer process executes the
+    datasource periodically and the workers read its last result from
+    shared memory, e.g. accumulator series or current conditions.
+
+    The data passed by the renderers are ignored, the datasource is
+    always executed with empty data. Declare it in the 'init' section
+    (as a service instance) so that it exists before the workers start.
+    Without workers, the datasource is executed directly.
+
+    [ Properties ]
+
+    source [datasource]:
+        The datasource to share.
+
+    period [numeric] (optional):
+        Seconds between two executions of the datasource. Defaults to 60.
+
+    size [numeric] (optional):
+        Maximum size in bytes of the pickled result. Defaults to 4194304.
+    """
+
+    source = None
+    period = 60
+    size = 4194304
+
+    segment = None
+
+    logger = logging.getLogger('data.shared')
+
+    def __setstate__(self, state):
+        # Called by the yaml loader
+        self.__dict__.update(state)
+        sharedmem.register(self)
+
+    def prepare(self):
+        if self.segment is None:
+            self.segment = sharedmem.Segment(self.size)
+
+    def refresh(self, context):
+        context = copy.copy(context)
+        context['_memo'] = RenderMemo()
+        result = self.source.execute(data={}, context=context)
+        if not self.segment.write(result):
+            self.logger.warning("Result larger than %d bytes, not shared. Increase 'shared.size'.", self.size)
+        return self.period
+
+    def execute(self, data={}, context={}):
+        assert self.source is not None, "'shared.source' must be set"
+
+        if self.segment is not None and self.segment.published():
+            return self.segment.read()
+        else:
+            return self.source.execute(data={}, context=context)
@@ -16,80 +16,47 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yaml
-
-import chart
-import data
-import datatable
-import file
-import staticfile
-import ftp
-import http
-import scheduler
-import template
-import value
-import meteoclimatic
-import wunderground
-import pwsweather
-import wettercom
-import sticker
-import openweathermap
-import metofficewow
-
-
-# YAML mappings
-
-class YamlGoogleChartRenderer(chart.GoogleChartRenderer, yaml.YAMLObject):
-    yaml_tag = u'!chart'
-
-class YamlGoogleWindRadarChartRenderer(chart.GoogleChartWindRadarRenderer, yaml.YAMLObject):
-    yaml_tag = u'!windradar'
-
-class YamlDataRenderer(data.DataRenderer, yaml.YAMLObject):
-    yaml_tag = u'!data'
-
-class YamlDataRenderer(datatable.DataTableRenderer, yaml.YAMLObject):
-    yaml_tag = u'!datatable'
-
-class YamlFileRenderer(file.FileRenderer, yaml.YAMLObject):
-    yaml_tag = u'!file'
-
-class YamlStaticFileRenderer(staticfile.StaticFileRenderer, yaml.YAMLObject):
-    yaml_tag = u'!staticfile'
-
-class YamlFtpRenderer(ftp.FtpRenderer, yaml.YAMLObject):
-    yaml_tag = u'!ftp'
-
-class YamlHttpRenderer(http.HttpRenderer, yaml.YAMLObject):
-    yaml_tag = u'!http'
-
-class YamlSchedulerRenderer(scheduler.SchedulerRenderer, yaml.YAMLObject):
-    yaml_tag = u'!scheduler'
-
-class YamlTemplateRenderer(template.TemplateRenderer, yaml.YAMLObject):
-    yaml_tag = u'!template'
-
-class YamlValueRenderer(value.ValueRenderer, yaml.YAMLObject):
-    yaml_tag = u'!value'
-
-class YamlMeteoclimaticRenderer(meteoclimatic.MeteoclimaticRenderer, yaml.YAMLObject):
-    yaml_tag = u'!meteoclimatic'
-
-class YamlWundergroundRenderer(wunderground.WeatherUndergroundPublisher, yaml.YAMLObject):
-    yaml_tag = u'!wunderground'
-
-class PwsWeatherRenderer(pwsweather.PwsWeatherPublisher, yaml.YAMLObject):
-    yaml_tag = u'!pwsweather'
-
-class WetterComRenderer(wettercom.WetterComPublisher, yaml.YAMLObject):
-    yaml_tag = u'!wettercom'
-
-class StickerRenderer(sticker.StickerRenderer, yaml.YAMLObject):
-    yaml_tag = u'!sticker'
-
-class OpenWeatherMapPublisher(openweathermap.OpenWeatherMapPublisher, yaml.YAMLObject):
-    yaml_tag = u'!openweathermap'
-
-class MetOfficeWowPublisher(metofficewow.MetOfficeWowPublisher, yaml.YAMLObject):
-    yaml_tag = u'!metofficewow'
-
+from wfcommon.registry import Registry
+
+# YAML mappings, the modules are imported when their tag is used
+
+elements = Registry(__name__)
+
+elements.register(u'!chart', 'chart', 'GoogleChartRenderer',
+    "Renders the data as a google chart")
+elements.register(u'!windradar', 'chart', 'GoogleChartWindRadarRenderer',
+    "Renders wind data as a radar google chart URL")
+elements.register(u'!data', 'data', 'DataRenderer',
+    "Executes a data query and pass the result to a wrapped renderer")
+elements.register(u'!datatable', 'datatable', 'DataTableRenderer',
+    "Executes a data query and renders the result in a data table")
+elements.register(u'!file', 'file', 'FileRenderer',
+    "Writes the result of the wrapped renderer to a file")
+elements.register(u'!staticfile', 'staticfile', 'StaticFileRenderer',
+    "Passes an existing static file to the renderer")
+elements.register(u'!ftp', 'ftp', 'FtpRenderer',
+    "Send rendered files by FTP")
+elements.register(u'!http', 'http', 'HttpRenderer',
+    "Renderer starting an embedded HTTP server and serves the content results from the wrapped renderers")
+elements.register(u'!scheduler', 'scheduler', 'SchedulerRenderer',
+    "Schedules a renderer to be called periodically")
+elements.register(u'!template', 'template', 'TemplateRenderer',
+    "Executes a wrapped renderer and fills a Cheetah template with the resulting data")
+elements.register(u'!value', 'value', 'ValueRenderer',
+    "Returns the main value as a string in the right units according to the context")
+elements.register(u'!meteoclimatic', 'meteoclimatic', 'MeteoclimaticRenderer',
+    "Renders the data chunk to send to the meteoclimatic website using local time")
+elements.register(u'!wunderground', 'wunderground', 'WeatherUndergroundPublisher',
+    "Render and publisher for Weather Underground")
+elements.register(u'!pwsweather', 'pwsweather', 'PwsWeatherPublisher',
+    "Render and publisher for pwsweather.com")
+elements.register(u'!wettercom', 'wettercom', 'WetterComPublisher',
+    "Render and publisher for wetter.com")
+elements.register(u'!sticker', 'sticker', 'StickerRenderer',
+    "Renders a wfrog sticker, to be served via http or uploaded with ftp")
+elements.register(u'!openweathermap', 'openweathermap', 'OpenWeatherMapPublisher',
+    "Render and publisher for www.openweathermap.org")
+elements.register(u'!metofficewow', 'metofficewow', 'MetOfficeWowPublisher',
+    "Render and publisher for UK Metoffice WOW (weather Observations Website)")
+elements.register(u'!publishers', 'publishing', 'PublisherSchedulerRenderer',
+    "Runs several publishers (!wunderground, !pwsweather, !wettercom, !openweathermap, !metofficewow) from a single timer instead of one endless loop per publisher")
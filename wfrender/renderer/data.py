@@ -16,7 +16,7 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from wfcommon.dict import merge
+from wfcommon.dict import overlay
 
 class DataRenderer(object):
     """
@@ -33,6 +33,9 @@ class DataRenderer(object):
     renderer [renderer]:
         A renderer called after the query was performed.
         The data structure is passed as parameter.
+
+    Within a render pass, the results of the same datasource with the same
+    data parameters are computed once and shared between the renderers.
     """
 
     source=None
@@ -41,6 +44,11 @@ class DataRenderer(object):
     def render(self,data={}, context={}):
         assert self.source is not None, "'data.source' must be set"
         assert self.renderer is not None, "'data.renderer' must be set"
-        new_data = self.source.execute(data=data, context=context)
-        merge(new_data, data)
+        memo = context.get('_memo')
+        if memo is not None:
+            new_data = memo.execute(self.source, data=data, context=context)
+        else:
+            new_data = self.source.execute(data=data, context=context)
+        # The datasource result may be shared, merge without modifying it
+        new_data = overlay(new_data, data)
         return self.renderer.render(data=new_data, context=context)
@@ -42,7 +42,11 @@ class DataTableRenderer(object):
 
     def render(self,data={}, context={}):
         if self.source != None:
-	    new_data = self.source.execute(data=data, context=context)
+            memo = context.get('_memo')
+            if memo is not None:
+                new_data = memo.execute(self.source, data=data, context=context)
+            else:
+                new_data = self.source.execute(data=data, context=context)
         else:
            new_data = data
         result = {}
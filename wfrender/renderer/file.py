@@ -17,11 +17,18 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os, time
+import logging
+from wfcommon.atomicfile import AtomicFileWriter
+from wfcommon import metrics
+
+renders = metrics.histogram('wfrog_render_seconds', 'Time to render a named renderer.', [ 'renderer' ])
 
 class FileRenderer(object):
     """
     Writes the result of the wrapped renderer to a file.
     Currently supports only text output.
+    The file is replaced atomically and is not rewritten when the
+    content did not change.
 
     render result [string]:
         The path to the generated file.
@@ -35,16 +42,26 @@ class FileRenderer(object):
         If present, specifies that the filename is generated by the
         path, a generated unique id and the provided suffix. Useful
         for generating temporary files.
+
+    fsync [true|false] (optional):
+        Force the content to disk before replacing the file.
+        Defaults to false.
     """
 
     renderer = None
     path = None
     suffix = None
+    fsync = False
+
+    writer = None
+
+    logger = logging.getLogger("renderer.file")
 
     def render(self, data={}, context={}):
         assert self.path is not None, "'file.path' must be set"
 
-        [ mime, content ] = self.renderer.render(data=data, context=context)
+        with renders.time(renderer=os.path.basename(self.path)):
+            [ mime, content ] = self.renderer.render(data=data, context=context)
 
         if self.suffix:
             filename=self.path+"-"+str(os.getpid())+"-"+ \
@@ -52,10 +69,10 @@ class FileRenderer(object):
         else:
             filename=self.path
 
-        f = open(filename, "w")
-        try:
-            f.write(content)
-        finally:
-            f.close()
+        if self.writer is None:
+            self.writer = AtomicFileWriter(self.fsync)
+
+        if not self.writer.write(filename, content, compare=not self.suffix):
+            self.logger.debug("%s unchanged (%d writes skipped)" % (filename, self.writer.skipped))
 
         return filename
@@ -20,14 +20,24 @@ import ftplib
 import logging
 import time
 import socket
+import hashlib
+import threading
 import os.path
+from Queue import Queue, Empty
+from wfcommon import metrics
 # Set up socket timeout to prevent hangs when ftp sites fail
 socket.setdefaulttimeout(30)  # 30 seconds 
 
+renders = metrics.histogram('wfrog_render_seconds', 'Time to render a named renderer.', [ 'renderer' ])
+
 class FtpRenderer(object):
     """
     Send rendered files by FTP. Typically used with TemplateRenderer.
 
+    Only the files whose content changed since the last successful
+    upload are sent. Each file is first uploaded under a temporary name
+    and then renamed, so that readers never see a partially uploaded file.
+
     render result [none]:
         Nothing is returned by this renderer.
 
@@ -50,6 +60,14 @@ class FtpRenderer(object):
 
     password [string]:
         FTP site password.
+
+    connections [numeric] (optional):
+        Maximum number of connections used to upload files in parallel.
+        Defaults to 2.
+
+    keep_alive [true|false] (optional):
+        Keep the connections open between two renderings. Connections
+        closed by the server are transparently reopened. Defaults to true.
     """
 
     renderers = None
@@ -58,6 +76,12 @@ class FtpRenderer(object):
     directory = None
     username = None
     password = None
+    connections = 2
+    keep_alive = True
+
+    hashes = None
+    idle = None
+    lock = None
 
     logger = logging.getLogger("renderer.ftp")
 
@@ -66,47 +90,149 @@ class FtpRenderer(object):
         assert self.username is not None, "'ftp.username' must be set"
         assert self.password is not None, "'ftp.password' must be set"
 
+        if self.lock is None:
+            self.lock = threading.Lock()
+            self.hashes = {}
+            self.idle = []
+
         files= {}
 
         for key in self.renderers.keys():
             self.logger.info("Rendering %s" % key)
-            files[key] = self.renderers[key].render(data=data, context=context)
-
-        errors = 0
+            with renders.time(renderer=key):
+                files[key] = self.renderers[key].render(data=data, context=context)
+
+        queue = Queue()
+        for remote_file, local_file in files.iteritems():
+            if not os.path.exists(local_file):
+                self.logger.error("Local file %s does not exist, skipping..." % local_file)
+                continue
+            digest = self._digest(local_file)
+            if self.hashes.get(remote_file) == digest:
+                self.logger.debug("%s unchanged, skipping" % remote_file)
+                continue
+            queue.put((remote_file, local_file, digest))
+
+        if queue.empty():
+            self.logger.info("No changed file to send")
+        else:
+            workers = []
+            for i in range(min(self.connections, queue.qsize())):
+                worker = threading.Thread(target=self._upload, args=(queue,))
+                workers.append(worker)
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        if not self.keep_alive:
+            self.close()
+
+    def _digest(self, local_file):
+        md5 = hashlib.md5()
+        f = open(local_file, 'rb')
+        try:
+            for block in iter(lambda: f.read(65536), ''):
+                md5.update(block)
+        finally:
+            f.close()
+        return md5.hexdigest()
+
+    def _upload(self, queue):
         while True:
             try:
-                ftp = ftplib.FTP()
-                self.logger.debug("Connecting to %s:%d" % (self.host, self.port))
-                ftp.connect(self.host, self.port)
-                self.logger.debug("Authenticating...")
-                ftp.login(self.username, self.password)
-                self.logger.info("Connected to %s@%s:%d" % (self.username, self.host, self.port))
-                if self.directory is not None:
-                    self.logger.debug("Moving to directory %s" % self.directory)
-                    ftp.cwd(self.directory)
-                for remote_file, local_file in files.iteritems():
-                    self.logger.debug("Sending %s to %s" % (local_file, remote_file))
-                    if os.path.exists(local_file):
-                        f = open(local_file, 'r')
-                        ftp.storbinary("STOR %s" % remote_file, f)
-                        f.close()
-                        self.logger.info("Sent %s to %s" % (local_file, remote_file))
+                (remote_file, local_file, digest) = queue.get_nowait()
+            except Empty:
+                return
+
+            errors = 0
+            while True:
+                ftp = None
+                try:
+                    ftp = self._get_connection()
+                    self._send(ftp, local_file, remote_file)
+                    self.hashes[remote_file] = digest
+                    self._release_connection(ftp)
+                    break
+                except Exception, e:
+                    if ftp is not None:
+                        try:
+                            ftp.close()
+                        except:
+                            pass
+                    errors += 1
+                    if errors < 3:
+                        self.logger.warning("Error sending %s by FTP (retrying in 5 secs.): %s" % (remote_file, str(e)))
+                        time.sleep(5)
                     else:
-                        self.logger.error("Local file %s does not exist, skipping..." % local_file) 
-                ftp.quit()
-                break
+                        self.logger.error("Error sending %s by FTP (aborting): %s" % (remote_file, str(e)))
+                        break
+
+    def _send(self, ftp, local_file, remote_file):
+        temp_file = remote_file + ".tmp"
+        self.logger.debug("Sending %s to %s" % (local_file, temp_file))
+        f = open(local_file, 'rb')
+        try:
+            ftp.storbinary("STOR %s" % temp_file, f)
+        finally:
+            f.close()
+        try:
+            ftp.rename(temp_file, remote_file)
+        except ftplib.error_perm:
+            # Some servers do not rename over an existing file
+            ftp.delete(remote_file)
+            ftp.rename(temp_file, remote_file)
+        self.logger.info("Sent %s to %s" % (local_file, remote_file))
+
+    def _get_connection(self):
+        self.lock.acquire()
+        try:
+            ftp = self.idle.pop() if len(self.idle) > 0 else None
+        finally:
+            self.lock.release()
+
+        if ftp is not None:
+            try:
+                ftp.voidcmd("NOOP")
+                return ftp
             except Exception, e:
+                self.logger.debug("Connection closed by server: %s" % str(e))
                 try:
                     ftp.close()
                 except:
                     pass
-                errors += 1
-                if errors < 3:
-                    self.logger.warning("Error sending files by FTP (retrying in 5 secs.): %s" % str(e))
-                    time.sleep(5)
-                else:
-                    self.logger.error("Error sending files by FTP (aborting): %s" % str(e))
-                    break
-
-
 
+        ftp = ftplib.FTP()
+        self.logger.debug("Connecting to %s:%d" % (self.host, self.port))
+        ftp.connect(self.host, self.port)
+        self.logger.debug("Authenticating...")
+        ftp.login(self.username, self.password)
+        self.logger.info("Connected to %s@%s:%d" % (self.username, self.host, self.port))
+        if self.directory is not None:
+            self.logger.debug("Moving to directory %s" % self.directory)
+            ftp.cwd(self.directory)
+        return ftp
+
+    def _release_connection(self, ftp):
+        self.lock.acquire()
+        try:
+            self.idle.append(ftp)
+        finally:
+            self.lock.release()
+
+    def close(self):
+        if self.lock is None:
+            return
+        self.lock.acquire()
+        try:
+            idle = self.idle
+            self.idle = []
+        finally:
+            self.lock.release()
+        for ftp in idle:
+            try:
+                ftp.quit()
+            except:
+                try:
+                    ftp.close()
+                except:
+                    pass
@@ -28,6 +28,15 @@ import logging
 import posixpath
 import urllib
 import os
+import errno
+import signal
+from wfcommon.memo import RenderMemo
+from wfcommon import metrics
+from wfcommon import sharedmem
+from wfcommon import profiling
+from wfcommon import log
+
+requests = metrics.histogram('wfrog_http_request_seconds', 'Time to serve a request of the !http renderer.', [ 'path' ])
 
 class HttpRenderer(object):
     """
@@ -62,6 +71,25 @@ class HttpRenderer(object):
         
     docroot [string] (optional):
         Root directory served when static content is enabled. Defaults to /var/wwww.
+
+    metrics [true|false] (optional):
+        Serves the metrics of the process (queues, storage and render
+        times) on /metrics, in the Prometheus text format. Defaults to true.
+
+    stacks [true|false] (optional):
+        Serves the stacks of the threads of the process on /stacks, in
+        the collapsed format of flame graphs. With '?seconds=N', the
+        stacks are sampled during N seconds (at most 60). Defaults to
+        false.
+
+    workers [numeric] (optional):
+        Number of processes serving the requests. The rendering then
+        uses several cores and does not compete with the other threads
+        of the process, e.g. an embedded logger. Results of datasources
+        are shared between the processes with !shared. Only on systems
+        supporting fork. The metrics are the ones of the process
+        answering. Defaults to 0, the requests are served by this
+        process.
         
     """
 
@@ -71,6 +99,9 @@ class HttpRenderer(object):
     cookies = []
     static = None
     docroot = "/var/www"
+    metrics = True
+    stacks = False
+    workers = 0
 
     logger = logging.getLogger("renderer.http")
 
@@ -79,6 +110,7 @@ class HttpRenderer(object):
         self.context = copy.deepcopy(context)
         self.context["http"] = True # Put in the context that we use the http render. It may be useful to know that in templates.
         self.data = data
+        self.stopped = threading.Event()
 
         try:
             global _HttpRendererSingleton
@@ -86,7 +118,10 @@ class HttpRenderer(object):
             self.server = StoppableHTTPServer(('', self.port), HttpRendererHandler)
             self.server.allow_reuse_address
             self.logger.info('Started server on port ' + str(self.port))
-            self.server.serve_forever()
+            if self.workers > 0:
+                self._supervise()
+            else:
+                self.server.serve_forever()
             self.server.socket.close()
             self.logger.debug('Stopped listening')
         except KeyboardInterrupt:
@@ -99,15 +134,112 @@ class HttpRenderer(object):
 
     def close(self):
         self.logger.debug('Close requested')
-        self.server.shutdown()
+        if self.workers > 0:
+            self.stopped.set()
+        else:
+            self.server.shutdown()
+
+    def _supervise(self):
+        assert hasattr(os, 'fork'), "'http.workers' needs a system supporting fork"
+
+        # The workers wait for connections on the same socket, the ones
+        # not getting a connection go back waiting
+        self.server.socket.setblocking(0)
+        producers = sharedmem.prepare()
+        roles = [ 'worker' ] * self.workers
+        if len(producers) > 0:
+            roles.append('producer')
+
+        children = {}
+        try:
+            for role in roles:
+                children[self._fork(role, producers)] = role
+            while not self.stopped.isSet():
+                self.stopped.wait(1)
+                for (pid, role) in children.items():
+                    (done, status) = os.waitpid(pid, os.WNOHANG)
+                    if done:
+                        del children[pid]
+                        if not self.stopped.isSet():
+                            self.logger.error("%s process %d exited with status %d, starting another one", role, pid, status)
+                            time.sleep(1)
+                            children[self._fork(role, producers)] = role
+        finally:
+            for pid in children.keys():
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            self.logger.debug('Stopped %d processes', len(children))
+
+    def _fork(self, role, producers):
+        parent = os.getpid()
+        pid = os.fork()
+        if pid > 0:
+            self.logger.info("Started %s process %d", role, pid)
+            return pid
+
+        # Child process, never returns
+        status = 0
+        try:
+            try:
+                signal.signal(signal.SIGTERM, _terminate)
+                # ^C is handled by the parent
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                log.after_fork()
+                if role == 'producer':
+                    self.server.socket.close()
+                    # Not using the database connections of the forking
+                    # thread, they belong to the parent
+                    thread = threading.Thread(target=sharedmem.produce, args=(producers, self.context, threading.Event()))
+                else:
+                    thread = threading.Thread(target=self.server.serve_forever)
+                thread.setDaemon(True)
+                thread.start()
+                # Stops with the parent, even if it was killed
+                while thread.isAlive() and os.getppid() == parent:
+                    thread.join(1)
+            except SystemExit:
+                pass
+            except:
+                self.logger.exception("Error in %s process", role)
+                status = 1
+        finally:
+            log.flush()
+            os._exit(status)
+
+def _terminate(signum, frame):
+    raise SystemExit()
 
 class HttpRendererHandler(BaseHTTPRequestHandler):
 
     def do_GET(self):
+        start = time.time()
+        try:
+            self._get()
+        finally:
+            requests.observe(time.time() - start, path=self._path_label())
+
+    def _path_label(self):
+        # Unknown paths are grouped to keep a bounded number of series
+        global _HttpRendererSingleton
+        renderers = _HttpRendererSingleton.renderers
+        static = _HttpRendererSingleton.static
+        name = urlparse.urlsplit(self.path).path.strip('/')
+        if name in [ '', '-set-', 'metrics', 'stacks' ] or (renderers is not None and renderers.has_key(name)):
+            return '/' + name
+        elif static and name.startswith(static):
+            return '/' + static
+        else:
+            return 'other'
+
+    def _get(self):
         global _HttpRendererSingleton
         renderers = _HttpRendererSingleton.renderers
         root = _HttpRendererSingleton.root
         context = copy.deepcopy(_HttpRendererSingleton.context)
+        context['_memo'] = RenderMemo()
         cookie_sections = _HttpRendererSingleton.cookies
 
         data = copy.deepcopy(_HttpRendererSingleton.data)
@@ -177,6 +309,29 @@ class HttpRendererHandler(BaseHTTPRequestHandler):
                 h.do_GET()
                 return
 
+            if name == "metrics" and _HttpRendererSingleton.metrics and (renderers is None or not renderers.has_key(name)):
+                content = metrics.text()
+                self.send_response(200)
+                self.send_header('Content-type', metrics.CONTENT_TYPE)
+                self.send_header('Content-length', len(content))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
+            if name == "stacks" and _HttpRendererSingleton.stacks and (renderers is None or not renderers.has_key(name)):
+                try:
+                    seconds = profiling.parse_seconds(data.get('seconds'))
+                except ValueError:
+                    self.send_error(400, "Invalid seconds parameter")
+                    return
+                content = profiling.text(seconds)
+                self.send_response(200)
+                self.send_header('Content-type', 'text/plain')
+                self.send_header('Content-length', len(content))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
             if name == "":
                 if not root:
                     mime = "text/html"
@@ -227,7 +382,13 @@ class StoppableHTTPServer(HTTPServer):
             # connecting to the socket to wake this up instead of
             # polling. Polling reduces our responsiveness to a
             # shutdown request and wastes cpu at all other times.
-            r, w, e = select.select([self], [], [], poll_interval)
+            try:
+                r, w, e = select.select([self], [], [], poll_interval)
+            except select.error, e:
+                # Interrupted by a signal
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
             if r:
                 self._handle_request_noblock()
         self.__is_shut_down.set()
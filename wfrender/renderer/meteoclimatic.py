@@ -22,14 +22,10 @@ import logging
 import sys
 import time
 import wfcommon.database
-from wfcommon.formula.base import LastFormula
-from wfcommon.formula.base import SumFormula
-from wfcommon.formula.base import MinFormula
-from wfcommon.formula.base import MaxFormula
 try:
-    from wfrender.datasource.accumulator import AccumulatorDatasource
+    from wfrender.datasource.periods import get_period_stats
 except ImportError, e:
-    from datasource.accumulator import AccumulatorDatasource
+    from datasource.periods import get_period_stats
 from wfcommon.units import MpsToKmh
 
 class MeteoclimaticRenderer(object):
@@ -54,9 +50,7 @@ class MeteoclimaticRenderer(object):
 
     id = None
     storage = None
-    accuY = None
-    accuM = None
-    accuD = None
+    stats = None
     lastTemplate = None
     
     logger = logging.getLogger("renderer.meteoclimatic")
@@ -66,76 +60,19 @@ class MeteoclimaticRenderer(object):
             assert self.id is not None, "'meteoclimatic.id' must be set"
             assert self.storage is not None, "'meteoclimatic.storage' must be set"
 
-            if self.accuD == None:
-                self.logger.info("Initializing accumulators")
+            if self.stats == None:
+                self.stats = get_period_stats(self.storage)
 
-                # Accumulator for yearly data
-                self.accuY = AccumulatorDatasource()
-                self.accuY.slice = 'year'
-                self.accuY.span = 1
-                self.accuY.caching = True
-                self.accuY.storage = self.storage
-                self.accuY.formulas = {'data': {
-                     'max_temp' : MaxFormula('temp'),
-                     'min_temp' : MinFormula('temp'),
-                     'max_hum' : MaxFormula('hum'),
-                     'min_hum' : MinFormula('hum'),
-                     'max_pressure' : MaxFormula('pressure'),
-                     'min_pressure' : MinFormula('pressure'),
-                     'max_gust' : MaxFormula('wind_gust'),
-                     'rain_fall' : SumFormula('rain') } }
-
-                # Accumulator for monthly data
-                self.accuM = AccumulatorDatasource()
-                self.accuM.slice = 'month'
-                self.accuM.span = 1
-                self.accuM.storage = self.storage
-                self.accuM.caching = True
-                self.accuM.formulas = {'data': {
-                     'max_temp' : MaxFormula('temp'),
-                     'min_temp' : MinFormula('temp'),
-                     'max_hum' : MaxFormula('hum'),
-                     'min_hum' : MinFormula('hum'),
-                     'max_pressure' : MaxFormula('pressure'),
-                     'min_pressure' : MinFormula('pressure'),
-                     'max_gust' : MaxFormula('wind_gust'),
-                     'rain_fall' : SumFormula('rain') } }
-
-                # Accumulator for daily and current data
-                self.accuD = AccumulatorDatasource()
-                self.accuD.slice = 'day'
-                self.accuD.span = 1
-                self.accuD.storage = self.storage
-                self.accuD.caching = True
-                self.accuD.formulas = {
-                     'data': {
-                         'max_temp' : MaxFormula('temp'),
-                         'min_temp' : MinFormula('temp'),
-                         'max_hum' : MaxFormula('hum'),
-                         'min_hum' : MinFormula('hum'),
-                         'max_pressure' : MaxFormula('pressure'),
-                         'min_pressure' : MinFormula('pressure'),
-                         'max_gust' : MaxFormula('wind_gust'),
-                         'rain_fall' : SumFormula('rain') },
-                     'current': {
-                         'temp' : LastFormula('temp'),
-                         'hum' : LastFormula('hum'),
-                         'pressure' : LastFormula('pressure'),
-                         'gust' : LastFormula('wind_gust'),
-                         'wind_deg' : LastFormula('wind_dir'),
-                         'time' : LastFormula('localtime') } }
-
-                if 'solar_rad' in self.storage.keys():
-                    self.accuD.formulas['current']['solar_rad'] = LastFormula('solar_rad')
+            snapshot = self.stats.snapshot()
 
             self.logger.info("Calculating ...")
 
             template = "*VER=DATA2*COD=%s*%s*%s*%s*%s*EOT*" % (
                        self.id, 
-                       self._calculateCurrentData(self.accuD), 
-                       self._calculateAggregData('D', self.accuD), 
-                       self._calculateAggregData('M', self.accuM), 
-                       self._calculateAggregData('Y', self.accuY))
+                       self._calculateCurrentData(snapshot['current']), 
+                       self._calculateAggregData('D', snapshot['day']), 
+                       self._calculateAggregData('M', snapshot['month']), 
+                       self._calculateAggregData('Y', snapshot['year']))
 
             self.lastTemplate = template
 
@@ -150,33 +87,29 @@ class MeteoclimaticRenderer(object):
             else:
                 return ['text/plain', self.lastTemplate] 
 
-    def _calculateCurrentData(self, accu):
-        data = accu.execute()['current']['series']
-        index = len(data['lbl'])-1
+    def _calculateCurrentData(self, data):
         template = "UPD=%s*TMP=%s*WND=%s*AZI=%s*BAR=%s*HUM=%s*SUN=%s" % (
-               self._format(data['time'][index].strftime("%d/%m/%Y %H:%M")), 
-               self._format(data['temp'][index]),  
-               self._format(MpsToKmh(data['gust'][index])), 
-               self._format(data['wind_deg'][index]), 
-               self._format(data['pressure'][index]), 
-               self._format(data['hum'][index]),
-               self._format(data['solar_rad'][index], '') if 'solar_rad' in self.storage.keys() else '' )
-        self.logger.debug("Calculating current data (index: %d): %s" % (index, template))
+               self._format(data['localtime'].strftime("%d/%m/%Y %H:%M")), 
+               self._format(data['temp']),  
+               self._format(MpsToKmh(data['wind_gust'])), 
+               self._format(data['wind_dir']), 
+               self._format(data['pressure']), 
+               self._format(data['hum']),
+               self._format(data.get('solar_rad'), '') )
+        self.logger.debug("Calculating current data: %s" % template)
         return template
 
-    def _calculateAggregData(self, time_span, accu):
-        data = accu.execute()['data']['series']
-        index = len(data['lbl'])-1
+    def _calculateAggregData(self, time_span, data):
         template = "%sHTM=%s*%sLTM=%s*%sHHM=%s*%sLHM=%s*%sHBR=%s*%sLBR=%s*%sGST=%s*%sPCP=%s" % (
-               time_span, self._format(data['max_temp'][index]), 
-               time_span, self._format(data['min_temp'][index]), 
-               time_span, self._format(data['max_hum'][index]), 
-               time_span, self._format(data['min_hum'][index]),
-               time_span, self._format(data['max_pressure'][index]), 
-               time_span, self._format(data['min_pressure'][index]), 
-               time_span, self._format(MpsToKmh(data['max_gust'][index])), 
-               time_span, self._format(data['rain_fall'][index]) )
-        self.logger.debug("Calculating %s data (index: %d): %s" % (time_span, index, template))
+               time_span, self._format(data['max_temp']), 
+               time_span, self._format(data['min_temp']), 
+               time_span, self._format(data['max_hum']), 
+               time_span, self._format(data['min_hum']),
+               time_span, self._format(data['max_pressure']), 
+               time_span, self._format(data['min_pressure']), 
+               time_span, self._format(MpsToKmh(data['max_gust'])), 
+               time_span, self._format(data['rain_fall']) )
+        self.logger.debug("Calculating %s data: %s" % (time_span, template))
         return template
 
     def _format(self, value, default='-'):
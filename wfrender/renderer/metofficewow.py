@@ -21,15 +21,13 @@ import sys
 import time
 import hashlib
 import wfcommon.database
-from wfcommon.formula.base import LastFormula
-from wfcommon.formula.base import SumFormula
-from httplib import HTTPConnection
+from wfcommon.httpclient import pool
 from urllib import urlencode
 
 try:
-    from wfrender.datasource.accumulator import AccumulatorDatasource
+    from wfrender.datasource.periods import get_period_stats
 except ImportError, e:
-    from datasource.accumulator import AccumulatorDatasource
+    from datasource.periods import get_period_stats
 from wfcommon.units import HPaToInHg
 from wfcommon.units import CToF
 from wfcommon.units import MmToIn
@@ -58,69 +56,66 @@ class MetOfficeWowPublisher(object):
     password = None
     publisher = None
     storage = None
+    stats = None
     period = 900
     alive = False
 
     logger = logging.getLogger("renderer.metofficeWOW")
 
-    def render(self, data={}, context={}):
-        try:
+    def _init(self):
+        if self.stats is None:
             assert self.username is not None, "'MetofficeWOW.siteid' must be set"
             assert self.password is not None, "'MetofficeWOW.siteAuthenticationKey' must be set"
             assert self.period is not None, "'MetofficeWOW.period' must be set"
 
             self.logger.info("Initializing MetOffice WOW Upload (user %s)" % self.username)
 
-            self.alive = True
+            self.stats = get_period_stats(self.storage)
 
-            accu = AccumulatorDatasource()
-            accu.slice = 'hour'
-            accu.span = 2
-            accu.storage = self.storage
+    def render(self, data={}, context={}):
+        try:
+            self._init()
 
-            accu.formulas = {'current': {
-                 'temp'         : LastFormula('temp'),
-                 'hum'          : LastFormula('hum'),
-                 'pressure'     : LastFormula('pressure'),
-                 'wind'         : LastFormula('wind'),
-                 'wind_deg'     : LastFormula('wind_dir'),
-                 'rain'         : SumFormula('rain'),
-                 'utctime'      : LastFormula('utctime') } }
+            self.alive = True
 
             while self.alive:
-                try:
-                    data = accu.execute()['current']['series']
-                    index = len(data['lbl'])-1
-
-                    args = {
-                        'dateutc':                data['utctime'][index].strftime('%Y-%m-%d %H:%M:%S'),
-                        # Some ARGs are hashed out here as Metoffice WOW needs them in the correct order or it will reject the post
-                        # I found that if I used the args they are in a random order so define them on the URL encode instead
-                        #'siteAuthenticationKey': str(self.password),
-                        #'softwaretype':          "Wfrog",
-                        'humidity':               int(round(data['hum'][index])),
-                        'tempf':                  str(CToF(data['temp'][index])),
-                        #'siteid':                str(self.username),
-                        'winddir':                int(round(data['wind_deg'][index])),
-                        'windspeedmph':           str(MpsToMph(data['wind'][index])),
-                        'baromin':                str(HPaToInHg(data['pressure'][index])),
-                        'rainin':                 str(MmToIn(data['rain'][index])) }
-
-                    self.logger.info("Publishing Metoffice WOW data: %s " % urlencode(args))
-                    self._publish(args, 'wow.metoffice.gov.uk', '/automaticreading')
-
-                except Exception, e:
-                    if (str(e) == "'NoneType' object has no attribute 'strftime'") or (str(e) == "a float is required"):
-                        self.logger.error('Could not publish: no valid values at this time. Retry next run...')
-                    else:
-                        self.logger.error('Got unexpected error. Retry next run. Error: %s' % e)
- 
+                self.publish(data=data, context=context)
                 time.sleep(self.period)
 
         except Exception, e:
             self.logger.exception(e)
             raise
 
+    def publish(self, data={}, context={}):
+        try:
+            self._init()
+
+            snapshot = self.stats.snapshot()
+            data = snapshot['current']
+
+            args = {
+                'dateutc':                data['utctime'].strftime('%Y-%m-%d %H:%M:%S'),
+                # Some ARGs are hashed out here as Metoffice WOW needs them in the correct order or it will reject the post
+                # I found that if I used the args they are in a random order so define them on the URL encode instead
+                #'siteAuthenticationKey': str(self.password),
+                #'softwaretype':          "Wfrog",
+                'humidity':               int(round(data['hum'])),
+                'tempf':                  str(CToF(data['temp'])),
+                #'siteid':                str(self.username),
+                'winddir':                int(round(data['wind_dir'])),
+                'windspeedmph':           str(MpsToMph(data['wind'])),
+                'baromin':                str(HPaToInHg(data['pressure'])),
+                'rainin':                 str(MmToIn(snapshot['hour']['rain_fall'])) }
+
+            self.logger.info("Publishing Metoffice WOW data: %s " % urlencode(args))
+            self._publish(args, 'wow.metoffice.gov.uk', '/automaticreading')
+
+        except Exception, e:
+            if (str(e) == "'NoneType' object has no attribute 'strftime'") or (str(e) == "a float is required"):
+                self.logger.error('Could not publish: no valid values at this time. Retry next run...')
+            else:
+                self.logger.error('Got unexpected error. Retry next run. Error: %s' % e)
+
     def close(self):
         self.alive = False
 
@@ -129,18 +124,9 @@ class MetOfficeWowPublisher(object):
 
         self.logger.debug('Connect to: http://%s' % server)
 
-        conn = HTTPConnection(server)
-        if not conn:
-            raise Exception, 'Remote server connection (%s) timeout!' % server
-
         self.logger.debug('GET %s' % uri)
 
-        conn.request("GET", uri)
-        conn.sock.settimeout(5.0)
-
-        http = conn.getresponse()
-        data = (http.status, http.reason, http.read())
-        conn.close()
+        data = pool.request(server, "GET", uri, timeout=5.0)
 
         self.logger.debug('Response: %d, %s, %s' % data)
 
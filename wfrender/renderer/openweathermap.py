@@ -19,18 +19,14 @@ import math
 import logging
 import sys
 import time
-import httplib
 import urllib
 import base64
-
-from wfcommon.formula.base import LastFormula
-from wfcommon.formula.base import SumFormula
-
+from wfcommon.httpclient import pool
 
 try:
-    from wfrender.datasource.accumulator import AccumulatorDatasource
+    from wfrender.datasource.periods import get_period_stats
 except ImportError, e:
-    from datasource.accumulator import AccumulatorDatasource
+    from datasource.periods import get_period_stats
 
 class OpenWeatherMapPublisher(object):
     """
@@ -65,6 +61,10 @@ class OpenWeatherMapPublisher(object):
 
     send_radiation[boolean] (optional):
         Send radiation data (by default false).
+
+    period [numeric] (optional):
+        Number of seconds between two checks for new records to
+        send. Defaults to 60.
     """
 
     username = None
@@ -74,114 +74,91 @@ class OpenWeatherMapPublisher(object):
     latitude = None
     altitude = None
     storage = None
+    stats = None
+    last_timestamp = None
+    period = 60
     alive = False
     send_uv = False
     send_radiation = False
 
     logger = logging.getLogger("renderer.openweathermap")
 
-    def render(self, data={}, context={}):
-        try:
+    def _init(self):
+        if self.stats is None:
             assert self.username is not None, "'openweathermap.id' must be set"
             assert self.password is not None, "'openweathermap.password' must be set"
             assert self.name is not None, "'openweathermap.name' must be set"
             assert self.latitude is not None, "'openweathermap.latitude' must be set"
             assert self.longitude is not None, "'openweathermap.longitude' must be set"
             assert self.altitude is not None, "'openweathermap.altitude' must be set"
-            
+
             self.logger.info("Initializing openweathermap.com (user %s)" % self.username)
 
+            self.stats = get_period_stats(self.storage)
+
+    def render(self, data={}, context={}):
+        try:
+            self._init()
+
             self.alive = True
 
-            accu = AccumulatorDatasource()
-            accu.slice = 'day'
-            accu.span = 1
-            accu.storage = self.storage
-
-            accu.formulas =     {'current': {
-                 'temp'      : LastFormula('temp'),
-                 'hum'       : LastFormula('hum'),
-                 'pressure'  : LastFormula('pressure'),
-                 'dew_point' : LastFormula('dew_point'),
-                 'wind'      : LastFormula('wind'),
-                 'wind_gust' : LastFormula('wind_gust'),
-                 'wind_deg'  : LastFormula('wind_dir'),
-                 'rain'      : SumFormula('rain'),
-                 'utctime'   : LastFormula('utctime') } }
-
-            if self.send_uv:
-                accu.formulas['current']['uv'] = LastFormula('uv')
-
-            if self.send_radiation:
-                accu.formulas['current']['solar_rad'] = LastFormula('solar_rad')
-
-            accu24h = AccumulatorDatasource()
-            accu24h.slice = 'hour'
-            accu24h.span = 24
-            accu24h.storage = self.storage
-            accu24h.formulas =  {'current': {'rain': SumFormula('rain')} }
-
-            accu60min = AccumulatorDatasource()
-            accu60min.slice = 'minute'
-            accu60min.span = 60
-            accu60min.storage = self.storage
-            accu60min.formulas =  {'current': {'rain': SumFormula('rain')} }
-
-            last_timestamp = None
             while self.alive:
-
-                try:
-                    data = accu.execute()['current']['series']
-                    index = len(data['lbl'])-1
-                    rain_1h = sum(map(lambda x: x if x is not None else 0, accu60min.execute()['current']['series']['rain'][:60]))
-                    rain_24h = sum(map(lambda x: x if x is not None else 0, accu24h.execute()['current']['series']['rain'][:24]))
-
-                    if last_timestamp == None or last_timestamp < data['utctime'][index]:
-                        last_timestamp = data['utctime'][index]
-
-                        args = {
-                            'wind_dir':   int(round(data['wind_deg'][index])), # grad
-                            'wind_speed': str(data['wind'][index]),            # mps
-                            'wind_gust':  str(data['wind_gust'][index]),       # mps
-                            'temp':       str(data['temp'][index]),            # grad C
-                            #'dewpoint':   str(data['dew_point'][index]),       # NOT WORKING PROPERLY
-                            'humidity':   int(round(data['hum'][index])),      # relative humidity %
-                            'pressure':   str(data['pressure'][index]),        # mb 
-                            'rain_1h':    rain_1h,                             # mm 
-                            'rain_24h':   rain_24h,                            # mm
-                            'rain_today': str(data['rain'][index]),            # mm
-                            'lat':        self.latitude,
-                            'long':        self.longitude,
-                            'alt':        self.altitude,
-                            'name':       self.name
-                            }
-
-                        if self.send_uv:
-                            args['uv'] = str(data['uv'][index])
-                        if self.send_radiation: 
-                            args['lum'] = str(data['solar_rad'][index])
- 
-                        self.logger.debug("Publishing openweathermap data: %s " % urllib.urlencode(args))
-                        response = self._publish(args, 'openweathermap.org', '/data/post')
-
-                        if response[0] == 200:
-                            self.logger.info('Data published successfully')
-                            self.logger.debug('Code: %s Status: %s Answer: %s' % response)
-                        else:
-                            self.logger.error('Error publishing data. Code: %s Status: %s Answer: %s' % response)
-
-                except Exception, e:
-                    if (str(e) == "'NoneType' object has no attribute 'strftime'") or (str(e) == "a float is required"):
-                        self.logger.error('Could not publish: no valid values at this time. Retry next run...')
-                    else:
-                        self.logger.exception(e)
-
-                time.sleep(60) # each minute we check for new records to send to openweathermap
+                self.publish(data=data, context=context)
+                time.sleep(self.period) # each period we check for new records to send to openweathermap
 
         except Exception, e:
             self.logger.exception(e)
             raise
 
+    def publish(self, data={}, context={}):
+        try:
+            self._init()
+
+            snapshot = self.stats.snapshot()
+            data = snapshot['current']
+            rain_1h = snapshot['hour']['rain_fall'] or 0
+            rain_24h = snapshot['24h']['rain_fall'] or 0
+
+            if self.last_timestamp == None or self.last_timestamp < data['utctime']:
+                self.last_timestamp = data['utctime']
+
+                args = {
+                    'wind_dir':   int(round(data['wind_dir'])),         # grad
+                    'wind_speed': str(data['wind']),                    # mps
+                    'wind_gust':  str(data['wind_gust']),               # mps
+                    'temp':       str(data['temp']),                    # grad C
+                    #'dewpoint':   str(data['dew_point']),              # NOT WORKING PROPERLY
+                    'humidity':   int(round(data['hum'])),              # relative humidity %
+                    'pressure':   str(data['pressure']),                # mb 
+                    'rain_1h':    rain_1h,                              # mm 
+                    'rain_24h':   rain_24h,                             # mm
+                    'rain_today': str(snapshot['day']['rain_fall']),    # mm
+                    'lat':        self.latitude,
+                    'long':        self.longitude,
+                    'alt':        self.altitude,
+                    'name':       self.name
+                    }
+
+                if self.send_uv:
+                    args['uv'] = str(data.get('uv_index'))
+                if self.send_radiation: 
+                    args['lum'] = str(data.get('solar_rad'))
+
+                self.logger.debug("Publishing openweathermap data: %s " % urllib.urlencode(args))
+                response = self._publish(args, 'openweathermap.org', '/data/post')
+
+                if response[0] == 200:
+                    self.logger.info('Data published successfully')
+                    self.logger.debug('Code: %s Status: %s Answer: %s' % response)
+                else:
+                    self.logger.error('Error publishing data. Code: %s Status: %s Answer: %s' % response)
+
+        except Exception, e:
+            if (str(e) == "'NoneType' object has no attribute 'strftime'") or (str(e) == "a float is required"):
+                self.logger.error('Could not publish: no valid values at this time. Retry next run...')
+            else:
+                self.logger.exception(e)
+
     def close(self):
         self.alive = False
 
@@ -192,18 +169,9 @@ class OpenWeatherMapPublisher(object):
       self.logger.debug('Connect to: http://%s' % server)
       self.logger.debug('GET %s' % uri)
 
-      auth = base64.encodestring("%s:%s" % (self.username, self.password))
-
-      conn = httplib.HTTPConnection(server)
-      if not conn:
-         raise Exception, 'Remote server connection timeout!'
-
-      conn.request("GET", uri, headers = {"Authorization" : "Basic %s" % auth})
-      conn.sock.settimeout(30.0)  # 30 seconds timeout 
+      auth = base64.b64encode("%s:%s" % (self.username, self.password))
 
-      http = conn.getresponse()
-      data = (http.status, http.reason, http.read())
-      conn.close()
+      data = pool.request(server, "GET", uri, headers = {"Authorization" : "Basic %s" % auth}, timeout=30.0)
       if not (data[0] == 200 and data[1] == 'OK'):
          raise Exception, 'Server returned invalid status: %d %s %s' % data
       return data
@@ -0,0 +1,128 @@
+## Copyright 2009 Laurent Bovet <laurent.bovet@windmaster.ch>
+##                Jordi Puigsegur <jordi.puigsegur@gmail.com>
+##
+##  This file is part of wfrog
+##
+##  wfrog is free software: you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation, either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  This program is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import heapq
+import random
+import logging
+from threading import Thread
+from wfcommon.httpclient import pool
+
+class PublisherSchedulerRenderer(object):
+    """
+    Runs several publishers (!wunderground, !pwsweather, !wettercom,
+    !openweathermap, !metofficewow) from a single timer instead of one
+    endless loop per publisher.
+
+    Runs are scheduled on a fixed timeline (start + n * period) so that
+    the duration of a run does not delay the following ones. A run is
+    skipped if the previous run of the same publisher is still in
+    progress. The publishers share the process HTTP connection pool.
+
+    This renderer runs indefinitely until 'close()' is called.
+
+    render result [none]:
+        Nothing is returned by this renderer.
+
+    [ Properties ]
+
+    publishers [dict]:
+        The publishers to run, keyed by name. The 'period' of each
+        publisher gives its update period in seconds.
+
+    period [numeric] (optional):
+        Update period in seconds of the publishers not defining one.
+        Defaults to 300.
+
+    delay [numeric] (optional):
+        Delay before first execution. By default 0 seconds.
+
+    jitter [numeric] (optional):
+        Maximum random delay in seconds added to each run, to avoid
+        hitting all the servers at the same time. By default 5 seconds.
+    """
+
+    publishers = None
+    period = 300
+    delay = 0
+    jitter = 5
+
+    alive = True
+
+    logger = logging.getLogger("renderer.publishing")
+
+    def _get_period(self, publisher):
+        period = getattr(publisher, "period", None)
+        if isinstance(period, (int, long, float)) and period > 0:
+            return period
+        else:
+            return self.period
+
+    def render(self, data={}, context={}):
+        assert self.publishers is not None, "'publishers.publishers' must be set"
+
+        running = {}
+        timeline = []
+        start = time.time() + self.delay
+        for name in self.publishers.keys():
+            heapq.heappush(timeline, (start + random.uniform(0, self.jitter), start, name))
+
+        self.logger.info("Started publisher scheduler")
+        while self.alive and len(timeline) > 0:
+            (due, base, name) = timeline[0]
+            wait = due - time.time()
+            if wait > 0:
+                # Wake up regularly to notice close()
+                time.sleep(min(wait, 1))
+                continue
+            heapq.heappop(timeline)
+
+            publisher = self.publishers[name]
+            thread = running.get(name)
+            if thread is not None and thread.isAlive():
+                self.logger.warning("Previous run of %s still in progress, skipping" % name)
+            else:
+                self.logger.debug("Publishing %s" % name)
+                thread = Thread(target=self._publish, args=(name, publisher, data, context))
+                thread.setDaemon(True)
+                running[name] = thread
+                thread.start()
+
+            # Next run is computed from the timeline, not from the current time,
+            # so that it does not drift. Missed runs are dropped.
+            period = self._get_period(publisher)
+            now = time.time()
+            base = base + period
+            if base < now:
+                base = base + period * int((now - base) / period + 1)
+            heapq.heappush(timeline, (base + random.uniform(0, self.jitter), base, name))
+
+    def _publish(self, name, publisher, data, context):
+        try:
+            publisher.publish(data=data, context=context)
+        except Exception, e:
+            self.logger.exception(e)
+
+    def close(self):
+        self.alive = False
+        for publisher in self.publishers.values():
+            try:
+                publisher.close()
+            except:
+                pass
+        pool.close()
@@ -18,6 +18,7 @@
 
 import time
 import logging
+from wfcommon.memo import RenderMemo
 
 class SchedulerRenderer(object):
     """
@@ -54,8 +55,11 @@ class SchedulerRenderer(object):
         self.logger.info("Started scheduler")
         while self.alive:
             self.logger.debug("Rendering.")
+            # Each call is a new render pass with its own datasource memo
+            current_context = dict(context)
+            current_context['_memo'] = RenderMemo()
             try:
-                self.renderer.render(data=data, context=context)
+                self.renderer.render(data=data, context=current_context)
             except Exception, e:
                 self.logger.exception(e)
             time.sleep(self.period)
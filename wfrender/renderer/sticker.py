@@ -22,14 +22,10 @@ import logging
 import sys
 import time
 import wfcommon.database
-from wfcommon.formula.base import LastFormula
-from wfcommon.formula.base import SumFormula
-from wfcommon.formula.base import MinFormula
-from wfcommon.formula.base import MaxFormula
 try:
-    from wfrender.datasource.accumulator import AccumulatorDatasource
+    from wfrender.datasource.periods import get_period_stats
 except ImportError, e:
-    from datasource.accumulator import AccumulatorDatasource
+    from datasource.periods import get_period_stats
 from wfcommon.units import MpsToKmh
 
 
@@ -59,9 +55,7 @@ class StickerRenderer(object):
 
     id = None
     storage = None
-    accuY = None
-    accuM = None
-    accuD = None
+    stats = None
     filename = "/tmp/sticker.png"
     station_name = "wfrog weather station"
     logo_file = "/etc/wfrog/wfrender/config/logo.png"
@@ -76,59 +70,16 @@ class StickerRenderer(object):
 
             assert self.storage is not None, "'sticker.storage' must be set"
 
-            # Initialize accumulators
-
-            if self.accuD == None:
-                self.logger.info("Initializing accumulators")
-
-                # Accumulator for yearly data
-                self.accuY = AccumulatorDatasource()
-                self.accuY.slice = 'year'
-                self.accuY.span = 1
-                self.accuY.caching = True
-                self.accuY.storage = self.storage
-                self.accuY.formulas = {'data': {
-                     'max_temp' : MaxFormula('temp'),
-                     'min_temp' : MinFormula('temp'),
-                     'max_gust' : MaxFormula('wind_gust'),
-                     'rain_fall' : SumFormula('rain') } }
-
-                # Accumulator for monthly data
-                self.accuM = AccumulatorDatasource()
-                self.accuM.slice = 'month'
-                self.accuM.span = 1
-                self.accuM.storage = self.storage
-                self.accuM.caching = True
-                self.accuM.formulas = {'data': {
-                     'max_temp' : MaxFormula('temp'),
-                     'min_temp' : MinFormula('temp'),
-                     'max_gust' : MaxFormula('wind_gust'),
-                     'rain_fall' : SumFormula('rain') } }
-
-                # Accumulator for daily and current data
-                self.accuD = AccumulatorDatasource()
-                self.accuD.slice = 'day'
-                self.accuD.span = 1
-                self.accuD.storage = self.storage
-                self.accuD.caching = True
-                self.accuD.formulas = {
-                     'data': {
-                         'max_temp' : MaxFormula('temp'),
-                         'min_temp' : MinFormula('temp'),
-                         'max_gust' : MaxFormula('wind_gust'),
-                         'rain_fall' : SumFormula('rain') },
-                     'current': {
-                         'temp' : LastFormula('temp'),
-                         'hum' : LastFormula('hum'),
-                         'pressure' : LastFormula('pressure'),
-                         'gust' : LastFormula('wind_gust'),
-                         'wind_deg' : LastFormula('wind_dir'),
-                         'time' : LastFormula('localtime') } }
+            # Initialize period statistics
+
+            if self.stats == None:
+                self.stats = get_period_stats(self.storage)
 
             # Calculate data
 
             self.logger.info("Calculating ...")
-            current = self._calculateCurrentData(self.accuD)
+            snapshot = self.stats.snapshot()
+            current = self._calculateCurrentData(snapshot['current'])
    
             # Create Sticker
 
@@ -174,13 +125,13 @@ class StickerRenderer(object):
             draw.text((65,38), current[1], fill=dark_wheat)
 
             draw.text((6,60), 
-                      " Today:   %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(self.accuD), 
+                      " Today:   %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(snapshot['day']), 
                       fill=dark_wheat) 
             draw.text((6,72), 
-                      " Monthly: %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(self.accuM), 
+                      " Monthly: %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(snapshot['month']), 
                       fill=dark_wheat) 
             draw.text((6,84), 
-                      " Yearly:  %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(self.accuY), 
+                      " Yearly:  %4.1fC-%4.1fC  %4.1fKm/h  %5.1fl." % self._calculateAggregData(snapshot['year']), 
                       fill=dark_wheat) 
 
             # Save sticker
@@ -197,24 +148,20 @@ class StickerRenderer(object):
             self.logger.warning("Error rendering sticker: %s" % str(e))
             return None
 
-    def _calculateCurrentData(self, accu):
-        data = accu.execute()['current']['series']
-        index = len(data['lbl'])-1
-        return ( ( self._format(data['temp'][index]),
-                   self._format(data['hum'][index]),
-                   self._format(MpsToKmh(data['gust'][index])),
-                   #'wind_deg': self._format(data['wind_deg'][index])
-                   self._format(data['pressure'][index])  ),
-
-                 self._format(data['time'][index].strftime("%d/%m/%Y %H:%M")) )
-
-    def _calculateAggregData(self, accu):
-        data = accu.execute()['data']['series']
-        index = len(data['lbl'])-1
-        return (self._format(data['min_temp'][index]), 
-                self._format(data['max_temp'][index]),
-                self._format(MpsToKmh(data['max_gust'][index])),  
-                self._format(data['rain_fall'][index]) )
+    def _calculateCurrentData(self, data):
+        return ( ( self._format(data['temp']),
+                   self._format(data['hum']),
+                   self._format(MpsToKmh(data['wind_gust'])),
+                   #'wind_deg': self._format(data['wind_dir'])
+                   self._format(data['pressure'])  ),
+
+                 self._format(data['localtime'].strftime("%d/%m/%Y %H:%M")) )
+
+    def _calculateAggregData(self, data):
+        return (self._format(data['min_temp']), 
+                self._format(data['max_temp']),
+                self._format(MpsToKmh(data['max_gust'])),  
+                self._format(data['rain_fall']) )
 
     def _format(self, value, default='-'):
         return value if value != None else default
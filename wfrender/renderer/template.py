@@ -58,6 +58,7 @@ class TemplateRenderer(object):
     mime = "text/plain"
 
     compiled_template = None
+    compiled_mtime = None
 
     logger = logging.getLogger("renderer.template")
 
@@ -78,9 +79,11 @@ class TemplateRenderer(object):
         self.logger.debug("Rendering with template "+abs_path)
         content["rnd"]=rnd
 
-        # 1st time compile template
-        if not self.compiled_template: 
+        # Compile template the 1st time and when it changes
+        mtime = os.path.getmtime(abs_path)
+        if not self.compiled_template or mtime != self.compiled_mtime:
             self.logger.debug("Compiling template "+abs_path)
             self.compiled_template = Template.compile(file=file(abs_path, "r"))
+            self.compiled_mtime = mtime
 
         return [ self.mime, str(self.compiled_template(searchList=[content, context])) ]
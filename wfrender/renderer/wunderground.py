@@ -21,12 +21,10 @@ import logging
 import sys
 import time
 import wfcommon.database
-from wfcommon.formula.base import LastFormula
-from wfcommon.formula.base import SumFormula
 try:
-    from wfrender.datasource.accumulator import AccumulatorDatasource
+    from wfrender.datasource.periods import get_period_stats
 except ImportError, e:
-    from datasource.accumulator import AccumulatorDatasource
+    from datasource.periods import get_period_stats
 from wfcommon.units import HPaToInHg
 from wfcommon.units import CToF
 from wfcommon.units import MmToIn
@@ -62,12 +60,13 @@ class WeatherUndergroundPublisher(object):
     publisher = None
     real_time = False
     storage = None
+    stats = None
     alive = False
 
     logger = logging.getLogger("renderer.wunderground")
 
-    def render(self, data={}, context={}):
-        try:
+    def _init(self):
+        if self.publisher is None:
             assert self.id is not None, "'wunderground.id' must be set"
             assert self.password is not None, "'wunderground.password' must be set"
             assert self.period is not None, "'wunderground.period' must be set"
@@ -80,67 +79,16 @@ class WeatherUndergroundPublisher(object):
             self.logger.info("Initializing Wunderground publisher (station %s)" % self.id)
             import weather.services
             self.publisher = weather.services.Wunderground(self.id, self.password, rtfreq)
+            self.stats = get_period_stats(self.storage)
+
+    def render(self, data={}, context={}):
+        try:
+            self._init()
 
             self.alive = True
             if not self.real_time:
-
-                accu = AccumulatorDatasource()
-                accu.slice = 'day'
-                accu.span = 1
-                accu.storage = self.storage
-                accu.formulas = {'current': {
-                     'temp' : LastFormula('temp'),
-                     'dew_point': LastFormula('dew_point'),
-                     'hum' : LastFormula('hum'),
-                     'pressure' : LastFormula('pressure'),
-                     'wind' : LastFormula('wind'),
-                     'wind_deg' : LastFormula('wind_dir'),
-                     'gust' : LastFormula('wind_gust'),
-                     'gust_deg' : LastFormula('wind_gust_dir'),
-                     'rain_rate' : LastFormula('rain_rate'),
-                     'rain_fall' : SumFormula('rain'), 
-                     'utctime' : LastFormula('utctime') } }
-
                 while self.alive:
-                    try:
-                        data = accu.execute()['current']['series']
-                        index = len(data['lbl'])-1
-
-                        params = {
-                            # <float> pressure: in inches of Hg
-                            'pressure' : HPaToInHg(data['pressure'][index]),
-                            # <float> dewpoint: in Fahrenheit
-                            'dewpoint' : CToF(data['dew_point'][index]),
-                            # <float> humidity: between 0.0 and 100.0 inclusive
-                            'humidity' : data['hum'][index],
-                            # <float> tempf: in Fahrenheit
-                            'tempf' : CToF(data['temp'][index]),
-                            # <float> rainin: inches/hour of rain
-                            'rainin' : MmToIn(data['rain_rate'][index]),
-                            # <float> rainday: total rainfall in day (localtime)
-                            'rainday' : MmToIn(data['rain_fall'][index]),
-                            # <string> dateutc: date "YYYY-MM-DD HH:MM:SS" in GMT timezone
-                            'dateutc' : data['utctime'][index].strftime('%Y-%m-%d %H:%M:%S'),
-                            # <float> windspeed: in mph
-                            'windspeed' : MpsToMph(data['wind'][index]),
-                            # <float> winddir: in degrees, between 0.0 and 360.0
-                            'winddir' : data['wind_deg'][index],
-                            # <float> windgust: in mph
-                            'windgust' : MpsToMph(data['gust'][index]),
-                            # <float> windgustdir: in degrees, between 0.0 and 360.0
-                            'windgustdir' : data['gust_deg'][index] }
-
-                        # Do not send parameters that are null (None).
-                        # from above only dateutc is a mandatory parameter.
-                        params = dict(filter(lambda (p,v): v, [(p,v) for p,v in params.iteritems()]))
-                        self.logger.info("Publishing Wunderground data (normal server): %s " % str(params))
-                        self.publisher.set(**params)
-                        response = self.publisher.publish()               
-                        self.logger.info('Result Wunderground publisher: %s' % str(response))
-
-                    except Exception, e:
-                        self.logger.exception(e)
-
+                    self.publish(data=data, context=context)
                     time.sleep(self.period)
             else:
                 self.logger.error("Wunderground real time server not yet supported")
@@ -153,6 +101,52 @@ class WeatherUndergroundPublisher(object):
             self.logger.exception(e)
             raise
 
+    def publish(self, data={}, context={}):
+        try:
+            self._init()
+
+            if self.real_time:
+                self.logger.error("Wunderground real time server not yet supported")
+                return
+
+            snapshot = self.stats.snapshot()
+            data = snapshot['current']
+
+            params = {
+                # <float> pressure: in inches of Hg
+                'pressure' : HPaToInHg(data['pressure']),
+                # <float> dewpoint: in Fahrenheit
+                'dewpoint' : CToF(data['dew_point']),
+                # <float> humidity: between 0.0 and 100.0 inclusive
+                'humidity' : data['hum'],
+                # <float> tempf: in Fahrenheit
+                'tempf' : CToF(data['temp']),
+                # <float> rainin: inches/hour of rain
+                'rainin' : MmToIn(data['rain_rate']),
+                # <float> rainday: total rainfall in day (localtime)
+                'rainday' : MmToIn(snapshot['day']['rain_fall']),
+                # <string> dateutc: date "YYYY-MM-DD HH:MM:SS" in GMT timezone
+                'dateutc' : data['utctime'].strftime('%Y-%m-%d %H:%M:%S'),
+                # <float> windspeed: in mph
+                'windspeed' : MpsToMph(data['wind']),
+                # <float> winddir: in degrees, between 0.0 and 360.0
+                'winddir' : data['wind_dir'],
+                # <float> windgust: in mph
+                'windgust' : MpsToMph(data['wind_gust']),
+                # <float> windgustdir: in degrees, between 0.0 and 360.0
+                'windgustdir' : data['wind_gust_dir'] }
+
+            # Do not send parameters that are null (None).
+            # from above only dateutc is a mandatory parameter.
+            params = dict(filter(lambda (p,v): v, [(p,v) for p,v in params.iteritems()]))
+            self.logger.info("Publishing Wunderground data (normal server): %s " % str(params))
+            self.publisher.set(**params)
+            response = self.publisher.publish()               
+            self.logger.info('Result Wunderground publisher: %s' % str(response))
+
+        except Exception, e:
+            self.logger.exception(e)
+
     def close(self):
         self.alive = False
 
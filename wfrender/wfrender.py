@@ -31,6 +31,7 @@ import logging
 import logging.handlers
 import wfcommon.units
 from wfcommon.config import wfrog_version
+from wfcommon.memo import RenderMemo
 
 class RenderEngine(object):
     '''
@@ -102,11 +103,13 @@ logging [logging configuration] (optional):
                     self.logger.debug("Starting root rendering.")
                     current_context = copy.deepcopy(self.initial_context)
                     current_context.update(context)
+                    current_context['_memo'] = RenderMemo()
                     self.root_renderer.render(data=data, context=current_context)
             else:
                 self.logger.debug("Starting root rendering.")
                 current_context = copy.deepcopy(self.initial_context)
                 current_context.update(context)
+                current_context['_memo'] = RenderMemo()
                 return self.root_renderer.render(data=data, context=current_context)
         except KeyboardInterrupt:
             self.logger.info("Stopping daemon...")